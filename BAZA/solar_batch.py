@@ -0,0 +1,117 @@
+# coding: utf-8
+# license: GPLv3
+
+"""Пакетный расчёт без графического интерфейса.
+
+Считывает систему тел из файла, продвигает её на заданное число шагов
+так быстро, как позволяет процессор, и сохраняет снимки состояния
+в формате входных файлов.
+
+Запуск: python solar_batch.py solar_system.txt --steps 100000 --dt 3600 --every 1000 --snapshots out
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import solar_model
+from solar_input import read_space_objects_data_from_file, write_space_objects_data_to_file
+
+
+def write_snapshot(directory, prefix, step, space_objects, positions, velocities):
+    """Записывает состояние системы в файл <directory>/<prefix>_<step>.txt.
+
+    Параметры:
+
+    **directory** — каталог снимков.
+    **prefix** — начало имени файла.
+    **step** — номер шага.
+    **space_objects** — список объектов.
+    **positions**, **velocities** — текущие координаты и скорости.
+    """
+
+    solar_model.arrays_to_space_objects(space_objects, positions, velocities)
+    filename = os.path.join(directory, "%s_%08d.txt" % (prefix, step))
+    write_space_objects_data_to_file(filename, space_objects)
+    return filename
+
+
+def run(args):
+    """Выполняет расчёт по аргументам командной строки и печатает его скорость.
+
+    Параметры:
+
+    **args** — аргументы командной строки.
+    """
+
+    solar_model.integrator = args.integrator
+    solar_model.gravity_solver = args.solver
+    solar_model.opening_angle = args.theta
+    solar_model.softening_length = args.softening
+    solar_model.pair_dtype = np.dtype(args.precision).type
+
+    space_objects = read_space_objects_data_from_file(args.input)
+    positions, velocities, masses = solar_model.space_objects_to_arrays(space_objects)
+    prefix = os.path.splitext(os.path.basename(args.input))[0]
+    if args.every:
+        os.makedirs(args.snapshots, exist_ok=True)
+    if args.energy:
+        initial_energy = solar_model.total_energy(positions, velocities, masses)
+    print("%d bodies, %d steps of %g s, %s integrator, %s gravity" % (
+        len(masses), args.steps, args.dt, args.integrator, args.solver))
+
+    accelerations = None
+    physics_time = 0.0
+    started = time.perf_counter()
+    for step in range(1, args.steps + 1):
+        step_started = time.perf_counter()
+        accelerations = solar_model.step_arrays(positions, velocities, masses, args.dt,
+                                                accelerations=accelerations)
+        physics_time += time.perf_counter() - step_started
+        if args.every and step % args.every == 0:
+            filename = write_snapshot(args.snapshots, prefix, step, space_objects, positions, velocities)
+            print("step %d, t = %g s: %s" % (step, step*args.dt, filename))
+    elapsed = time.perf_counter() - started
+
+    print("%d steps in %.2f s: %.1f steps/s (physics %.1f steps/s), %d force evaluations" % (
+        args.steps, elapsed, args.steps / elapsed if elapsed else float('inf'),
+        args.steps / physics_time if physics_time else float('inf'), solar_model.force_evaluations))
+    if args.energy:
+        final_energy = solar_model.total_energy(positions, velocities, masses)
+        print("relative energy change: %.3e" % (final_energy / initial_energy - 1))
+    if args.output:
+        solar_model.arrays_to_space_objects(space_objects, positions, velocities)
+        write_space_objects_data_to_file(args.output, space_objects)
+
+
+def main():
+    """Разбирает командную строку и запускает расчёт."""
+
+    parser = argparse.ArgumentParser(description="Run the solar system model without the GUI")
+    parser.add_argument("input", help="system file (Star/Planet lines)")
+    parser.add_argument("--steps", type=int, required=True, help="number of time steps")
+    parser.add_argument("--dt", type=float, default=3600.0, help="time step, s")
+    parser.add_argument("--integrator", choices=sorted(solar_model.integrators),
+                        default=solar_model.integrator, help="integration method")
+    parser.add_argument("--solver", choices=sorted(solar_model.gravity_solvers),
+                        default=solar_model.gravity_solver, help="gravity solver")
+    parser.add_argument("--theta", type=float, default=solar_model.opening_angle,
+                        help="Barnes-Hut opening angle")
+    parser.add_argument("--softening", type=float, default=solar_model.softening_length,
+                        help="softening length, m")
+    parser.add_argument("--precision", choices=["float64", "float32"], default="float64",
+                        help="floating point type of direct pair sums")
+    parser.add_argument("--every", type=int, default=0, metavar="STEPS",
+                        help="write a snapshot every STEPS steps (0 disables snapshots)")
+    parser.add_argument("--snapshots", default="snapshots", metavar="DIR",
+                        help="directory for snapshot files")
+    parser.add_argument("--output", help="file for the final state")
+    parser.add_argument("--energy", action="store_true",
+                        help="report the relative change of total energy")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# coding: utf-8
+# license: GPLv3
+
+"""Отчёты о точности и скорости модели.
+
+Запуск:
+python solar_benchmark.py gravity --bodies 100000 --theta 0.3 0.5 0.7 1.0
+python solar_benchmark.py integrators --years 1 --case euler:0.04 leapfrog:1 yoshida:4 rk45:1
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import solar_model
+
+
+def generate_disk(count, seed=0):
+    """Создаёт модельную галактику: экспоненциальный диск тел вокруг массивного центра.
+
+    Возвращает (positions, masses) в единицах СИ.
+
+    Параметры:
+
+    **count** — число тел.
+    **seed** — зерно генератора случайных чисел.
+    """
+
+    rng = np.random.default_rng(seed)
+    scale = 1e20  # около 3 кпк
+    radius = rng.exponential(scale, count)
+    angle = rng.uniform(0, 2*np.pi, count)
+    positions = np.column_stack((radius*np.cos(angle), radius*np.sin(angle)))
+    masses = rng.uniform(0.1, 10, count) * 2e30
+    masses[0] = 1e6 * 2e30
+    positions[0] = 0
+    return positions, masses
+
+
+def relative_errors(approximate, exact):
+    """Возвращает относительные ошибки векторов ускорения для каждого тела.
+
+    Параметры:
+
+    **approximate** — приближённые ускорения формы (N, 2).
+    **exact** — точные ускорения формы (N, 2).
+    """
+
+    return np.linalg.norm(approximate - exact, axis=1) / np.linalg.norm(exact, axis=1)
+
+
+def best_time(function, repeats):
+    """Возвращает минимальное время выполнения функции из нескольких запусков и её результат.
+
+    Параметры:
+
+    **function** — функция без аргументов.
+    **repeats** — число запусков.
+    """
+
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+planet_orbits = (
+    # масса, кг; большая полуось, м; эксцентриситет
+    (3.301e23, 5.791e10, 0.2056),
+    (4.867e24, 1.082e11, 0.0068),
+    (5.972e24, 1.496e11, 0.0167),
+    (6.417e23, 2.279e11, 0.0934),
+)
+"""Планеты земной группы для проверки методов интегрирования."""
+
+
+def generate_inner_planets():
+    """Создаёт Солнце и планеты земной группы в перигелиях.
+
+    Возвращает (positions, velocities, masses) в единицах СИ.
+    """
+
+    sun_mass = 1.989e30
+    positions = [(0.0, 0.0)]
+    velocities = [(0.0, 0.0)]
+    masses = [sun_mass]
+    for index, (mass, axis, eccentricity) in enumerate(planet_orbits):
+        distance = axis*(1 - eccentricity)
+        speed = np.sqrt(solar_model.gravitational_constant*(sun_mass + mass)*(1 + eccentricity) / distance)
+        angle = index*np.pi/2
+        positions.append((distance*np.cos(angle), distance*np.sin(angle)))
+        velocities.append((-speed*np.sin(angle), speed*np.cos(angle)))
+        masses.append(mass)
+    positions = np.array(positions)
+    velocities = np.array(velocities)
+    masses = np.array(masses)
+    velocities -= masses @ velocities / masses.sum()  # покоящийся центр масс
+    return positions, velocities, masses
+
+
+def gravity_report(args):
+    """Печатает таблицу точности и скорости метода Барнса — Хата для набора углов раскрытия.
+
+    Параметры:
+
+    **args** — аргументы командной строки.
+    """
+
+    positions, masses = generate_disk(args.bodies, args.seed)
+    sample = np.random.default_rng(args.seed).permutation(args.bodies)[:args.sample]
+    direct_time, exact = best_time(
+        lambda: solar_model.direct_accelerations(positions, masses, args.softening, sample), args.repeats)
+    direct_time *= args.bodies / len(sample)
+    estimated = " (estimated from %d bodies)" % len(sample) if len(sample) < args.bodies else ""
+
+    print("%d bodies, softening %g m" % (args.bodies, args.softening))
+    print("direct summation: %.3f s per force pass%s" % (direct_time, estimated))
+    print("%6s %10s %8s %12s %12s %12s" % ("theta", "time, s", "speedup", "median err", "99% err", "max err"))
+    for theta in args.theta:
+        tree_time, approximate = best_time(
+            lambda: solar_model.barnes_hut_accelerations(positions, masses, args.softening, theta), args.repeats)
+        errors = relative_errors(approximate[sample], exact)
+        print("%6.2f %10.3f %8.1f %12.2e %12.2e %12.2e" % (
+            theta, tree_time, direct_time / tree_time,
+            np.median(errors), np.percentile(errors, 99), errors.max()))
+
+
+def integrators_report(args):
+    """Печатает ошибку энергии и число вычислений сил для методов интегрирования.
+
+    Параметры:
+
+    **args** — аргументы командной строки.
+    """
+
+    duration = args.years * 365.25 * 86400
+    print("inner planets, %g years" % args.years)
+    print("%10s %8s %10s %12s %10s" % ("integrator", "dt, d", "forces", "max |dE/E|", "time, s"))
+    for case in args.case:
+        name, days = case.split(":")
+        dt = float(days) * 86400
+        positions, velocities, masses = generate_inner_planets()
+        initial = solar_model.total_energy(positions, velocities, masses)
+        solar_model.integrator = name
+        solar_model.rk45_step_hint = None
+        solar_model.force_evaluations = 0
+        accelerations = None
+        worst = 0.0
+        started = time.perf_counter()
+        for _ in range(int(round(duration / dt))):
+            accelerations = solar_model.step_arrays(positions, velocities, masses, dt, accelerations=accelerations)
+            worst = max(worst, abs(solar_model.total_energy(positions, velocities, masses) / initial - 1))
+        print("%10s %8g %10d %12.2e %10.2f" % (
+            name, float(days), solar_model.force_evaluations, worst, time.perf_counter() - started))
+
+
+def main():
+    """Разбирает командную строку и печатает выбранный отчёт."""
+
+    parser = argparse.ArgumentParser(description="Accuracy and speed reports for the solar system model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gravity = commands.add_parser("gravity", help="Barnes-Hut versus direct summation")
+    gravity.add_argument("--bodies", type=int, default=20000, help="number of bodies")
+    gravity.add_argument("--theta", type=float, nargs="+", default=[0.3, 0.5, 0.7, 1.0],
+                         help="opening angles to compare")
+    gravity.add_argument("--sample", type=int, default=2000,
+                         help="bodies checked against direct summation")
+    gravity.add_argument("--softening", type=float, default=1e17, help="softening length, m")
+    gravity.add_argument("--repeats", type=int, default=3, help="timing runs per solver")
+    gravity.add_argument("--seed", type=int, default=0, help="random seed")
+    gravity.set_defaults(report=gravity_report)
+
+    integrators = commands.add_parser("integrators", help="energy error versus force evaluations")
+    integrators.add_argument("--years", type=float, default=1.0, help="simulated time, years")
+    integrators.add_argument("--case", nargs="+", metavar="INTEGRATOR:DAYS",
+                             default=["euler:0.0417", "leapfrog:0.25", "leapfrog:1", "yoshida:1",
+                                      "yoshida:4", "rk45:1", "rk45:30"],
+                             help="integrator and time step in days")
+    integrators.set_defaults(report=integrators_report)
+
+    args = parser.parse_args()
+    args.report(args)
+
+
+if __name__ == "__main__":
+    main()
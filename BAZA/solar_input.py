@@ -19,10 +19,14 @@ def read_space_objects_data_from_file(input_filename):
             if len(line.strip()) == 0 or line[0] == '#':
                 continue  # пустые строки и строки-комментарии пропускаем
             object_type = line.split()[0].lower()
-            if object_type == "star":  # FIXME: do the same for planet
+            if object_type == "star":
                 star = Star()
                 parse_star_parameters(line, star)
                 objects.append(star)
+            elif object_type == "planet":
+                planet = Planet()
+                parse_planet_parameters(line, planet)
+                objects.append(planet)
             else:
                 print("Unknown space object")
 
@@ -44,7 +48,8 @@ def parse_star_parameters(line, star):
     **star** — объект звезды.
     """
 
-    pass  # FIXME: not done yet
+    parse_body_parameters(line, star)
+
 
 def parse_planet_parameters(line, planet):
     """Считывает данные о планете из строки.
@@ -61,7 +66,26 @@ def parse_planet_parameters(line, planet):
     **line** — строка с описание планеты.
     **planet** — объект планеты.
     """
-    pass  # FIXME: not done yet...
+
+    parse_body_parameters(line, planet)
+
+
+def parse_body_parameters(line, body):
+    """Считывает общие для звёзд и планет параметры из строки
+    <тип> <радиус в пикселах> <цвет> <масса> <x> <y> <Vx> <Vy>
+
+    Параметры:
+
+    **line** — строка с описанием тела.
+    **body** — объект звезды или планеты.
+    """
+
+    fields = line.split()
+    if len(fields) != 8:
+        raise ValueError("ожидалось 8 полей в строке: %r" % line.strip())
+    body.R = int(fields[1])
+    body.color = fields[2]
+    body.m, body.x, body.y, body.Vx, body.Vy = map(float, fields[3:])
 
 
 def write_space_objects_data_to_file(output_filename, space_objects):
@@ -77,8 +101,9 @@ def write_space_objects_data_to_file(output_filename, space_objects):
     """
     with open(output_filename, 'w') as out_file:
         for obj in space_objects:
-            print(out_file, "%s %d %s %f" % ('1', 2, '3', 4.5))
-            # FIXME: should store real values
+            print("%s %d %s %r %r %r %r %r" % (obj.type.capitalize(), obj.R, obj.color,
+                                              float(obj.m), float(obj.x), float(obj.y),
+                                              float(obj.Vx), float(obj.Vy)), file=out_file)
 
 # FIXME: хорошо бы ещё сделать функцию, сохранающую статистику в заданный файл...
 
@@ -1,6 +1,7 @@
 # coding: utf-8
 # license: GPLv3
 
+import time
 import tkinter
 from tkinter.filedialog import *
 from solar_vis import *
@@ -25,23 +26,78 @@ time_step = None
 space_objects = []
 """Список космических объектов."""
 
+display_rate = 60
+"""Наибольшая частота перерисовки экрана, кадров в секунду."""
+
+physics_budget = 0.75
+"""Доля периода кадра, которую может занимать расчёт физики.
+Если шаги не укладываются в неё, модельное время замедляется, а не растёт очередь шагов."""
+
+simulation_state = None
+"""Массивы модели [positions, velocities, masses, accelerations, previous_positions]
+для **space_objects**; None — собрать заново из объектов."""
+
+accumulator = 0.0
+"""Физическое время, которое уже должно пройти, но ещё не рассчитано.
+Тип: float"""
+
+last_frame_time = None
+"""Момент реального времени (time.perf_counter) прошлого кадра."""
+
 
 def execution():
     """Функция исполнения -- выполняется циклически, вызывая обработку всех небесных тел,
     а также обновляя их положение на экране.
+    Физика считается шагами постоянной длины **time_step**: реальное время кадра, умноженное
+    на скорость моделирования, копится в **accumulator** и расходуется целыми шагами,
+    сколько бы их ни пришлось на кадр. Экран перерисовывается не чаще **display_rate**
+    раз в секунду, тела рисуются между двумя последними шагами пропорционально остатку.
     Цикличность выполнения зависит от значения глобальной переменной perform_execution.
-    При perform_execution == True функция запрашивает вызов самой себя по таймеру через от 1 мс до 100 мс.
     """
     global physical_time
     global displayed_time
-    recalculate_space_objects_positions(space_objects, time_step.get())
-    for body in space_objects:
-        update_object_position(space, body)
-    physical_time += time_step.get()
-    displayed_time.set("%.1f" % physical_time + " seconds gone")
+    global simulation_state
+    global accumulator
+    global last_frame_time
+
+    frame_started = time.perf_counter()
+    dt = time_step.get()
+    steps_per_second = 1000 / (101 - time_speed.get())  # как прежний таймер в 101 - speed мс на шаг
+    accumulator += (frame_started - last_frame_time) * steps_per_second * dt
+    last_frame_time = frame_started
+
+    if simulation_state is None:
+        positions, velocities, masses = space_objects_to_arrays(space_objects)
+        simulation_state = [positions, velocities, masses, None, positions.copy()]
+    positions, velocities, masses, accelerations, previous_positions = simulation_state
+    steps = 0
+    deadline = frame_started + physics_budget / display_rate
+    while dt > 0 and accumulator >= dt:
+        previous_positions[:] = positions
+        accelerations = step_arrays(positions, velocities, masses, dt, accelerations=accelerations)
+        accumulator -= dt
+        physical_time += dt
+        steps += 1
+        if time.perf_counter() > deadline:
+            accumulator = min(accumulator, dt)
+            break
+    simulation_state[3] = accelerations
+    if steps:
+        arrays_to_space_objects(space_objects, positions, velocities, accelerations)
+    physics_finished = time.perf_counter()
+
+    fraction = min(accumulator / dt, 1.0) if dt > 0 else 1.0
+    shown_positions = previous_positions + (positions - previous_positions) * fraction
+    for body, (x, y) in zip(space_objects, shown_positions.tolist()):
+        update_object_position(space, body, x, y)
+    render_finished = time.perf_counter()
+    displayed_time.set("%.1f seconds gone | physics %.1f ms (%d steps), render %.1f ms" % (
+        physical_time, (physics_finished - frame_started) * 1000, steps,
+        (render_finished - physics_finished) * 1000))
 
     if perform_execution:
-        space.after(101 - int(time_speed.get()), execution)
+        frame_left = 1 / display_rate - (render_finished - frame_started)
+        space.after(max(1, int(frame_left * 1000)), execution)
 
 
 def start_execution():
@@ -49,7 +105,9 @@ def start_execution():
     Запускает циклическое исполнение функции execution.
     """
     global perform_execution
+    global last_frame_time
     perform_execution = True
+    last_frame_time = time.perf_counter()
     start_button['text'] = "Pause"
     start_button['command'] = stop_execution
 
@@ -75,7 +133,14 @@ def open_file_dialog():
     """
     global space_objects
     global perform_execution
+    global simulation_state
+    global accumulator
+    global physical_time
+    global last_frame_time
     perform_execution = False
+    simulation_state = None
+    accumulator = 0.0
+    physical_time = 0
     for obj in space_objects:
         space.delete(obj.image)  # удаление старых изображений планет
     in_filename = askopenfilename(filetypes=(("Text file", ".txt"),))
@@ -90,6 +155,8 @@ def open_file_dialog():
             create_planet_image(space, obj)
         else:
             raise AssertionError()
+    displayed_time.set(str(physical_time) + " seconds gone")
+    last_frame_time = time.perf_counter()  # время в диалоге выбора файла не идёт в модельное
 
 
 def save_file_dialog():
@@ -142,7 +209,7 @@ def main():
 
     displayed_time = tkinter.StringVar()
     displayed_time.set(str(physical_time) + " seconds gone")
-    time_label = tkinter.Label(frame, textvariable=displayed_time, width=30)
+    time_label = tkinter.Label(frame, textvariable=displayed_time, width=60)
     time_label.pack(side=tkinter.RIGHT)
 
     root.mainloop()
@@ -54,7 +54,7 @@ def scale_y(y):
     **y** — y-координата модели.
     """
 
-    return y  # FIXME: not done yet
+    return window_height//2 - int(y*scale_factor)
 
 
 def create_star_image(space, star):
@@ -80,7 +80,11 @@ def create_planet_image(space, planet):
     **space** — холст для рисования.
     **planet** — объект планеты.
     """
-    pass  # FIXME: сделать как у звезды
+
+    x = scale_x(planet.x)
+    y = scale_y(planet.y)
+    r = planet.R
+    planet.image = space.create_oval([x - r, y - r], [x + r, y + r], fill=planet.color)
 
 
 def update_system_name(space, system_name):
@@ -95,21 +99,23 @@ def update_system_name(space, system_name):
     space.create_text(30, 80, tag="header", text=system_name, font=header_font)
 
 
-def update_object_position(space, body):
+def update_object_position(space, body, x=None, y=None):
     """Перемещает отображаемый объект на холсте.
 
     Параметры:
 
     **space** — холст для рисования.
     **body** — тело, которое нужно переместить.
+    **x**, **y** — физические координаты изображения; по умолчанию координаты тела.
     """
-    x = scale_x(body.x)
-    y = scale_y(body.y)
+    x = scale_x(body.x if x is None else x)
+    y = scale_y(body.y if y is None else y)
     r = body.R
     if x + r < 0 or x - r > window_width or y + r < 0 or y - r > window_height:
         space.coords(body.image, window_width + r, window_height + r,
                      window_width + 2*r, window_height + 2*r)  # положить за пределы окна
-    space.coords(body.image, x - r, y - r, x + r, y + r)
+    else:
+        space.coords(body.image, x - r, y - r, x + r, y + r)
 
 
 if __name__ == "__main__":
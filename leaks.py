@@ -1,244 +1,3331 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, Text
-from PIL import Image,  ImageGrab
-import cv2
-import numpy as np
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+import argparse
+import base64
+import atexit
+import contextlib
+import copy
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import math
+import mmap
 import os
-import piexif
+import queue
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import struct
+import sys
+import time
 import logging
-import urllib.request
+import logging.handlers
+import urllib.error
+import urllib.parse
+
+
+class LazyModule:
+    """
+    Класс-заместитель модуля: модуль импортируется при первом обращении к его атрибуту.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+# Графический интерфейс, OpenCV, PIL и NumPy загружаются только при первом использовании,
+# поэтому консольные команды и серверные задачи без обработки изображений не тратят время на их импорт,
+# а без дисплея не загружают tkinter вовсе
+tk = LazyModule('tkinter')
+filedialog = LazyModule('tkinter.filedialog')
+messagebox = LazyModule('tkinter.messagebox')
+simpledialog = LazyModule('tkinter.simpledialog')
+ttk = LazyModule('tkinter.ttk')
+Image = LazyModule('PIL.Image')
+ImageGrab = LazyModule('PIL.ImageGrab')
+ImageTk = LazyModule('PIL.ImageTk')
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+piexif = LazyModule('piexif')
+asyncio = LazyModule('asyncio')
+multiprocessing = LazyModule('multiprocessing')
+sqlite3 = LazyModule('sqlite3')
+gzip = LazyModule('gzip')
+getpass = LazyModule('getpass')
+
+# Журнал аудита: записи в формате JSON по одной на строку. Запись в файл идёт в отдельном потоке через очередь,
+# поэтому вызовы logging из потоков шифрования и интерфейса не ждут диска; заполненный файл сжимается в .gz.
+AUDIT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'security_audit.jsonl')
+AUDIT_LOG_MAX_BYTES = 10 * 1024 * 1024
+AUDIT_LOG_BACKUP_COUNT = 5
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Класс для форматирования записей журнала в JSON: одна запись — одна строка.
+    Поля операции из log_audit (длительность, объём, скорость) добавляются на верхний уровень записи.
+    """
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'timestamp': record.created,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'audit', {}))
+        if record.exc_text:
+            entry['traceback'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AuditQueueHandler(logging.handlers.QueueHandler):
+    """
+    Класс обработчика, передающего записи журнала в очередь потока записи.
+    В вызывающем потоке только подставляются аргументы сообщения, форматирование и запись — в потоке слушателя.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Класс для записи журнала с ротацией по размеру; старые файлы сжимаются gzip.
+    """
+    def __init__(self, path, max_bytes=AUDIT_LOG_MAX_BYTES, backup_count=AUDIT_LOG_BACKUP_COUNT):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self.compress
+
+    @staticmethod
+    def compress(source, destination):
+        """Сжатие заполненного файла журнала"""
+        with open(source, 'rb') as file, gzip.open(destination, 'wb') as archive:
+            shutil.copyfileobj(file, archive)
+        os.remove(source)
+
+
+def setup_logging(path=AUDIT_LOG_PATH, max_bytes=AUDIT_LOG_MAX_BYTES, backup_count=AUDIT_LOG_BACKUP_COUNT,
+                  level=logging.INFO):
+    """Настройка журнала аудита: очередь в корневом логгере и поток записи в файл с ротацией.
+    Поток останавливается при выходе из программы с дописыванием очереди; повторный вызов ничего не делает."""
+    logger = logging.getLogger()
+    if any(isinstance(handler, AuditQueueHandler) for handler in logger.handlers):
+        return None
+    handler = CompressingRotatingFileHandler(path, max_bytes, backup_count)
+    handler.setFormatter(JsonLineFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(AuditQueueHandler(log_queue))
+    logger.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def log_audit(operation, path, duration, size=None, error=None, **fields):
+    """Запись об операции в журнал аудита: длительность, объём данных и скорость.
+    Ошибка записывается через repr, чтобы в журнал попадал тип исключения даже при пустом сообщении."""
+    audit = {'operation': operation, 'path': path, 'status': 'ok', 'duration_ms': round(duration * 1000, 3),
+             'bytes': size, 'throughput_mb_s': round(size / duration / 1e6, 3) if size and duration > 0 else None}
+    audit.update(fields)
+    if error is not None:
+        audit['status'] = 'cancelled' if isinstance(error, TaskCancelled) else 'error'
+        audit['error'] = repr(error)
+        logging.error(f"{operation}: {path}: {error!r}", extra={'audit': audit})
+    else:
+        logging.info(f"{operation}: {path}", extra={'audit': audit})
+
+
+@contextlib.contextmanager
+def log_operation(operation, path=None, **fields):
+    """Контекст операции для журнала аудита. Внутри блока можно задать record['bytes'] и другие поля;
+    если объём не задан, берётся размер файла path. Исключение записывается и пробрасывается дальше
+    с признаком audited, чтобы вызывающий код не записывал ту же ошибку второй раз."""
+    record = dict(fields, bytes=None)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        fields = dict(record)
+        log_audit(operation, path, time.perf_counter() - started, fields.pop('bytes'), e, **fields)
+        e.audited = True
+        raise
+    fields = dict(record)
+    size = fields.pop('bytes')
+    if size is None and path and os.path.isfile(path):
+        size = os.path.getsize(path)
+    log_audit(operation, path, time.perf_counter() - started, size, **fields)
+
+
+# Формат потокового контейнера:
+#   заголовок: MAGIC | версия (1 байт) | длина тела (4 байта) | поля вида тег (1) + длина (4) + значение
+#   сегмент:   длина шифротекста (4 байта, старший бит — признак последнего сегмента) | шифротекст + MAC
+# Каждый сегмент шифруется AES-GCM со своим nonce (префикс файла + номер сегмента),
+# а в дополнительные данные входят заголовок, номер сегмента и признак последнего сегмента,
+# поэтому перестановка, подмена и обрезка сегментов обнаруживаются при расшифровке.
+# Необязательные поля метаданных (JSON) и превью (JPEG) шифруются тем же шифром, каждое со своим номером nonce
+# из SEALED_HEADER_FIELDS; их дополнительные данные — открытые поля заголовка.
+CONTAINER_MAGIC = b'LKSV'
+CONTAINER_VERSION = 1
+SEGMENT_SIZE = 1024 * 1024
+FINAL_SEGMENT_FLAG = 0x80000000
+NONCE_PREFIX_SIZE = 8
+TAG_SIZE = 16
+
+HEADER_SEGMENT_SIZE = 1
+HEADER_NONCE_PREFIX = 2
+HEADER_CONTENT_TYPE = 3
+HEADER_KEY_ID = 4
+HEADER_CIPHER = 5
+HEADER_METADATA = 6
+HEADER_THUMBNAIL = 7
+# зашифрованные поля заголовка и их номера nonce, недостижимые для сегментов данных
+SEALED_HEADER_FIELDS = {
+    HEADER_METADATA: 0xFFFFFFFF,
+    HEADER_THUMBNAIL: 0xFFFFFFFE,
+}
+
+# Формат данных, зашифрованных AEAD-шифром без контейнера:
+#   RAW_MAGIC | номер шифра (1 байт) | идентификатор ключа (8 байт) | nonce (12 байт) | шифротекст + MAC
+RAW_MAGIC = b'LKR'
+RAW_NONCE_SIZE = 12
+
+# Контейнер из записей переменной длины (по одному кадру на сегмент) вместо нарезки файла
+RECORD_SEGMENT_LIMIT = 16 * 1024 * 1024
+FRAMES_JPEG_CONTENT = b'frames/jpeg'
+FRAME_RECORD_HEADER = struct.Struct('>d')  # время захвата кадра (unix time)
+# Запись экрана: после времени кадра идёт заголовок кадра и изменившиеся плитки, каждая со своим заголовком
+SCREEN_TILES_CONTENT = b'screen/tiles'
+SCREEN_FRAME_HEADER = struct.Struct('>BHHHI')  # ключевой кадр, размер плитки, ширина, высота, число плиток
+SCREEN_TILE_HEADER = struct.Struct('>HHI')  # столбец, строка, длина закодированной плитки
+
+
+def pack_container_header(fields):
+    """Упаковка заголовка контейнера из словаря {тег: байты}"""
+    body = b''.join(struct.pack('>BI', tag, len(value)) + value for tag, value in sorted(fields.items()))
+    return CONTAINER_MAGIC + struct.pack('>BI', CONTAINER_VERSION, len(body)) + body
+
+
+def read_container_header(file):
+    """Чтение заголовка контейнера, возвращает исходные байты заголовка и словарь полей"""
+    prefix = bytes(file.read(len(CONTAINER_MAGIC) + 5))
+    if len(prefix) < len(CONTAINER_MAGIC) + 5 or not prefix.startswith(CONTAINER_MAGIC):
+        raise ValueError("Файл не является зашифрованным контейнером.")
+    version, body_length = struct.unpack('>BI', prefix[len(CONTAINER_MAGIC):])
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"Неподдерживаемая версия контейнера: {version}")
+    body = bytes(file.read(body_length))
+    if len(body) != body_length:
+        raise ValueError("Заголовок контейнера повреждён.")
+    fields = {}
+    position = 0
+    while position < body_length:
+        tag, length = struct.unpack_from('>BI', body, position)
+        position += 5
+        fields[tag] = body[position:position + length]
+        position += length
+    return prefix + body, fields
+
+
+def sealed_field_aad(fields):
+    """Дополнительные данные зашифрованных полей заголовка: все открытые поля"""
+    return pack_container_header({tag: value for tag, value in fields.items() if tag not in SEALED_HEADER_FIELDS})
+
+
+def json_safe(value, limit=256):
+    """Приведение метаданных к виду, пригодному для JSON: короткие байтовые строки декодируются,
+    длинные (миниатюры, ICC-профили) заменяются размером"""
+    if isinstance(value, dict):
+        return {str(key): json_safe(item, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item, limit) for item in value]
+    if isinstance(value, bytes):
+        if len(value) > limit:
+            return f"<{len(value)} байт>"
+        return value.decode('utf-8', errors='replace').rstrip('\x00')
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def is_container(file_path):
+    """Проверка, записан ли файл в формате потокового контейнера"""
+    with open(file_path, 'rb') as file:
+        return file.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+def part_file_path(path):
+    """Путь временного файла для записи path: расширение сохраняется, потому что по нему
+    OpenCV выбирает формат изображения и видео ('фото.png' -> 'фото.part.png')"""
+    root, extension = os.path.splitext(path)
+    return root + '.part' + extension
+
+
+def is_temporary_file(name):
+    """Недописанные и служебные файлы, которые не индексируются и не перешифровываются"""
+    return name.endswith(('.part', '.state', '.tmp')) or '.part.' in name
+
+
+def key_fingerprint(key):
+    """Идентификатор ключа для заголовка шифротекста: по нему ключ ищется в хранилище"""
+    return hashlib.sha256(b'leaks key id' + key).hexdigest()[:16]
+
+
+def segment_nonce(nonce_prefix, index):
+    """Nonce сегмента: случайный префикс файла и номер сегмента"""
+    return nonce_prefix + struct.pack('>I', index)
+
+
+def segment_aad(header, index, final):
+    """Дополнительные аутентифицируемые данные сегмента"""
+    return header + struct.pack('>QB', index, 1 if final else 0)
+
+
+class CipherBackend:
+    """
+    Базовый класс шифра для EncryptionManager.
+    encrypt/decrypt работают с самодостаточными байтами, а у AEAD-шифров есть объект aead
+    с интерфейсом encrypt(nonce, data, aad) для сегментов контейнера.
+    """
+    name = None
+    number = None
+    aead = None
+
+    def __init__(self, key):
+        self.key = key
+
+    def derive_key(self, info):
+        """Отдельный подключ шифра, выведенный из основного ключа через HKDF"""
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                    info=info).derive(base64.urlsafe_b64decode(self.key))
+
+    def encrypt(self, data):
+        nonce = os.urandom(RAW_NONCE_SIZE)
+        prefix = RAW_MAGIC + bytes([self.number]) + bytes.fromhex(key_fingerprint(self.key))[:8]
+        return prefix + nonce + self.aead.encrypt(nonce, data, prefix)
+
+    def decrypt(self, token):
+        prefix_size = len(RAW_MAGIC) + 9
+        prefix, nonce = token[:prefix_size], token[prefix_size:prefix_size + RAW_NONCE_SIZE]
+        return self.aead.decrypt(nonce, token[prefix_size + RAW_NONCE_SIZE:], prefix)
+
+
+class FernetBackend(CipherBackend):
+    """
+    Fernet (AES-128-CBC + HMAC + base64) — совместимость с файлами старых версий.
+    Для сегментов контейнера не используется: у Fernet нет дополнительных аутентифицируемых данных.
+    """
+    name = 'fernet'
+    number = 0
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.fernet = Fernet(key)
+
+    def encrypt(self, data):
+        return self.fernet.encrypt(data)
+
+    def decrypt(self, token):
+        return self.fernet.decrypt(token)
+
+
+class AESGCMBackend(CipherBackend):
+    """
+    AES-256-GCM на сырых байтах: аппаратное ускорение AES-NI, 28 байт накладных расходов
+    """
+    name = 'aes-gcm'
+    number = 1
+
+    def __init__(self, key):
+        super().__init__(key)
+        # тот же подключ, что использовался потоковым контейнером с первой версии
+        self.aead = AESGCM(self.derive_key(b'leaks stream container v1'))
+
+
+class ChaCha20Backend(CipherBackend):
+    """
+    ChaCha20-Poly1305 на сырых байтах: быстрее AES-GCM на процессорах без AES-NI
+    """
+    name = 'chacha20-poly1305'
+    number = 2
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.aead = ChaCha20Poly1305(self.derive_key(b'leaks chacha20-poly1305 v1'))
+
+
+CIPHER_BACKENDS = {backend.name: backend for backend in (FernetBackend, AESGCMBackend, ChaCha20Backend)}
+RAW_BACKENDS = {backend.number: backend.name for backend in CIPHER_BACKENDS.values()}
+DEFAULT_STREAM_BACKEND = AESGCMBackend.name
 
-# Настройка логирования
-logging.basicConfig(filename='security_app.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
 
 class EncryptionManager:
     """
     Класс для управления шифрованием и дешифрованием данных
     """
-    def __init__(self, key=None):
+    def __init__(self, key=None, workers=None, keystore=None, backend=FernetBackend.name,
+                 stream_backend=DEFAULT_STREAM_BACKEND):
         self.key = key or self.generate_key()
         self.fernet = Fernet(self.key)
+        self.workers = workers or os.cpu_count() or 1
+        self.key_id = key_fingerprint(self.key)
+        self.keystore = keystore
+        self.backends = {}
+        self.backend = self.get_backend(backend)
+        if self.get_backend(stream_backend).aead is None:
+            raise ValueError(f"Шифр {stream_backend} не подходит для потокового контейнера.")
+        self.stream_backend = stream_backend
+
+    @staticmethod
+    def generate_key():
+        """Генерация ключа шифрования"""
+        return Fernet.generate_key()
+
+    def get_backend(self, name):
+        """Шифр по имени; подготовленные объекты шифров кэшируются"""
+        if name not in self.backends:
+            if name not in CIPHER_BACKENDS:
+                raise ValueError(f"Неизвестный шифр: {name}")
+            self.backends[name] = CIPHER_BACKENDS[name](self.key)
+        return self.backends[name]
+
+    def encrypt_data(self, data):
+        """Шифрование данных"""
+        return self.backend.encrypt(data)
+
+    def decrypt_data(self, encrypted_data):
+        """Дешифрование данных. Шифр определяется по префиксу данных.
+        В токенах Fernet нет идентификатора ключа, поэтому при наличии хранилища перебираются все его ключи."""
+        if encrypted_data.startswith(RAW_MAGIC):
+            name = RAW_BACKENDS.get(encrypted_data[len(RAW_MAGIC)])
+            if name is None:
+                raise ValueError("Неизвестный шифр в зашифрованных данных.")
+            key_id = encrypted_data[len(RAW_MAGIC) + 1:len(RAW_MAGIC) + 9].hex()
+            return self.manager_for(key_id).get_backend(name).decrypt(encrypted_data)
+        if self.keystore is not None:
+            return self.keystore.multi_fernet.decrypt(encrypted_data)
+        return self.fernet.decrypt(encrypted_data)
+
+    def header_fields(self, fields=None):
+        """Поля заголовка контейнера с идентификатором ключа и именем шифра"""
+        header = dict(fields or {})
+        header[HEADER_KEY_ID] = self.key_id.encode()
+        header[HEADER_CIPHER] = self.stream_backend.encode()
+        return header
+
+    def manager_for(self, key_id):
+        """Менеджер шифрования для ключа с заданным идентификатором"""
+        if not key_id or key_id == self.key_id:
+            return self
+        if self.keystore is None:
+            raise ValueError(f"Файл зашифрован другим ключом ({key_id}).")
+        return self.keystore.manager(key_id)
+
+    def cipher_for(self, fields):
+        """Шифр для контейнера по идентификатору ключа и имени шифра из его заголовка"""
+        manager = self.manager_for(fields.get(HEADER_KEY_ID, b'').decode())
+        backend = manager.get_backend(fields.get(HEADER_CIPHER, DEFAULT_STREAM_BACKEND.encode()).decode())
+        if backend.aead is None:
+            raise ValueError(f"Шифр {backend.name} не подходит для потокового контейнера.")
+        return backend.aead
+
+    @property
+    def stream_cipher(self):
+        """AEAD-шифр для новых потоковых контейнеров"""
+        return self.get_backend(self.stream_backend).aead
+
+    def encrypt_stream(self, source, destination, segment_size=SEGMENT_SIZE, workers=None, metadata=None,
+                       thumbnail=None):
+        """Потоковое шифрование: данные читаются и шифруются сегментами, память не зависит от размера файла.
+        Сегменты шифруются параллельно в workers потоках и записываются в исходном порядке.
+        metadata и thumbnail сохраняются зашифрованными в заголовке контейнера."""
+        writer = SegmentWriter(destination, self.stream_cipher, segment_size, self.header_fields(), metadata,
+                               thumbnail)
+        return writer.write_stream(source, workers or self.workers)
+
+    def decrypt_stream(self, source, destination, workers=None):
+        """Потоковое дешифрование контейнера с проверкой MAC каждого сегмента"""
+        total = 0
+        for segment in SegmentReader(source, self.cipher_for).segments(workers or self.workers):
+            destination.write(segment)
+            total += len(segment)
+        return total
+
+    def encrypt_file(self, input_path, output_path, workers=None, task=None, metadata=None, thumbnail=None):
+        """Шифрование файла в потоковый контейнер.
+        task — фоновая задача TaskExecutor для отчёта о прогрессе и отмены."""
+        with open(input_path, 'rb') as source, open(output_path, 'wb') as destination:
+            if task is not None:
+                source = TrackedFile(source, task, os.path.getsize(input_path))
+            return self.encrypt_stream(source, destination, workers=workers, metadata=metadata, thumbnail=thumbnail)
+
+    def decrypt_file(self, input_path, output_path, workers=None, task=None):
+        """Дешифрование файла: потоковый контейнер или целый токен Fernet из старых версий"""
+        if not is_container(input_path):
+            with open(input_path, 'rb') as file:
+                decrypted_data = self.decrypt_data(file.read())
+            with open(output_path, 'wb') as file:
+                file.write(decrypted_data)
+            return len(decrypted_data)
+        with open(input_path, 'rb') as file, MappedSource(file) as source, \
+                open(output_path, 'wb') as destination:
+            if task is not None:
+                source = TrackedFile(source, task, os.path.getsize(input_path))
+            return self.decrypt_stream(source, destination, workers)
+
+    def verify_file(self, input_path, workers=None, task=None):
+        """Проверка целостности без записи расшифрованных данных: MAC всех сегментов и зашифрованных полей
+        заголовка, обрезка и лишние данные в конце. Возвращает число сегментов и байтов, при повреждении — исключение."""
+        if not is_container(input_path):
+            with open(input_path, 'rb') as file:
+                return {'segments': 1, 'bytes': len(self.decrypt_data(file.read()))}
+        segments = size = 0
+        with open(input_path, 'rb') as file, MappedSource(file) as source:
+            if task is not None:
+                source = TrackedFile(source, task, os.path.getsize(input_path))
+            reader = SegmentReader(source, self.cipher_for)
+            for tag in SEALED_HEADER_FIELDS:
+                self.open_sealed_field(reader.fields, tag)
+            for segment in reader.segments(workers or self.workers):
+                segments += 1
+                size += len(segment)
+            if len(source.read(1)):
+                raise ValueError("Контейнер повреждён: данные после последнего сегмента.")
+        return {'segments': segments, 'bytes': size}
+
+    def rekey_file(self, input_path, output_path=None, target=None, workers=None, task=None):
+        """Перешифрование файла ключом менеджера target (по умолчанию — этим) без декодирования изображений и видео.
+        Сегменты расшифровываются и сразу шифруются заново параллельно; открытые поля заголовка, метаданные и превью
+        переносятся. Результат пишется во временный файл и атомарно заменяет output_path (по умолчанию — исходный файл),
+        поэтому при ошибке исходный файл не меняется. Возвращает число байтов содержимого."""
+        target = target or self
+        output_path = output_path or input_path
+        descriptor, temporary_path = tempfile.mkstemp(prefix='.rekey-', suffix='.tmp',
+                                                      dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            with os.fdopen(descriptor, 'wb') as destination:
+                if is_container(input_path):
+                    size = self.rekey_stream(input_path, destination, target, workers or self.workers, task)
+                else:
+                    with open(input_path, 'rb') as file:
+                        data = self.decrypt_data(file.read())
+                    size = target.encrypt_stream(io.BytesIO(data), destination)
+                destination.flush()
+                os.fsync(destination.fileno())
+            shutil.copymode(input_path, temporary_path)
+            os.replace(temporary_path, output_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return size
+
+    def rekey_stream(self, input_path, destination, target, workers, task=None):
+        """Перенос сегментов контейнера под шифр target с новым префиксом nonce"""
+        size = 0
+        with open(input_path, 'rb') as file, MappedSource(file) as source:
+            if task is not None:
+                source = TrackedFile(source, task, os.path.getsize(input_path))
+            reader = SegmentReader(source, self.cipher_for)
+            fields = {tag: value for tag, value in reader.fields.items()
+                      if tag not in (HEADER_SEGMENT_SIZE, HEADER_NONCE_PREFIX, HEADER_KEY_ID, HEADER_CIPHER)
+                      and tag not in SEALED_HEADER_FIELDS}
+            writer = SegmentWriter(destination, target.stream_cipher, reader.segment_size, target.header_fields(fields),
+                                   self.open_metadata(reader.fields),
+                                   self.open_sealed_field(reader.fields, HEADER_THUMBNAIL))
+
+            def reseal(index, encrypted, final):
+                return writer.seal_segment(index, reader.open_segment(index, encrypted, final), final)
+
+            for frame, final in ordered_map(reseal, reader.frames(), workers):
+                writer.write_sealed(frame, final)
+                size += len(frame[1]) - TAG_SIZE
+        return size
+
+    def open_encrypted(self, file_path):
+        """Открытие контейнера для произвольного чтения без расшифровки всего файла"""
+        return EncryptedFileReader(file_path, self.cipher_for)
+
+    def encrypt_to_file(self, data, output_path, metadata=None, thumbnail=None):
+        """Шифрование данных из памяти (например, закодированного изображения) в контейнер"""
+        with open(output_path, 'wb') as destination:
+            return self.encrypt_stream(io.BytesIO(data), destination, metadata=metadata, thumbnail=thumbnail)
+
+    def encrypt_bytes(self, data):
+        """Шифрование данных из памяти в контейнер, возвращает байты контейнера"""
+        destination = io.BytesIO()
+        self.encrypt_stream(io.BytesIO(data), destination)
+        return destination.getvalue()
+
+    def open_sealed_field(self, fields, tag):
+        """Расшифровка зашифрованного поля заголовка; None, если поля нет"""
+        if tag not in fields:
+            return None
+        return self.cipher_for(fields).decrypt(segment_nonce(fields[HEADER_NONCE_PREFIX], SEALED_HEADER_FIELDS[tag]),
+                                               fields[tag], sealed_field_aad(fields))
+
+    def open_metadata(self, fields):
+        """Расшифровка блока метаданных по полям заголовка; None, если блока нет"""
+        plaintext = self.open_sealed_field(fields, HEADER_METADATA)
+        return None if plaintext is None else json.loads(plaintext)
+
+    def read_header_fields(self, file_path):
+        """Поля заголовка контейнера; для файлов старого формата — пустой словарь"""
+        if not is_container(file_path):
+            return {}
+        with open(file_path, 'rb') as file:
+            return read_container_header(file)[1]
+
+    def read_metadata(self, file_path):
+        """Метаданные зашифрованного файла: читается и расшифровывается только заголовок"""
+        return self.open_metadata(self.read_header_fields(file_path))
+
+    def read_thumbnail(self, file_path):
+        """Превью зашифрованного файла в JPEG без расшифровки содержимого; None, если превью нет"""
+        return self.open_sealed_field(self.read_header_fields(file_path), HEADER_THUMBNAIL)
+
+    def decrypt_file_data(self, input_path):
+        """Дешифрование файла целиком в память: контейнер или токен Fernet из старых версий"""
+        if not is_container(input_path):
+            with open(input_path, 'rb') as file:
+                return self.decrypt_data(file.read())
+        destination = io.BytesIO()
+        with open(input_path, 'rb') as source:
+            self.decrypt_stream(source, destination)
+        return destination.getvalue()
+
+    def decrypt_range(self, file_path, offset, size):
+        """Расшифровка только заданного диапазона байтов исходного файла"""
+        with self.open_encrypted(file_path) as reader:
+            reader.seek(offset)
+            return reader.read(size)
+
+
+# Типичные размеры данных для сравнения шифров: снимок с камеры, скриншот, фрагмент видео
+BENCHMARK_PAYLOADS = {
+    'image': 512 * 1024,
+    'screenshot': 4 * 1024 * 1024,
+    'video': 64 * 1024 * 1024,
+}
+
+
+def benchmark_backends(payloads=None, repeat=3, workers=1):
+    """Скорость (МБ/с) и накладные расходы по размеру для каждого шифра на типичных размерах данных.
+    Режим data — шифрование целого буфера, container — потоковый контейнер (только для AEAD-шифров)."""
+    payloads = payloads or BENCHMARK_PAYLOADS
+    results = []
+    for kind, size in payloads.items():
+        data = os.urandom(size)
+        for name in CIPHER_BACKENDS:
+            modes = ['data'] if name == FernetBackend.name else ['data', 'container']
+            for mode in modes:
+                if mode == 'data':
+                    manager = EncryptionManager(workers=workers, backend=name)
+                    encrypt, decrypt = manager.encrypt_data, manager.decrypt_data
+                else:
+                    manager = EncryptionManager(workers=workers, stream_backend=name)
+
+                    def encrypt(payload, manager=manager):
+                        return manager.encrypt_bytes(payload)
+
+                    def decrypt(token, manager=manager):
+                        destination = io.BytesIO()
+                        manager.decrypt_stream(io.BytesIO(token), destination)
+                        return destination.getvalue()
+                encrypt_times, decrypt_times = [], []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    token = encrypt(data)
+                    encrypt_times.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    decrypt(token)
+                    decrypt_times.append(time.perf_counter() - started)
+                results.append({
+                    'payload': kind,
+                    'size': size,
+                    'backend': name,
+                    'mode': mode,
+                    'encrypt_mb_per_second': size / min(encrypt_times) / 1e6,
+                    'decrypt_mb_per_second': size / min(decrypt_times) / 1e6,
+                    'overhead_percent': (len(token) - size) / size * 100,
+                })
+    return results
+
+
+def process_io_counters():
+    """Счётчики системных вызовов чтения и записи процесса (только Linux)"""
+    try:
+        with open('/proc/self/io') as file:
+            counters = dict(line.split(': ') for line in file.read().splitlines())
+        return int(counters['syscr']), int(counters['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """Пиковый объём резидентной памяти процесса в МБ (нет на Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def available_memory():
+    """Доступная память в байтах или None, если её не узнать"""
+    try:
+        with open('/proc/meminfo', encoding='ascii') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# прежний путь держит в памяти файл, промежуточный шифротекст и токен Fernet в base64 одновременно:
+# пиковая память около восьми размеров файла (замер: 431 МБ RSS на файле 51 МБ)
+WHOLE_MODE_MEMORY_FACTOR = 8
+
+
+def run_io_benchmark(mode, input_path, key, results):
+    """Шифрование и дешифрование файла одним способом ввода-вывода в отдельном процессе.
+    whole — прежний путь: файл читается целиком и шифруется одним токеном Fernet;
+    stream — контейнер с readinto в заранее выделенные буферы и mmap при расшифровке."""
+    import tracemalloc
+    manager = EncryptionManager(key, workers=1)
+    encrypted_path = input_path + f'.{mode}.dat'
+    output_path = input_path + f'.{mode}.out'
+    tracemalloc.start()
+    counters_before = process_io_counters()
+    started = time.perf_counter()
+    if mode == 'whole':
+        with open(input_path, 'rb') as file:
+            data = file.read()
+        with open(encrypted_path, 'wb') as file:
+            file.write(manager.fernet.encrypt(data))
+        del data
+        with open(encrypted_path, 'rb') as file:
+            data = manager.fernet.decrypt(file.read())
+        with open(output_path, 'wb') as file:
+            file.write(data)
+        del data
+    else:
+        manager.encrypt_file(input_path, encrypted_path)
+        manager.decrypt_file(encrypted_path, output_path)
+    elapsed = time.perf_counter() - started
+    counters_after = process_io_counters()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(input_path)
+    results.put({
+        'mode': mode,
+        'size': size,
+        'seconds': elapsed,
+        'mb_per_second': 2 * size / elapsed / 1e6,
+        'read_syscalls': counters_after[0] - counters_before[0] if counters_before else None,
+        'write_syscalls': counters_after[1] - counters_before[1] if counters_before else None,
+        'python_alloc_peak_mb': traced_peak / 1024 / 1024,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    os.remove(encrypted_path)
+    os.remove(output_path)
+
+
+def benchmark_io(input_path, modes=('whole', 'stream')):
+    """Сравнение способов ввода-вывода на файле: каждый способ запускается в отдельном процессе,
+    чтобы пиковая память одного замера не влияла на другой"""
+    context = multiprocessing.get_context('spawn')
+    key = EncryptionManager.generate_key()
+    results = []
+    size = os.path.getsize(input_path)
+    memory = available_memory()
+    for mode in modes:
+        if mode == 'whole' and memory is not None and size * WHOLE_MODE_MEMORY_FACTOR > memory:
+            results.append({'mode': mode, 'size': size,
+                            'skipped': f"нужно около {size * WHOLE_MODE_MEMORY_FACTOR / 2 ** 30:.1f} ГБ памяти, "
+                                       f"доступно {memory / 2 ** 30:.1f} ГБ"})
+            continue
+        results_queue = context.Queue()
+        process = context.Process(target=run_io_benchmark, args=(mode, input_path, key, results_queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            results.append({'mode': mode, 'size': os.path.getsize(input_path),
+                            'error': f"процесс завершился с кодом {process.exitcode}"})
+        else:
+            results.append(results_queue.get())
+    return results
+
+
+def create_benchmark_file(path, size):
+    """Файл заданного размера со случайным содержимым для замеров"""
+    block = os.urandom(SEGMENT_SIZE)
+    with open(path, 'wb') as file:
+        for _ in range(size // len(block)):
+            file.write(block)
+        file.write(block[:size % len(block)])
+
+
+# хранилище лежит рядом с программой, а не в текущем каталоге: запуск из другого каталога
+# не должен молча создавать новое хранилище с новыми ключами
+KEYSTORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keystore.json')
+
+
+class KeyStore:
+    """
+    Класс постоянного хранилища ключей.
+    Ключи хранятся зашифрованными мастер-ключом, который выводится из пароля через scrypt.
+    Менеджеры шифрования (вместе с подготовленными шифрами) кэшируются по идентификатору ключа,
+    поэтому расшифровка пачки файлов с разными ключами не создаёт шифры заново для каждого файла.
+    """
+    def __init__(self, path, password, cache_size=32, create=False):
+        """create — создать новое хранилище, если файла нет; иначе отсутствие файла считается ошибкой"""
+        self.path = path
+        self.cache_size = cache_size
+        self.managers = OrderedDict()
+        self.lock = threading.Lock()
+        self._multi_fernet = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.data = json.load(file)
+            self.master = self.derive_master(password, base64.b64decode(self.data['salt']))
+            try:
+                self.master.decrypt(self.data['check'].encode())
+            except InvalidToken:
+                raise ValueError("Неверный пароль хранилища ключей.") from None
+        else:
+            if not create:
+                raise ValueError(f"Хранилище ключей {path} не найдено.")
+            if not password:
+                raise ValueError("Пароль хранилища ключей не может быть пустым.")
+            salt = os.urandom(16)
+            self.master = self.derive_master(password, salt)
+            self.data = {'version': 1, 'salt': base64.b64encode(salt).decode(),
+                         'check': self.master.encrypt(b'keystore').decode(), 'active': None, 'keys': {}}
+            self.create_key()
+
+    @staticmethod
+    def derive_master(password, salt):
+        """Вывод мастер-ключа из пароля"""
+        master_key = Scrypt(salt=salt, length=32, n=2 ** 15, r=8, p=1).derive(password.encode())
+        return Fernet(base64.urlsafe_b64encode(master_key))
+
+    def save(self):
+        """Атомарная запись хранилища на диск"""
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self.data, file, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def create_key(self, activate=True):
+        """Создание нового ключа; по умолчанию он становится ключом для шифрования новых файлов"""
+        key = EncryptionManager.generate_key()
+        key_id = key_fingerprint(key)
+        self.data['keys'][key_id] = self.master.encrypt(key).decode()
+        if activate:
+            self.data['active'] = key_id
+        self._multi_fernet = None
+        self.save()
+        return key_id
+
+    @property
+    def active_key_id(self):
+        return self.data['active']
+
+    def key_ids(self):
+        return list(self.data['keys'])
+
+    def get_key(self, key_id):
+        """Расшифровка ключа по идентификатору"""
+        if key_id not in self.data['keys']:
+            raise ValueError(f"Ключ {key_id} не найден в хранилище.")
+        return self.master.decrypt(self.data['keys'][key_id].encode())
+
+    def manager(self, key_id=None, workers=None):
+        """Менеджер шифрования для ключа из пула (по умолчанию — для активного ключа)"""
+        key_id = key_id or self.active_key_id
+        with self.lock:
+            if key_id in self.managers:
+                self.managers.move_to_end(key_id)
+                return self.managers[key_id]
+        manager = EncryptionManager(self.get_key(key_id), workers, keystore=self)
+        with self.lock:
+            self.managers[key_id] = manager
+            if len(self.managers) > self.cache_size:
+                self.managers.popitem(last=False)
+        return manager
+
+    @property
+    def multi_fernet(self):
+        """Fernet со всеми ключами хранилища для старых токенов без идентификатора ключа"""
+        if self._multi_fernet is None:
+            self._multi_fernet = MultiFernet([Fernet(self.get_key(key_id)) for key_id in self.key_ids()])
+        return self._multi_fernet
+
+
+def read_chunks(source, chunk_size):
+    """Чтение потока кусками фиксированного размера с признаком последнего куска"""
+    chunk = source.read(chunk_size)
+    while True:
+        next_chunk = source.read(chunk_size) if len(chunk) == chunk_size else b''
+        yield chunk, not next_chunk
+        if not next_chunk:
+            return
+        chunk = next_chunk
+
+
+def read_into(source, view):
+    """Заполнение буфера из потока через readinto; меньше только в конце потока"""
+    filled = 0
+    while filled < len(view):
+        count = source.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def read_chunks_into(source, chunk_size, buffer_count):
+    """Чтение потока в заранее выделенные буферы без создания новых объектов bytes.
+    Буферы используются по кругу, поэтому одновременно обрабатываемых кусков должно быть
+    меньше buffer_count - 1 (ещё один буфер занят чтением наперёд)."""
+    buffers = [memoryview(bytearray(chunk_size)) for _ in range(buffer_count)]
+    current = buffers[0][:read_into(source, buffers[0])]
+    number = 1
+    while True:
+        if len(current) < chunk_size:
+            yield current, True
+            return
+        following = buffers[number % buffer_count]
+        following = following[:read_into(source, following)]
+        number += 1
+        yield current, not following
+        if not following:
+            return
+        current = following
+
+
+class MappedSource:
+    """
+    Класс для чтения файла через mmap: read возвращает срезы memoryview без копирования данных
+    """
+    def __init__(self, file):
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.view = memoryview(self.map)
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.position + size, len(self.view))
+        data = self.view[self.position:end]
+        self.position = end
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = offset if whence == io.SEEK_SET else \
+            self.position + offset if whence == io.SEEK_CUR else len(self.view) + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            pass  # на отображение ещё ссылаются срезы (например, из трассировки ошибки) — закроет сборщик мусора
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ordered_map(function, items, workers):
+    """Параллельное применение функции к элементам с сохранением порядка результатов.
+    Одновременно в работе не больше 2 * workers элементов, поэтому память ограничена."""
+    if workers <= 1:
+        for item in items:
+            yield function(*item)
+        return
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            pending.append(executor.submit(function, *item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class SegmentWriter:
+    """
+    Класс для записи потокового контейнера: каждый сегмент шифруется и аутентифицируется отдельно
+    """
+    def __init__(self, file, cipher, segment_size=SEGMENT_SIZE, fields=None, metadata=None, thumbnail=None):
+        """metadata — словарь для зашифрованного блока метаданных в заголовке, thumbnail — превью в JPEG"""
+        self.file = file
+        self.cipher = cipher
+        self.segment_size = segment_size
+        self.nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+        header_fields = dict(fields or {})
+        header_fields[HEADER_SEGMENT_SIZE] = struct.pack('>I', segment_size)
+        header_fields[HEADER_NONCE_PREFIX] = self.nonce_prefix
+        sealed = {}
+        if metadata is not None:
+            sealed[HEADER_METADATA] = json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode()
+        if thumbnail is not None:
+            sealed[HEADER_THUMBNAIL] = thumbnail
+        aad = sealed_field_aad(header_fields)
+        for tag, plaintext in sealed.items():
+            header_fields[tag] = cipher.encrypt(segment_nonce(self.nonce_prefix, SEALED_HEADER_FIELDS[tag]),
+                                                plaintext, aad)
+        self.header = pack_container_header(header_fields)
+        self.index = 0
+        self.finished = False
+        self.file.write(self.header)
+
+    @classmethod
+    def resume(cls, file, cipher):
+        """Продолжение записи в контейнер с уже записанным заголовком (например, после прерванной загрузки).
+        cipher — AEAD-шифр или функция, выбирающая шифр по полям заголовка."""
+        writer = cls.__new__(cls)
+        file.seek(0)
+        writer.file = file
+        writer.header, fields = read_container_header(file)
+        writer.cipher = cipher(fields) if callable(cipher) else cipher
+        writer.segment_size = struct.unpack('>I', fields[HEADER_SEGMENT_SIZE])[0]
+        writer.nonce_prefix = fields[HEADER_NONCE_PREFIX]
+        writer.index = 0
+        writer.finished = False
+        return writer
+
+    def segment_offset(self, index):
+        """Смещение кадра сегмента в файле: все сегменты, кроме последнего, одного размера"""
+        return len(self.header) + index * (4 + self.segment_size + TAG_SIZE)
+
+    def seal_segment(self, index, data, final):
+        """Шифрование сегмента с заданным номером.
+        Возвращает кадр из двух частей (длина и шифротекст), чтобы не склеивать их копированием."""
+        if index >= min(SEALED_HEADER_FIELDS.values()):
+            raise ValueError("Контейнер переполнен: номера сегментов заняты полями заголовка.")
+        encrypted = self.cipher.encrypt(segment_nonce(self.nonce_prefix, index), data,
+                                        segment_aad(self.header, index, final))
+        length = len(encrypted) | (FINAL_SEGMENT_FLAG if final else 0)
+        return (struct.pack('>I', length), encrypted), final
+
+    def write_sealed(self, frame, final):
+        """Запись уже зашифрованного сегмента"""
+        if self.finished:
+            raise ValueError("Контейнер уже завершён.")
+        for part in frame:
+            self.file.write(part)
+        self.index += 1
+        self.finished = final
+
+    def write_segment(self, data, final=False):
+        """Шифрование и запись очередного сегмента"""
+        self.write_sealed(*self.seal_segment(self.index, data, final))
+
+    def write_stream(self, source, workers=1):
+        """Шифрование всего потока; сегменты независимы, поэтому их можно шифровать параллельно"""
+        total = 0
+        first_index = self.index
+        if hasattr(source, 'readinto'):
+            pieces = read_chunks_into(source, self.segment_size, 2 * workers + 2)
+        else:
+            pieces = read_chunks(source, self.segment_size)
+        chunks = ((first_index + number, chunk, final) for number, (chunk, final) in enumerate(pieces))
+        for frame, final in ordered_map(self.seal_segment, chunks, workers):
+            self.write_sealed(frame, final)
+            total += len(frame[1]) - TAG_SIZE
+        return total
+
+
+class SegmentReader:
+    """
+    Класс для чтения потокового контейнера сегмент за сегментом
+    """
+    def __init__(self, file, cipher):
+        """cipher — AEAD-шифр или функция, выбирающая шифр по полям заголовка"""
+        self.file = file
+        self.header, self.fields = read_container_header(file)
+        self.cipher = cipher(self.fields) if callable(cipher) else cipher
+        self.segment_size = struct.unpack('>I', self.fields[HEADER_SEGMENT_SIZE])[0]
+        self.nonce_prefix = self.fields[HEADER_NONCE_PREFIX]
+
+    def read_frame(self):
+        """Чтение кадра сегмента с текущей позиции без расшифровки"""
+        frame = self.file.read(4)
+        if len(frame) < 4:
+            raise ValueError("Контейнер обрезан: отсутствует последний сегмент.")
+        length = struct.unpack('>I', frame)[0]
+        final = bool(length & FINAL_SEGMENT_FLAG)
+        length &= ~FINAL_SEGMENT_FLAG
+        if length > self.segment_size + TAG_SIZE:
+            raise ValueError("Контейнер повреждён: неверная длина сегмента.")
+        encrypted = self.file.read(length)
+        if len(encrypted) != length:
+            raise ValueError("Контейнер обрезан.")
+        return encrypted, final
+
+    def open_segment(self, index, encrypted, final):
+        """Расшифровка и проверка MAC сегмента с заданным номером"""
+        return self.cipher.decrypt(segment_nonce(self.nonce_prefix, index), encrypted,
+                                   segment_aad(self.header, index, final))
+
+    def frames(self):
+        """Последовательное чтение кадров до последнего сегмента"""
+        index = 0
+        while True:
+            encrypted, final = self.read_frame()
+            yield index, encrypted, final
+            if final:
+                return
+            index += 1
+
+    def segments(self, workers=1):
+        """Расшифрованные сегменты по порядку, при workers > 1 — параллельно"""
+        return ordered_map(self.open_segment, self.frames(), workers)
+
+    def __iter__(self):
+        return self.segments()
+
+
+class EncryptedFileReader(io.BufferedIOBase):
+    """
+    Класс для произвольного доступа к содержимому контейнера как к обычному файлу.
+    Все сегменты, кроме последнего, имеют одинаковый размер, поэтому смещение сегмента
+    вычисляется по его номеру, и чтение диапазона расшифровывает только затронутые сегменты.
+    """
+    def __init__(self, file_path, cipher, cache_size=4):
+        super().__init__()
+        self.file = open(file_path, 'rb')
+        try:
+            self.segment_reader = SegmentReader(self.file, cipher)
+            self.segment_size = self.segment_reader.segment_size
+            self.header_size = len(self.segment_reader.header)
+            self.frame_size = 4 + self.segment_size + TAG_SIZE
+            data_size = os.fstat(self.file.fileno()).st_size - self.header_size
+            self.segment_count = max(1, -(-data_size // self.frame_size))
+            last_frame_size = data_size - (self.segment_count - 1) * self.frame_size
+            if last_frame_size < 4 + TAG_SIZE:
+                raise ValueError("Контейнер обрезан.")
+        except Exception:
+            self.file.close()
+            raise
+        self.size = (self.segment_count - 1) * self.segment_size + last_frame_size - 4 - TAG_SIZE
+        self.position = 0
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def read_segment(self, index):
+        """Расшифровка сегмента по номеру с небольшим LRU-кэшем для мелких чтений демультиплексора"""
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        self.file.seek(self.header_size + index * self.frame_size)
+        encrypted, final = self.segment_reader.read_frame()
+        if final != (index == self.segment_count - 1) or (not final and len(encrypted) != self.segment_size + TAG_SIZE):
+            raise ValueError("Контейнер повреждён: нарушена структура сегментов.")
+        data = self.segment_reader.open_segment(index, encrypted, final)
+        self.cache[index] = data
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Отрицательная позиция в файле.")
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = max(0, min(size, self.size - self.position))
+        parts = []
+        while size > 0:
+            index, start = divmod(self.position, self.segment_size)
+            part = self.read_segment(index)[start:start + size]
+            parts.append(part)
+            self.position += len(part)
+            size -= len(part)
+        return b''.join(parts)
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        self.cache.clear()
+        super().close()
+
+
+class FrameRecordReader:
+    """
+    Класс для чтения покадрового контейнера (запись с веб-камеры или покадрово зашифрованное видео).
+    Индекс кадров строится по длинам сегментов без расшифровки: переход к кадру расшифровывает только его,
+    а файл, который ещё записывается, читается по мере роста.
+    """
+    CONTENT_TYPE = FRAMES_JPEG_CONTENT
+
+    def __init__(self, file_path, cipher):
+        self.file = open(file_path, 'rb')
+        try:
+            self.segment_reader = SegmentReader(self.file, cipher)
+            if self.segment_reader.fields.get(HEADER_CONTENT_TYPE) != self.CONTENT_TYPE:
+                raise ValueError("Файл не является покадровым контейнером.")
+        except Exception:
+            self.file.close()
+            raise
+        self.offsets = []
+        self.scan_position = len(self.segment_reader.header)
+        self.finished = False
+        self.timestamps = {}
+        self.refresh()
+
+    def refresh(self):
+        """Дополнение индекса кадрами, дописанными с прошлого вызова; возвращает число новых кадров.
+        Недописанный последний кадр в индекс не попадает."""
+        file_size = os.fstat(self.file.fileno()).st_size
+        added = 0
+        while not self.finished and self.scan_position + 4 <= file_size:
+            self.file.seek(self.scan_position)
+            length = struct.unpack('>I', self.file.read(4))[0]
+            final = bool(length & FINAL_SEGMENT_FLAG)
+            length &= ~FINAL_SEGMENT_FLAG
+            if length > self.segment_reader.segment_size + TAG_SIZE:
+                raise ValueError("Контейнер повреждён: неверная длина сегмента.")
+            end = self.scan_position + 4 + length
+            if end > file_size:
+                break
+            if length > TAG_SIZE:  # пустой последний сегмент отмечает конец записи и кадром не является
+                self.offsets.append(self.scan_position)
+                added += 1
+            self.scan_position = end
+            self.finished = final
+        return added
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read_record(self, index):
+        """Время и байты JPEG кадра с заданным номером; расшифровывается только этот кадр"""
+        self.file.seek(self.offsets[index])
+        encrypted, final = self.segment_reader.read_frame()
+        record = self.segment_reader.open_segment(index, encrypted, final)
+        timestamp, = FRAME_RECORD_HEADER.unpack_from(record)
+        self.timestamps[index] = timestamp
+        return timestamp, memoryview(record)[FRAME_RECORD_HEADER.size:]
+
+    def frame(self, index):
+        """Время и декодированный кадр с заданным номером"""
+        timestamp, data = self.read_record(index)
+        return timestamp, cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def timestamp(self, index):
+        if index not in self.timestamps:
+            self.read_record(index)
+        return self.timestamps[index]
+
+    def find_time(self, seconds):
+        """Номер первого кадра не раньше seconds от начала записи.
+        Время кадров растёт, поэтому двоичный поиск расшифровывает лишь log2(N) кадров."""
+        if not self.offsets:
+            return 0
+        target = self.timestamp(0) + seconds
+        low, high = 0, len(self.offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def frames(self, start=0, stop=None):
+        """Кадры с номерами [start, stop) вместе со временем"""
+        for index in range(start, len(self.offsets) if stop is None else min(stop, len(self.offsets))):
+            yield self.frame(index)
+
+    def follow(self, live=True, poll_interval=0.05, idle_timeout=None):
+        """Кадры по мере записи файла. В режиме live показ начинается с последнего готового кадра,
+        а при отставании промежуточные кадры пропускаются, чтобы задержка просмотра не накапливалась;
+        иначе выдаются все кадры с начала. Завершается на последнем сегменте
+        или если файл не растёт дольше idle_timeout секунд."""
+        index = max(0, len(self.offsets) - 1) if live else 0
+        idle_since = time.monotonic()
+        while True:
+            if index < len(self.offsets):
+                if live:
+                    index = len(self.offsets) - 1
+                yield self.frame(index)
+                index += 1
+                idle_since = time.monotonic()
+                self.refresh()
+                continue
+            if self.finished:
+                return
+            if not self.refresh():
+                if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                    return
+                time.sleep(poll_interval)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ScreenRecordReader(FrameRecordReader):
+    """
+    Класс для чтения записи экрана: кадр собирается из ближайшего предыдущего ключевого кадра
+    и изменившихся плиток последующих кадров. При последовательном чтении холст только дополняется.
+    """
+    CONTENT_TYPE = SCREEN_TILES_CONTENT
+    FORWARD_LIMIT = 32  # при переходе дальше вперёд кадр собирается заново от ключевого
+
+    def __init__(self, file_path, cipher):
+        super().__init__(file_path, cipher)
+        self.canvas = None
+        self.canvas_index = None
+
+    def apply_record(self, index):
+        """Наложение плиток кадра на холст, возвращает время кадра"""
+        timestamp, payload = self.read_record(index)
+        keyframe, tile_size, width, height, count = SCREEN_FRAME_HEADER.unpack_from(payload)
+        if keyframe and (self.canvas is None or self.canvas.shape[:2] != (height, width)):
+            self.canvas = np.zeros((height, width, 3), np.uint8)
+        if self.canvas is None:
+            raise ValueError("Запись экрана повреждена: нет ключевого кадра.")
+        position = SCREEN_FRAME_HEADER.size
+        for _ in range(count):
+            column, row, length = SCREEN_TILE_HEADER.unpack_from(payload, position)
+            position += SCREEN_TILE_HEADER.size
+            tile = cv2.imdecode(np.frombuffer(payload[position:position + length], np.uint8), cv2.IMREAD_COLOR)
+            position += length
+            y, x = row * tile_size, column * tile_size
+            self.canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        self.canvas_index = index
+        return timestamp
+
+    def keyframe_before(self, index):
+        """Номер ближайшего ключевого кадра не позже index"""
+        while index > 0 and not self.read_record(index)[1][0]:
+            index -= 1
+        return index
+
+    def frame(self, index):
+        if self.canvas_index is not None and 0 <= index - self.canvas_index <= self.FORWARD_LIMIT:
+            start = self.canvas_index + 1
+        else:
+            start = self.keyframe_before(index)
+        timestamp = self.timestamp(index) if start > index else None
+        for number in range(start, index + 1):
+            timestamp = self.apply_record(number)
+        return timestamp, self.canvas.copy()
+
+
+# Кодеки изображений перед шифрованием: расширение для cv2.imencode и параметры кодирования.
+# 'raw' шифрует исходные байты файла без декодирования и перекодирования.
+IMAGE_CODECS = {
+    'raw': None,
+    'png': ('.png', [('IMWRITE_PNG_COMPRESSION', 3)]),
+    'png-fast': ('.png', [('IMWRITE_PNG_COMPRESSION', 1)]),
+    'png-max': ('.png', [('IMWRITE_PNG_COMPRESSION', 9)]),
+    'webp-lossless': ('.webp', [('IMWRITE_WEBP_QUALITY', 101)]),
+}
+
+# Уже сжатые форматы шифруются как есть: перекодирование JPEG в PNG увеличивает файл в разы
+IMAGE_CODEC_BY_EXTENSION = {
+    '.jpg': 'raw',
+    '.jpeg': 'raw',
+    '.png': 'raw',
+    '.webp': 'raw',
+}
+DEFAULT_IMAGE_CODEC = 'png'
+
+# Превью в заголовке контейнера: сторона изображения, качество JPEG и число кадров в превью видео
+THUMBNAIL_SIZE = 160
+THUMBNAIL_QUALITY = 80
+PREVIEW_FRAMES = 4
+
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    """Уменьшение кадра до size по большей стороне и кодирование в JPEG для превью; None при ошибке"""
+    height, width = image.shape[:2]
+    scale = size / max(width, height)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    return encoded.tobytes() if success else None
+
+
+class ImageManager:
+    """
+    Класс для управления изображениями и их шифрованием
+    """
+    def __init__(self, encryption_manager, codec_by_extension=None, default_codec=DEFAULT_IMAGE_CODEC):
+        self.encryption_manager = encryption_manager
+        self.codec_by_extension = IMAGE_CODEC_BY_EXTENSION if codec_by_extension is None else codec_by_extension
+        self.default_codec = default_codec
+
+    def choose_codec(self, image_path):
+        """Выбор кодека по расширению файла"""
+        extension = os.path.splitext(image_path)[1].lower()
+        return self.codec_by_extension.get(extension, self.default_codec)
+
+    @staticmethod
+    def encode_image(image_path, codec):
+        """Подготовка байтов изображения к шифрованию выбранным кодеком"""
+        if codec not in IMAGE_CODECS:
+            raise ValueError(f"Неизвестный кодек изображения: {codec}")
+        if IMAGE_CODECS[codec] is None:
+            with open(image_path, 'rb') as file:
+                data = file.read()
+            if cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8) is None:
+                raise ValueError("Неверный формат изображения.")
+            return data
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError("Неверный формат изображения.")
+        extension, params = IMAGE_CODECS[codec]
+        flat_params = [value for name, level in params for value in (getattr(cv2, name), level)]
+        success, encoded_image = cv2.imencode(extension, image, flat_params)
+        if not success:
+            raise ValueError(f"Не удалось закодировать изображение кодеком {codec}.")
+        return encoded_image.tobytes()
+
+    def encrypt_image_file(self, image_path, encrypted_image_path, codec=None):
+        """Шифрование изображения без взаимодействия с пользователем, ошибки пробрасываются.
+        Если кодек не задан, он выбирается по расширению файла."""
+        codec = codec or self.choose_codec(image_path)
+        data = self.encode_image(image_path, codec)
+        metadata = self.metadata_block(image_path)
+        if metadata is not None:
+            metadata['codec'] = codec
+        thumbnail = self.thumbnail_from_bytes(data, max(metadata['width'], metadata['height']) if metadata else None)
+        self.encryption_manager.encrypt_to_file(data, encrypted_image_path, metadata, thumbnail)
+
+    @staticmethod
+    def thumbnail_from_bytes(data, longest_side=None):
+        """Превью закодированного изображения. Если известен размер, JPEG декодируется сразу
+        в уменьшенном масштабе (1/2, 1/4 или 1/8), что в разы быстрее полного декодирования."""
+        flag = cv2.IMREAD_COLOR
+        if longest_side:
+            for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                    (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if longest_side // factor >= THUMBNAIL_SIZE:
+                    flag = reduced
+                    break
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        return None if image is None else make_thumbnail(image)
+
+    def benchmark_codecs(self, image_path, repeat=3):
+        """Сравнение кодеков на изображении: размер результата и скорость кодирования с шифрованием"""
+        source_size = os.path.getsize(image_path)
+        results = []
+        for codec in IMAGE_CODECS:
+            try:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    encoded = self.encode_image(image_path, codec)
+                    encrypted_size = len(self.encryption_manager.encrypt_bytes(encoded))
+                elapsed = (time.perf_counter() - started) / repeat
+            except (ValueError, cv2.error) as e:
+                results.append({'codec': codec, 'error': str(e)})
+                continue
+            results.append({
+                'codec': codec,
+                'size': encrypted_size,
+                'ratio': encrypted_size / source_size if source_size else 0.0,
+                'seconds': elapsed,
+                'mb_per_second': source_size / elapsed / 1e6 if elapsed else float('inf'),
+            })
+        return results
+
+    def encrypt_image(self, image_path, encrypted_image_path, codec=None):
+        """Шифрование изображения с записью в журнал аудита; ошибки пробрасываются"""
+        with log_operation('encrypt_image', image_path, target=encrypted_image_path, codec=codec):
+            self.encrypt_image_file(image_path, encrypted_image_path, codec)
+
+    def load_encrypted_image(self, encrypted_image_path):
+        """Дешифрование и декодирование изображения в массив без записи на диск"""
+        decrypted_data = self.encryption_manager.decrypt_file_data(encrypted_image_path)
+        nparr = np.frombuffer(decrypted_data, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Не удалось декодировать изображение.")
+        return image
+
+    def decrypt_image_file(self, encrypted_image_path, output_image_path):
+        """Дешифрование изображения без взаимодействия с пользователем, ошибки пробрасываются"""
+        cv2.imwrite(output_image_path, self.load_encrypted_image(encrypted_image_path))
+
+    def decrypt_image(self, encrypted_image_path, output_image_path):
+        """Дешифрование изображения с записью в журнал аудита; ошибки пробрасываются"""
+        with log_operation('decrypt_image', encrypted_image_path, target=output_image_path):
+            self.decrypt_image_file(encrypted_image_path, output_image_path)
+
+    def extract_metadata(self, image_path):
+        """Извлечение метаданных изображения"""
+        try:
+            image = Image.open(image_path)
+            metadata = image.info
+            exif_data = piexif.load(image.info['exif']) if 'exif' in image.info else {}
+            return metadata, exif_data
+        except Exception as e:
+            return str(e)
+
+    @staticmethod
+    def exif_names(exif_data):
+        """EXIF с именами тегов вместо номеров; встроенная миниатюра не сохраняется"""
+        named = {}
+        for ifd, tags in exif_data.items():
+            if not isinstance(tags, dict):
+                continue
+            names = piexif.TAGS.get(ifd, {})
+            named[ifd] = {names.get(tag, {}).get('name', str(tag)): value for tag, value in tags.items()}
+        return json_safe(named)
+
+    def metadata_block(self, image_path=None, data=None, name=None):
+        """Метаданные изображения для заголовка контейнера: размеры, формат, сведения PIL и EXIF.
+        Изображение задаётся путём к файлу или закодированными байтами; None, если PIL его не читает."""
+        def source():
+            return io.BytesIO(data) if data is not None else image_path
+
+        try:
+            with Image.open(source()) as image:
+                block = {'type': 'image', 'width': image.width, 'height': image.height, 'format': image.format}
+        except OSError:
+            return None
+        if image_path is not None:
+            block['name'] = name or os.path.basename(image_path)
+            block['size'] = os.path.getsize(image_path)
+            block['created'] = os.path.getmtime(image_path)
+        else:
+            block['name'] = name
+            block['size'] = len(data)
+            block['created'] = time.time()
+        extracted = self.extract_metadata(source())
+        if isinstance(extracted, tuple):
+            info, exif_data = extracted
+            block['info'] = json_safe({key: value for key, value in info.items() if key not in ('exif', 'icc_profile')})
+            block['exif'] = self.exif_names(exif_data)
+        return block
+
+
+class VideoManager:
+    """
+    Класс для управления видео и его шифрованием
+    """
+    def __init__(self, encryption_manager):
+        self.encryption_manager = encryption_manager
+
+    def encrypt_video(self, video_path, encrypted_video_path, per_frame=False, task=None):
+        """Шифрование видео целиком или покадрово с записью в журнал аудита; ошибки пробрасываются"""
+        with log_operation('encrypt_video', video_path, target=encrypted_video_path, per_frame=per_frame):
+            if per_frame:
+                self.encrypt_video_frames(video_path, encrypted_video_path, task=task)
+            else:
+                self.encryption_manager.encrypt_file(video_path, encrypted_video_path, task=task,
+                                                     metadata=self.metadata_block(video_path),
+                                                     thumbnail=self.make_preview(video_path))
+
+    def decrypt_video(self, encrypted_video_path, output_video_path, task=None):
+        """Дешифрование видео с записью в журнал аудита; покадровый контейнер собирается в видеофайл.
+        Ошибки пробрасываются."""
+        with log_operation('decrypt_video', encrypted_video_path, target=output_video_path):
+            if self.is_frame_container(encrypted_video_path):
+                self.export_frames(encrypted_video_path, output_video_path, task=task)
+            else:
+                self.encryption_manager.decrypt_file(encrypted_video_path, output_video_path, task=task)
+
+    def extract_metadata(self, video_path):
+        """Извлечение метаданных видео; зашифрованные файлы читаются без расшифровки на диск"""
+        try:
+            with self.open_capture(video_path) as cap:
+                metadata = {
+                    "Ширина кадра": cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+                    "Высота кадра": cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                    "Количество кадров": cap.get(cv2.CAP_PROP_FRAME_COUNT),
+                    "FPS": cap.get(cv2.CAP_PROP_FPS),
+                    "Кодек": cap.get(cv2.CAP_PROP_FOURCC),
+                    "Длительность (сек)": cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS)
+                }
+            return metadata
+        except Exception as e:
+            return str(e)
+
+    def metadata_block(self, video_path):
+        """Метаданные видео для заголовка контейнера: размеры, длительность и свойства потока"""
+        block = {
+            'type': 'video',
+            'name': os.path.basename(video_path),
+            'size': os.path.getsize(video_path),
+            'created': os.path.getmtime(video_path),
+        }
+        metadata = self.extract_metadata(video_path)
+        if isinstance(metadata, dict):
+            block['width'] = int(metadata["Ширина кадра"])
+            block['height'] = int(metadata["Высота кадра"])
+            block['duration'] = metadata["Длительность (сек)"]
+            block['video'] = json_safe(metadata)
+        return block
+
+    def make_preview(self, video_path, frames=PREVIEW_FRAMES):
+        """Превью видео: равномерно взятые кадры, собранные в сетку 2 x N/2 и закодированные в JPEG.
+        None, если кадры не читаются."""
+        images = []
+        with self.open_capture(video_path) as cap:
+            count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            for number in range(frames):
+                if count > 0:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, (2 * number + 1) * count // (2 * frames))
+                success, frame = cap.read()
+                if not success:
+                    break
+                height, width = frame.shape[:2]
+                images.append(cv2.resize(frame, (THUMBNAIL_SIZE, max(1, THUMBNAIL_SIZE * height // width)),
+                                         interpolation=cv2.INTER_AREA))
+        if not images:
+            return None
+        images += [np.zeros_like(images[0])] * (len(images) % 2)
+        grid = np.vstack([np.hstack(images[row:row + 2]) for row in range(0, len(images), 2)])
+        return make_thumbnail(grid, 2 * THUMBNAIL_SIZE)
+
+    @contextlib.contextmanager
+    def open_capture(self, video_path):
+        """Открытие видео для чтения кадров. Зашифрованные файлы расшифровываются в памяти
+        по мере чтения, открытый текст на диск не записывается."""
+        if not video_path.endswith('.dat') and not is_container(video_path):
+            cap = cv2.VideoCapture(video_path)
+            try:
+                yield cap
+            finally:
+                cap.release()
+            return
+        if is_container(video_path):
+            source = self.encryption_manager.open_encrypted(video_path)
+        else:
+            with open(video_path, 'rb') as file:
+                source = io.BytesIO(self.encryption_manager.decrypt_data(file.read()))
+        with source:
+            try:
+                cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [])
+            except cv2.error:
+                cap = None  # старые версии OpenCV не умеют читать видео из потока
+            if cap is not None:
+                try:
+                    yield cap
+                finally:
+                    cap.release()
+                return
+            source.seek(0)
+            with self.pipe_to_capture(source) as cap:
+                yield cap
+
+    @staticmethod
+    @contextlib.contextmanager
+    def pipe_to_capture(source):
+        """Передача расшифрованных данных декодеру через именованный канал.
+        Подходит только для потоковых форматов (например, mp4 с moov в начале файла)."""
+        if not hasattr(os, 'mkfifo'):
+            raise RuntimeError("Для воспроизведения без временных файлов нужен OpenCV 4.10 или новее.")
+        with tempfile.TemporaryDirectory() as pipe_dir:
+            pipe_path = os.path.join(pipe_dir, 'video_pipe')
+            os.mkfifo(pipe_path, 0o600)
+
+            def feed():
+                try:
+                    with open(pipe_path, 'wb') as pipe:
+                        while True:
+                            chunk = source.read(SEGMENT_SIZE)
+                            if not chunk:
+                                break
+                            pipe.write(chunk)
+                except (BrokenPipeError, ValueError):
+                    pass  # декодер закрыл канал раньше конца файла
+
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+            cap = cv2.VideoCapture(pipe_path)
+            try:
+                yield cap
+            finally:
+                cap.release()
+                # если декодер так и не открыл канал, писатель ждёт читателя — освобождаем его
+                os.close(os.open(pipe_path, os.O_RDONLY | os.O_NONBLOCK))
+                feeder.join()
+
+    def encrypt_video_frames(self, video_path, encrypted_video_path, jpeg_quality=85, workers=None, task=None):
+        """Покадровое шифрование: кадры декодируются, сжимаются в JPEG и шифруются по одному вместе со временем.
+        Каждый кадр расшифровывается и декодируется независимо от остальных, что даёт точную перемотку,
+        расшифровку отдельных отрезков и просмотр файла, который ещё записывается. Возвращает число кадров."""
+        metadata = self.metadata_block(video_path)
+        metadata['frames'] = 'jpeg'
+        thumbnail = self.make_preview(video_path)
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError("Не удалось открыть видео.")
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+
+        def read_frames():
+            previous = -1.0
+            for number in itertools.count():
+                if task is not None:
+                    task.check_cancelled()
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                if timestamp <= previous and fps > 0:
+                    timestamp = number / fps  # декодер не сообщает время кадра
+                previous = timestamp
+                yield timestamp, frame
+
+        def encode(timestamp, frame):
+            success, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if not success:
+                raise ValueError("Не удалось закодировать кадр.")
+            return FRAME_RECORD_HEADER.pack(timestamp) + encoded.tobytes()
+
+        count = 0
+        try:
+            with open(encrypted_video_path, 'wb') as file:
+                writer = SegmentWriter(file, self.encryption_manager.stream_cipher, RECORD_SEGMENT_LIMIT,
+                                       self.encryption_manager.header_fields({HEADER_CONTENT_TYPE: FRAMES_JPEG_CONTENT}),
+                                       metadata, thumbnail)
+                for record in ordered_map(encode, read_frames(), workers or self.encryption_manager.workers):
+                    writer.write_segment(record)
+                    file.flush()  # кадр сразу доступен тому, кто следит за файлом
+                    count += 1
+                    if task is not None:
+                        task.report_progress(count, total)
+                writer.write_segment(b'', final=True)
+        finally:
+            cap.release()
+        return count
+
+    def is_frame_container(self, video_path):
+        """Проверка, зашифровано ли видео покадрово"""
+        return self.encryption_manager.read_header_fields(video_path).get(HEADER_CONTENT_TYPE) == FRAMES_JPEG_CONTENT
+
+    def open_frames(self, encrypted_video_path):
+        """Открытие покадрового контейнера для перемотки и чтения отдельных кадров"""
+        return FrameRecordReader(encrypted_video_path, self.encryption_manager.cipher_for)
+
+    def export_frames(self, encrypted_video_path, output_path, start=0.0, end=None, task=None):
+        """Расшифровка отрезка [start, end) секунд покадрового контейнера в обычный видеофайл.
+        Расшифровываются только кадры отрезка; возвращает их число."""
+        with self.open_frames(encrypted_video_path) as reader:
+            first = reader.find_time(start)
+            last = len(reader) if end is None else reader.find_time(end)
+            fps = 25.0
+            if len(reader) > 1 and reader.timestamp(len(reader) - 1) > reader.timestamp(0):
+                fps = (len(reader) - 1) / (reader.timestamp(len(reader) - 1) - reader.timestamp(0))
+            writer = None
+            try:
+                for number, (_, frame) in enumerate(reader.frames(first, last), 1):
+                    if task is not None:
+                        task.check_cancelled()
+                        task.report_progress(number, last - first)
+                    if writer is None:
+                        height, width = frame.shape[:2]
+                        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+                    writer.write(frame)
+            finally:
+                if writer is not None:
+                    writer.release()
+        return max(0, last - first)
+
+    def iter_frames(self, video_path, start=0.0):
+        """Генератор кадров видео: воспроизведение начинается до окончания расшифровки.
+        Покадровый контейнер начинает показ с кадра start секунд, не расшифровывая предыдущие."""
+        if self.is_frame_container(video_path):
+            with self.open_frames(video_path) as reader:
+                for _, frame in reader.frames(reader.find_time(start)):
+                    yield frame
+            return
+        with self.open_capture(video_path) as cap:
+            while cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+
+
+def show_frames(frames, window_title):
+    """Показ кадров в окне OpenCV, клавиша q прерывает воспроизведение"""
+    try:
+        for frame in frames:
+            cv2.imshow(window_title, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        frames.close()
+        cv2.destroyAllWindows()
+
+
+LIVE_IDLE_TIMEOUT = 5.0  # секунд без новых кадров, после которых просмотр идущей записи завершается
+
+
+class WebcamManager:
+    """
+    Класс для управления веб-камерой и шифрования снимков с веб-камеры
+    """
+    def __init__(self, encryption_manager):
+        self.encryption_manager = encryption_manager
+
+    def capture_and_encrypt_image(self, output_path):
+        """Захват и шифрование изображения с веб-камеры"""
+        cap = cv2.VideoCapture(0)
+        try:
+            with log_operation('capture_webcam', output_path) as operation:
+                ret, frame = cap.read()
+                if not ret:
+                    raise RuntimeError("Не удалось получить кадр с веб-камеры.")
+                _, encoded_image = cv2.imencode('.png', frame)
+                data = encoded_image.tobytes()
+                metadata = ImageManager(self.encryption_manager).metadata_block(data=data, name="Веб-камера")
+                operation['bytes'] = self.encryption_manager.encrypt_to_file(data, output_path, metadata,
+                                                                             make_thumbnail(frame))
+        finally:
+            cap.release()
+
+    def decrypt_and_show_image(self, encrypted_image_path):
+        """Дешифрование и отображение изображения с веб-камеры"""
+        decrypted_data = self.encryption_manager.decrypt_file_data(encrypted_image_path)
+        nparr = np.frombuffer(decrypted_data, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        cv2.imshow('Дешифрованное изображение с веб-камеры', image)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
+
+    def start_recording(self, output_path, source=None):
+        """Запуск непрерывной зашифрованной записи с веб-камеры"""
+        return WebcamRecorder(self.encryption_manager, output_path, source).start()
+
+    def iter_recorded_frames(self, encrypted_video_path, live=False):
+        """Генератор кадров записи вместе со временем захвата.
+        live — просмотр записи, которая ещё идёт: с последнего кадра и без накопления задержки."""
+        with FrameRecordReader(encrypted_video_path, self.encryption_manager.cipher_for) as reader:
+            if live:
+                yield from reader.follow(live=True, idle_timeout=LIVE_IDLE_TIMEOUT)
+            else:
+                yield from reader.frames()
+
+
+class SyntheticFrameSource:
+    """
+    Класс-источник синтетических кадров с интерфейсом cv2.VideoCapture для проверки записи без камеры
+    """
+    def __init__(self, width=1920, height=1080, fps=30, frame_count=None):
+        self.width = width
+        self.height = height
+        self.interval = 1 / fps if fps else 0
+        self.frame_count = frame_count
+        self.index = 0
+        self.next_time = None
+        self.columns = np.tile((np.arange(width) % 256).astype(np.uint8), (height, 1))
+        self.rows = np.tile((np.arange(height) % 256).astype(np.uint8)[:, None], (1, width))
+
+    def read(self):
+        if self.frame_count is not None and self.index >= self.frame_count:
+            return False, None
+        now = time.perf_counter()
+        if self.next_time is not None and now < self.next_time:
+            time.sleep(self.next_time - now)
+        self.next_time = max(now, self.next_time or now) + self.interval
+        # движущийся градиент, чтобы кодировщик работал с меняющимися кадрами
+        frame = np.dstack([np.roll(self.columns, self.index * 8, axis=1), self.rows,
+                           np.full_like(self.rows, self.index % 256)])
+        self.index += 1
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class FrameRingBuffer:
+    """
+    Класс кольцевого буфера кадров между потоком захвата и кодировщиком.
+    При переполнении вытесняется самый старый кадр, чтобы захват никогда не блокировался.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) >= self.capacity:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify()
+
+    def get(self):
+        """Следующий кадр; None, если буфер закрыт и пуст"""
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StageStats:
+    """
+    Класс накопления задержек стадии конвейера
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {'count': self.count, 'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'max_ms': self.max * 1000}
+
+
+class WebcamRecorder:
+    """
+    Класс для непрерывной записи с веб-камеры в зашифрованный контейнер.
+    Конвейер: поток захвата -> кольцевой буфер -> пул кодировщиков JPEG -> поток шифрования,
+    который пишет каждый кадр отдельным аутентифицированным сегментом сразу по готовности.
+    """
+    def __init__(self, encryption_manager, output_path, source=None, buffer_size=64, jpeg_quality=85,
+                 encoder_workers=2, camera_index=0, width=1920, height=1080, fps=30):
+        self.encryption_manager = encryption_manager
+        self.output_path = output_path
+        self.source = source
+        self.owns_source = source is None
+        self.camera_settings = (camera_index, width, height, fps)
+        self.jpeg_quality = jpeg_quality
+        self.encoder_workers = encoder_workers
+        self.ring = FrameRingBuffer(buffer_size)
+        # очередь закодированных кадров ограничена, чтобы кодировщик не убегал от записи
+        self.encoded = queue.Queue(maxsize=2 * encoder_workers)
+        self.stop_event = threading.Event()
+        self.stats = {'encode': StageStats(), 'encrypt': StageStats(), 'latency': StageStats()}
+        self.captured = 0
+        self.written = 0
+        self.started_at = None
+        self.error = None
+        self.threads = []
+
+    def open_camera(self):
+        camera_index, width, height, fps = self.camera_settings
+        cap = cv2.VideoCapture(camera_index)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        cap.set(cv2.CAP_PROP_FPS, fps)
+        if not cap.isOpened():
+            raise RuntimeError("Не удалось открыть веб-камеру.")
+        return cap
+
+    def start(self):
+        """Запуск записи"""
+        if self.source is None:
+            self.source = self.open_camera()
+        self.file = open(self.output_path, 'wb')
+        metadata = {'type': 'recording', 'name': os.path.basename(self.output_path), 'created': time.time()}
+        self.writer = SegmentWriter(self.file, self.encryption_manager.stream_cipher, RECORD_SEGMENT_LIMIT,
+                                    self.encryption_manager.header_fields({HEADER_CONTENT_TYPE: FRAMES_JPEG_CONTENT}),
+                                    metadata)
+        self.started_at = time.perf_counter()
+        self.threads = [threading.Thread(target=loop, daemon=True)
+                        for loop in (self.capture_loop, self.encode_loop, self.write_loop)]
+        for thread in self.threads:
+            thread.start()
+        logging.info(f"Запись с веб-камеры начата: {self.output_path}")
+        return self
+
+    def capture_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.source.read()
+                if not ret:
+                    break
+                self.ring.put((time.time(), time.perf_counter(), frame))
+                self.captured += 1
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.ring.close()
+
+    def encode_loop(self):
+        with ThreadPoolExecutor(max_workers=self.encoder_workers) as pool:
+            while True:
+                item = self.ring.get()
+                if item is None:
+                    break
+                self.encoded.put(pool.submit(self.encode_frame, *item))
+        self.encoded.put(None)
+
+    def encode_frame(self, timestamp, captured_at, frame):
+        started = time.perf_counter()
+        success, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            raise ValueError("Не удалось закодировать кадр.")
+        self.stats['encode'].add(time.perf_counter() - started)
+        return timestamp, captured_at, encoded.tobytes()
+
+    def write_loop(self):
+        while True:
+            future = self.encoded.get()
+            if future is None:
+                break
+            if self.error is not None:
+                continue  # после ошибки только освобождаем очередь, чтобы не заблокировать кодировщик
+            try:
+                timestamp, captured_at, data = future.result()
+                started = time.perf_counter()
+                self.writer.write_segment(FRAME_RECORD_HEADER.pack(timestamp) + data)
+                self.file.flush()
+                finished = time.perf_counter()
+                self.stats['encrypt'].add(finished - started)
+                self.stats['latency'].add(finished - captured_at)
+                self.written += 1
+            except Exception as e:
+                self.fail(e)
+        try:
+            self.writer.write_segment(b'', final=True)
+        finally:
+            self.file.close()
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+            logging.error(f"Ошибка записи с веб-камеры: {error!r}")
+        self.stop_event.set()
+
+    def statistics(self):
+        """Счётчики кадров, глубина очередей и задержки стадий"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'captured': self.captured,
+            'written': self.written,
+            'dropped': self.ring.dropped,
+            'fps': self.written / elapsed if elapsed else 0.0,
+            'backlog': len(self.ring) + self.encoded.qsize(),
+            'max_backlog': self.ring.max_depth,
+            'stages': {name: stats.summary() for name, stats in self.stats.items()},
+        }
+
+    def stop(self):
+        """Остановка записи: кадры, уже попавшие в буфер, дописываются до закрытия файла"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        if self.owns_source and self.source is not None:
+            self.source.release()
+        statistics = self.statistics()
+        log_audit('record_webcam', self.output_path, time.perf_counter() - self.started_at,
+                  os.path.getsize(self.output_path), self.error, frames=self.written, dropped=statistics['dropped'])
+        if self.error is not None:
+            raise self.error
+        return statistics
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+DOWNLOAD_CONNECTIONS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 30
+
+
+class RangeDownloader:
+    """
+    Класс для загрузки файла по HTTP несколькими параллельными запросами диапазонов.
+    Каждый диапазон совпадает с сегментом контейнера и шифруется сразу после получения,
+    поэтому открытый текст не попадает на диск. Сегменты записываются по вычисленным смещениям
+    в любом порядке, а номера готовых сегментов хранятся в файле состояния рядом с загрузкой,
+    что позволяет продолжить прерванную загрузку.
+    """
+    def __init__(self, encryption_manager, connections=DOWNLOAD_CONNECTIONS, segment_size=SEGMENT_SIZE,
+                 retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT):
+        self.encryption_manager = encryption_manager
+        self.connections = connections
+        self.segment_size = segment_size
+        self.retries = retries
+        self.timeout = timeout
+
+    def open_url(self, url, headers=None):
+        """HTTP-запрос с заданными заголовками"""
+        import urllib.request
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=self.timeout)
+
+    def probe(self, url):
+        """Размер файла, поддержка диапазонов и признаки версии файла на сервере"""
+        try:
+            response = self.open_url(url, {'Range': 'bytes=0-0'})
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise
+            return 0, False, {}  # пустой файл: диапазон 0-0 не существует
+        with response:
+            content_range = response.headers.get('Content-Range', '')
+            ranges = response.status == 206 and content_range.rpartition('/')[2].isdigit()
+            if ranges:
+                size = int(content_range.rpartition('/')[2])
+            else:
+                length = response.headers.get('Content-Length')
+                size = int(length) if length and length.isdigit() else None
+            identity = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+        return size, ranges, identity
+
+    def fetch_range(self, url, start, end):
+        """Загрузка байтов [start, end) с повтором при сетевых ошибках"""
+        for attempt in range(self.retries):
+            try:
+                with self.open_url(url, {'Range': f'bytes={start}-{end - 1}'}) as response:
+                    if response.status != 206:
+                        raise ValueError("Сервер перестал поддерживать запросы диапазонов.")
+                    data = response.read()
+                if len(data) != end - start:
+                    raise ConnectionError(f"Получено {len(data)} байт вместо {end - start}.")
+                return data
+            except OSError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    @staticmethod
+    def load_state(state_path):
+        """Чтение файла состояния прерванной загрузки"""
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def save_state(state_path, state):
+        """Атомарная запись файла состояния"""
+        temporary_path = state_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temporary_path, state_path)
+
+    def verified_segments(self, file, writer, count):
+        """Номера сегментов, которые уже записаны в файл и проходят проверку MAC.
+        Проверяются все кадры, а не только перечисленные в файле состояния: состояние сохраняется
+        после записи, и сегмент может оказаться на диске, не попав в список. Такой сегмент нельзя
+        шифровать повторно с тем же nonce."""
+        file.seek(0)
+        reader = SegmentReader(file, writer.cipher)
+        verified = set()
+        for index in range(count):
+            file.seek(writer.segment_offset(index))
+            try:
+                encrypted, final = reader.read_frame()
+                if final == (index == count - 1):
+                    reader.open_segment(index, encrypted, final)
+                    verified.add(index)
+            except (ValueError, InvalidTag):
+                pass
+        return verified
+
+    def download(self, url, output_path, task=None, metadata=None):
+        """Загрузка с шифрованием в контейнер output_path, возвращает размер файла.
+        task — фоновая задача TaskExecutor для отчёта о прогрессе и отмены,
+        metadata — метаданные для заголовка контейнера."""
+        return asyncio.run(self.download_async(url, output_path, task, metadata))
+
+    async def download_async(self, url, output_path, task=None, metadata=None):
+        part_path = part_file_path(output_path)
+        state_path = output_path + '.state'
+        size, ranges, identity = await asyncio.to_thread(self.probe, url)
+        if ranges:
+            total = await self.download_ranges(url, part_path, state_path, size, identity, task, metadata)
+        else:
+            total = await asyncio.to_thread(self.download_sequential, url, part_path, size, task, metadata)
+        os.replace(part_path, output_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return total
+
+    def download_sequential(self, url, part_path, size, task=None, metadata=None):
+        """Загрузка одним потоком, если сервер не поддерживает диапазоны; продолжение невозможно"""
+        with self.open_url(url) as response, open(part_path, 'wb') as destination:
+            source = TrackedFile(response, task, size or 0) if task is not None else response
+            return self.encryption_manager.encrypt_stream(source, destination, self.segment_size, metadata=metadata)
+
+    async def download_ranges(self, url, part_path, state_path, size, identity, task=None, metadata=None):
+        count = max(1, -(-size // self.segment_size))
+        state = self.load_state(state_path)
+        # без ETag или Last-Modified нельзя убедиться, что файл на сервере не изменился,
+        # а новое содержимое сегмента нельзя шифровать с уже использованным nonce — начинаем заново
+        resume = (state is not None and any(identity.values()) and os.path.exists(part_path)
+                  and state.get('url') == url and state.get('size') == size and state.get('segment_size') == self.segment_size
+                  and state.get('identity') == identity)
+        with open(part_path, 'r+b' if resume else 'w+b') as file:
+            if resume:
+                writer = SegmentWriter.resume(file, self.encryption_manager.cipher_for)
+                completed = self.verified_segments(file, writer, count)
+                logging.info(f"Продолжение загрузки {url}: готово {len(completed)} из {count} сегментов")
+            else:
+                writer = SegmentWriter(file, self.encryption_manager.stream_cipher, self.segment_size,
+                                       self.encryption_manager.header_fields(), metadata)
+                file.truncate(writer.segment_offset(count - 1) + 4 + size - (count - 1) * self.segment_size + TAG_SIZE)
+                completed = set()
+            state = {'url': url, 'size': size, 'segment_size': self.segment_size, 'identity': identity,
+                     'completed': sorted(completed)}
+            self.save_state(state_path, state)
+            pending = deque(index for index in range(count) if index not in completed)
+            done_size = sum(min(self.segment_size, size - index * self.segment_size) for index in completed)
+
+            async def worker():
+                nonlocal done_size
+                while pending:
+                    if task is not None:
+                        task.check_cancelled()
+                    index = pending.popleft()
+                    start = index * self.segment_size
+                    data = await asyncio.to_thread(self.fetch_range, url, start, min(start + self.segment_size, size))
+                    frame, final = await asyncio.to_thread(writer.seal_segment, index, data, index == count - 1)
+                    file.seek(writer.segment_offset(index))
+                    for part in frame:
+                        file.write(part)
+                    file.flush()
+                    completed.add(index)
+                    state['completed'] = sorted(completed)
+                    self.save_state(state_path, state)
+                    done_size += len(data)
+                    if task is not None:
+                        task.report_progress(done_size, size)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.connections, len(pending)))))
+        return size
+
+
+class DroneManager:
+    """
+    Класс для управления видео с дрона и его шифрования
+    """
+    def __init__(self, encryption_manager):
+        self.encryption_manager = encryption_manager
+
+    def fetch_video(self, url, encrypted_video_path, task=None, connections=DOWNLOAD_CONNECTIONS):
+        """Загрузка видео по URL сразу в зашифрованный контейнер без взаимодействия с пользователем.
+        Прерванная загрузка продолжается с места остановки; ошибки пробрасываются."""
+        downloader = RangeDownloader(self.encryption_manager, connections)
+        # размеры и длительность станут известны только после загрузки, в заголовок попадает источник
+        metadata = {'type': 'video', 'name': os.path.basename(urllib.parse.urlparse(url).path) or url,
+                    'source': url, 'created': time.time()}
+        with log_operation('download_video', encrypted_video_path, source=url, connections=connections) as operation:
+            operation['bytes'] = downloader.download(url, encrypted_video_path, task, metadata)
+        return operation['bytes']
+
+    def encrypt_video(self, video_path, encrypted_video_path):
+        """Шифрование видео"""
+        with log_operation('encrypt_video', video_path, target=encrypted_video_path) as operation:
+            operation['bytes'] = self.encryption_manager.encrypt_file(video_path, encrypted_video_path)
+
+    def decrypt_and_play_video(self, encrypted_video_path):
+        """Дешифрование и воспроизведение видео.
+        Контейнер читается демультиплексором напрямую: расшифровываются только запрошенные сегменты,
+        поэтому первый кадр и перемотка не требуют расшифровки всего файла."""
+        frames = VideoManager(self.encryption_manager).iter_frames(encrypted_video_path)
+        show_frames(frames, 'Дешифрованное видео')
+
+
+SCREEN_TILE_SIZE = 64
+SCREEN_FPS = 5
+SCREEN_KEYFRAME_INTERVAL = 50
+# кодеки плиток: PNG сохраняет текст без искажений, JPEG быстрее и компактнее для видео и фотографий
+SCREEN_TILE_CODECS = {
+    'png': ('.png', [('IMWRITE_PNG_COMPRESSION', 1)]),
+    'jpeg': ('.jpg', [('IMWRITE_JPEG_QUALITY', 80)]),
+}
+
+
+class ScreenGrabSource:
+    """
+    Класс-источник кадров экрана через ImageGrab; кадр записывается в переданный буфер в порядке BGR
+    """
+    def __init__(self):
+        self.width, self.height = ImageGrab.grab().size
+
+    def read(self, out):
+        screenshot = ImageGrab.grab()
+        if screenshot.mode != 'RGB':
+            screenshot = screenshot.convert('RGB')
+        image = np.asarray(screenshot)
+        if image.shape[:2] != out.shape[:2]:
+            raise ValueError("Размер экрана изменился во время записи.")
+        np.copyto(out, image[:, :, ::-1])
+        return True
+
+    def release(self):
+        pass
+
+
+class SyntheticScreenSource:
+    """
+    Класс-источник синтетических кадров экрана для проверки записи без дисплея:
+    неподвижный фон, по которому движется окно, и мигающий курсор, как на обычном рабочем столе
+    """
+    def __init__(self, width=1920, height=1080, frame_count=None, window=(480, 320), step=16):
+        self.width = width
+        self.height = height
+        self.frame_count = frame_count
+        self.window = window
+        self.step = step
+        self.index = 0
+        columns = (np.arange(width) * 255 // max(width - 1, 1)).astype(np.uint8)
+        rows = (np.arange(height) * 255 // max(height - 1, 1)).astype(np.uint8)
+        self.background = np.dstack([np.tile(columns, (height, 1)), np.tile(rows[:, None], (1, width)),
+                                     np.full((height, width), 96, np.uint8)])
+        self.frame = self.background.copy()
+        self.window_position = None
+
+    def read(self, out):
+        if self.frame_count is not None and self.index >= self.frame_count:
+            return False
+        window_width, window_height = self.window
+        if self.window_position is not None:
+            x, y = self.window_position
+            self.frame[y:y + window_height, x:x + window_width] = self.background[y:y + window_height,
+                                                                                 x:x + window_width]
+        x = self.index * self.step % max(self.width - window_width, 1)
+        y = self.height // 4
+        self.frame[y:y + window_height, x:x + window_width] = (240, 240, 240)
+        self.frame[y:y + 24, x:x + window_width] = (160, 90, 40)
+        cursor = (255, 255, 255) if self.index // 3 % 2 else (0, 0, 0)
+        self.frame[y + 40:y + 56, x + 20:x + 22] = cursor
+        self.window_position = (x, y)
+        np.copyto(out, self.frame)
+        self.index += 1
+        return True
+
+    def release(self):
+        pass
+
+
+class ScreenRecorder:
+    """
+    Класс для периодической записи экрана в зашифрованный контейнер.
+    Кадры захватываются в заранее выделенные буферы и сравниваются с предыдущим кадром по плиткам;
+    кодируются только изменившиеся плитки. Конвейер: поток захвата -> поток сравнения ->
+    пул кодировщиков плиток -> поток шифрования и записи. Каждые keyframe_interval кадров
+    записывается ключевой кадр со всеми плитками, с которого можно начать воспроизведение.
+    """
+    def __init__(self, encryption_manager, output_path, source=None, fps=SCREEN_FPS, tile_size=SCREEN_TILE_SIZE,
+                 codec='png', keyframe_interval=SCREEN_KEYFRAME_INTERVAL, encoder_workers=2, buffer_count=4):
+        if tile_size % 8:
+            raise ValueError("Размер плитки должен быть кратен 8.")
+        if not fps > 0:
+            raise ValueError("Частота кадров должна быть положительной.")
+        self.encryption_manager = encryption_manager
+        self.output_path = output_path
+        self.source = source
+        self.owns_source = source is None
+        self.fps = fps
+        self.tile_size = tile_size
+        extension, params = SCREEN_TILE_CODECS[codec]
+        self.tile_format = (extension, [value for name, level in params for value in (getattr(cv2, name), level)])
+        self.keyframe_interval = keyframe_interval
+        self.encoder_workers = encoder_workers
+        self.buffer_count = buffer_count
+        self.stop_event = threading.Event()
+        self.stats = {'diff': StageStats(), 'encode': StageStats(), 'encrypt': StageStats(),
+                      'latency': StageStats()}
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.tiles_total = 0
+        self.tiles_changed = 0
+        self.bytes_written = 0
+        self.started_at = None
+        self.cpu_started_at = None
+        self.error = None
+        self.threads = []
+
+    def start(self):
+        """Запуск записи"""
+        if self.source is None:
+            self.source = ScreenGrabSource()
+        self.width, self.height = self.source.width, self.source.height
+        self.rows = -(-self.height // self.tile_size)
+        self.columns = -(-self.width // self.tile_size)
+        shape = (self.rows * self.tile_size, self.columns * self.tile_size, 3)
+        # буферы дополнены до целого числа плиток, поэтому сравнение по плиткам сводится к reshape без копий
+        self.free_buffers = queue.Queue()
+        for _ in range(self.buffer_count):
+            self.free_buffers.put(np.zeros(shape, np.uint8))
+        self.difference = np.empty((shape[0], shape[1] * 3 // 8), bool)
+        self.captured_frames = queue.Queue()
+        self.encoded = queue.Queue(maxsize=self.buffer_count)
+        self.pool = ThreadPoolExecutor(max_workers=self.encoder_workers)
+        self.file = open(self.output_path, 'wb')
+        metadata = {'type': 'screen', 'name': os.path.basename(self.output_path), 'created': time.time(),
+                    'width': self.width, 'height': self.height, 'fps': self.fps}
+        self.writer = SegmentWriter(self.file, self.encryption_manager.stream_cipher, RECORD_SEGMENT_LIMIT,
+                                    self.encryption_manager.header_fields({HEADER_CONTENT_TYPE: SCREEN_TILES_CONTENT}),
+                                    metadata)
+        self.started_at = time.perf_counter()
+        self.cpu_started_at = time.process_time()
+        self.threads = [threading.Thread(target=loop, daemon=True)
+                        for loop in (self.capture_loop, self.diff_loop, self.write_loop)]
+        for thread in self.threads:
+            thread.start()
+        logging.info(f"Запись экрана начата: {self.output_path}")
+        return self
+
+    def capture_loop(self):
+        try:
+            interval = 1 / self.fps
+            next_time = time.perf_counter()
+            while not self.stop_event.is_set():
+                delay = next_time - time.perf_counter()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                next_time = max(next_time + interval, time.perf_counter())
+                try:
+                    buffer = self.free_buffers.get_nowait()
+                except queue.Empty:
+                    self.dropped += 1  # все буферы ещё в работе: кадр пропускается, захват не ждёт
+                    continue
+                if not self.source.read(buffer[:self.height, :self.width]):
+                    self.free_buffers.put(buffer)
+                    break
+                self.captured_frames.put((time.time(), time.perf_counter(), buffer))
+                self.captured += 1
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.captured_frames.put(None)
+
+    def encode_tile(self, tile):
+        started = time.perf_counter()
+        extension, params = self.tile_format
+        success, encoded = cv2.imencode(extension, tile, params)
+        if not success:
+            raise ValueError("Не удалось закодировать плитку.")
+        self.stats['encode'].add(time.perf_counter() - started)
+        return encoded.tobytes()
+
+    def changed_tiles(self, buffer, previous):
+        """Номера изменившихся плиток: буферы сравниваются словами по 8 байт"""
+        rows = self.difference.shape[0]
+        np.not_equal(buffer.reshape(rows, -1).view(np.uint64), previous.reshape(rows, -1).view(np.uint64),
+                     out=self.difference)
+        mask = self.difference.reshape(self.rows, self.tile_size, self.columns, -1).any(axis=(1, 3))
+        return np.argwhere(mask)
+
+    def diff_loop(self):
+        previous = None
+        number = 0
+        try:
+            while True:
+                item = self.captured_frames.get()
+                if item is None:
+                    break
+                timestamp, captured_at, buffer = item
+                if self.error is not None:
+                    self.free_buffers.put(buffer)
+                    continue
+                started = time.perf_counter()
+                keyframe = previous is None or number % self.keyframe_interval == 0
+                if keyframe:
+                    changed = [(row, column) for row in range(self.rows) for column in range(self.columns)]
+                else:
+                    changed = self.changed_tiles(buffer, previous)
+                tiles = []
+                for row, column in changed:
+                    y, x = row * self.tile_size, column * self.tile_size
+                    # копия плитки: буфер вернётся в пул раньше, чем кодировщик до неё дойдёт
+                    tile = np.ascontiguousarray(buffer[y:min(y + self.tile_size, self.height),
+                                                       x:min(x + self.tile_size, self.width)])
+                    tiles.append((int(column), int(row), self.pool.submit(self.encode_tile, tile)))
+                self.tiles_total += self.rows * self.columns
+                self.tiles_changed += len(tiles)
+                self.stats['diff'].add(time.perf_counter() - started)
+                if previous is not None:
+                    self.free_buffers.put(previous)
+                previous = buffer
+                number += 1
+                self.encoded.put((timestamp, captured_at, keyframe, tiles))
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.encoded.put(None)
+
+    def write_loop(self):
+        while True:
+            item = self.encoded.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                timestamp, captured_at, keyframe, tiles = item
+                parts = [FRAME_RECORD_HEADER.pack(timestamp),
+                         SCREEN_FRAME_HEADER.pack(keyframe, self.tile_size, self.width, self.height, len(tiles))]
+                for column, row, future in tiles:
+                    data = future.result()
+                    parts.append(SCREEN_TILE_HEADER.pack(column, row, len(data)))
+                    parts.append(data)
+                record = b''.join(parts)
+                started = time.perf_counter()
+                self.writer.write_segment(record)
+                self.file.flush()
+                finished = time.perf_counter()
+                self.stats['encrypt'].add(finished - started)
+                self.stats['latency'].add(finished - captured_at)
+                self.bytes_written += len(record)
+                self.written += 1
+            except Exception as e:
+                self.fail(e)
+        try:
+            self.writer.write_segment(b'', final=True)
+        finally:
+            self.file.close()
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+            logging.error(f"Ошибка записи экрана: {error!r}")
+        self.stop_event.set()
+
+    def statistics(self):
+        """Счётчики кадров и плиток, объём записи, загрузка процессора и задержки стадий"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        cpu = time.process_time() - self.cpu_started_at if self.cpu_started_at is not None else 0.0
+        return {
+            'captured': self.captured,
+            'written': self.written,
+            'dropped': self.dropped,
+            'fps': self.written / elapsed if elapsed else 0.0,
+            'backlog': self.captured_frames.qsize() + self.encoded.qsize() if self.started_at else 0,
+            'max_backlog': self.buffer_count,
+            'changed_tiles_percent': 100 * self.tiles_changed / self.tiles_total if self.tiles_total else 0.0,
+            'bytes_written': self.bytes_written,
+            'cpu_percent': 100 * cpu / elapsed if elapsed else 0.0,
+            'stages': {name: stats.summary() for name, stats in self.stats.items()},
+        }
+
+    def stop(self):
+        """Остановка записи: захваченные кадры дописываются до закрытия файла"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.pool.shutdown()
+        if self.owns_source and self.source is not None:
+            self.source.release()
+        statistics = self.statistics()
+        log_audit('record_screen', self.output_path, time.perf_counter() - self.started_at, self.bytes_written,
+                  self.error, frames=self.written, dropped=statistics['dropped'],
+                  changed_tiles_percent=round(statistics['changed_tiles_percent'], 2))
+        if self.error is not None:
+            raise self.error
+        return statistics
+
+    def wait(self):
+        """Ожидание конца источника кадров (для источников с ограниченным числом кадров)"""
+        for thread in self.threads:
+            thread.join()
+        return self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ScreenshotManager:
+    """
+    Класс для захвата снимков экрана и их шифрования
+    """
+    def __init__(self, encryption_manager):
+        self.encryption_manager = encryption_manager
+
+    def capture_and_encrypt_screenshot(self, output_path):
+        """Захват и шифрование снимка экрана"""
+        with log_operation('capture_screenshot', output_path) as operation:
+            screenshot = ImageGrab.grab()
+            screenshot_np = np.array(screenshot)
+            _, encoded_image = cv2.imencode('.png', screenshot_np)
+            data = encoded_image.tobytes()
+            metadata = ImageManager(self.encryption_manager).metadata_block(data=data, name="Снимок экрана")
+            operation['bytes'] = self.encryption_manager.encrypt_to_file(data, output_path, metadata,
+                                                                         make_thumbnail(screenshot_np))
+
+    def start_recording(self, output_path, source=None, fps=SCREEN_FPS, codec='png'):
+        """Запуск периодической зашифрованной записи экрана"""
+        return ScreenRecorder(self.encryption_manager, output_path, source, fps, codec=codec).start()
+
+    def iter_recorded_frames(self, encrypted_video_path, live=False):
+        """Генератор кадров записи экрана вместе со временем захвата; live — просмотр идущей записи"""
+        with ScreenRecordReader(encrypted_video_path, self.encryption_manager.cipher_for) as reader:
+            if live:
+                yield from reader.follow(live=True, idle_timeout=LIVE_IDLE_TIMEOUT)
+            else:
+                yield from reader.frames()
+
+    def decrypt_and_show_screenshot(self, encrypted_image_path):
+        """Дешифрование и отображение снимка экрана"""
+        decrypted_data = self.encryption_manager.decrypt_file_data(encrypted_image_path)
+        nparr = np.frombuffer(decrypted_data, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        cv2.imshow('Дешифрованный снимок экрана', image)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.tif', '.tiff')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+BATCH_JOURNAL_NAME = '.batch_journal'
+
+
+class BatchManager:
+    """
+    Класс для пакетного шифрования папки с изображениями и видео.
+    Файлы шифруются пулом потоков; готовые файлы записываются в журнал,
+    поэтому прерванный запуск продолжается с места остановки.
+    """
+    def __init__(self, encryption_manager, workers=4):
+        self.encryption_manager = encryption_manager
+        self.image_manager = ImageManager(encryption_manager)
+        self.video_manager = VideoManager(encryption_manager)
+        self.workers = workers
+
+    @staticmethod
+    def collect_files(source_dir):
+        """Список относительных путей изображений и видео в дереве папок"""
+        files = []
+        for directory, _, names in os.walk(source_dir):
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+                    files.append(os.path.relpath(os.path.join(directory, name), source_dir))
+        return files
+
+    @staticmethod
+    def read_journal(journal_path):
+        """Чтение журнала уже зашифрованных файлов"""
+        if not os.path.exists(journal_path):
+            return set()
+        with open(journal_path, encoding='utf-8') as journal:
+            return {line.rstrip('\n') for line in journal if line.endswith('\n')}
+
+    def encrypt_one(self, source_path, target_path):
+        """Шифрование одного файла во временный файл с атомарной заменой"""
+        os.makedirs(os.path.dirname(target_path) or '.', exist_ok=True)
+        partial_path = part_file_path(target_path)
+        with log_operation('batch_encrypt', source_path, target=target_path):
+            try:
+                if source_path.lower().endswith(IMAGE_EXTENSIONS):
+                    self.image_manager.encrypt_image_file(source_path, partial_path)
+                else:
+                    # видео шифруется потоково, сегменты одного файла не распараллеливаются — параллельны файлы
+                    self.encryption_manager.encrypt_file(source_path, partial_path, workers=1,
+                                                         metadata=self.video_manager.metadata_block(source_path),
+                                                         thumbnail=self.video_manager.make_preview(source_path))
+            except Exception:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+            os.replace(partial_path, target_path)
+
+    def encrypt_folder(self, source_dir, target_dir, progress=None, cancel_event=None):
+        """Шифрование всех изображений и видео из source_dir в target_dir с сохранением структуры.
+        progress(готово, всего, путь) вызывается из рабочего потока после каждого файла."""
+        os.makedirs(target_dir, exist_ok=True)
+        journal_path = os.path.join(target_dir, BATCH_JOURNAL_NAME)
+        done = self.read_journal(journal_path)
+        files = self.collect_files(source_dir)
+        pending = [name for name in files if name not in done]
+        completed = len(files) - len(pending)
+        failed = []
+        if progress:
+            progress(completed, len(files), None)
+        with open(journal_path, 'a', encoding='utf-8') as journal, \
+                ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            queue = iter(pending)
+            while True:
+                # в работе не больше 2 * workers файлов, чтобы не создавать сотни тысяч задач сразу
+                while len(running) < 2 * self.workers and not (cancel_event and cancel_event.is_set()):
+                    name = next(queue, None)
+                    if name is None:
+                        break
+                    future = executor.submit(self.encrypt_one, os.path.join(source_dir, name),
+                                             os.path.join(target_dir, name + '.dat'))
+                    running[future] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        failed.append(name)  # ошибка уже записана в журнал аудита в encrypt_one
+                        continue
+                    journal.write(name + '\n')
+                    journal.flush()
+                    completed += 1
+                    if progress:
+                        progress(completed, len(files), name)
+        logging.info(f"Пакетное шифрование {source_dir}: {completed} из {len(files)}, ошибок: {len(failed)}")
+        return {'total': len(files), 'completed': completed, 'failed': failed}
+
+
+CATALOG_PATH = 'catalog.sqlite'
+
+
+class MetadataCatalog:
+    """
+    Класс для каталога зашифрованных файлов в SQLite.
+    Индексируются только блоки метаданных из заголовков контейнеров, поэтому просмотр и поиск
+    не требуют расшифровки содержимого. Для поиска открыто хранятся тип, имя и размеры,
+    полные метаданные хранятся зашифрованными и расшифровываются по запросу.
+    """
+    COLUMNS = ('path', 'type', 'name', 'width', 'height', 'duration', 'created', 'file_size')
+
+    def __init__(self, encryption_manager, path=CATALOG_PATH):
+        self.encryption_manager = encryption_manager
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                file_size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                key_id TEXT,
+                type TEXT,
+                name TEXT,
+                width INTEGER,
+                height INTEGER,
+                duration REAL,
+                created REAL,
+                metadata BLOB
+            );
+            CREATE INDEX IF NOT EXISTS files_type ON files (type);
+            CREATE INDEX IF NOT EXISTS files_name ON files (name);
+            CREATE INDEX IF NOT EXISTS files_created ON files (created);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def index_file(self, file_path, stat=None):
+        """Добавление или обновление записи о файле по его заголовку"""
+        file_path = os.path.abspath(file_path)
+        stat = stat or os.stat(file_path)
+        with open(file_path, 'rb') as file:
+            _, fields = read_container_header(file)
+        metadata = self.encryption_manager.open_metadata(fields) or {}
+        encrypted = self.encryption_manager.encrypt_data(json.dumps(metadata, ensure_ascii=False).encode())
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime, fields.get(HEADER_KEY_ID, b'').decode() or None,
+                 metadata.get('type'), metadata.get('name'), metadata.get('width'), metadata.get('height'),
+                 metadata.get('duration'), metadata.get('created'), encrypted))
+
+    def scan(self, directory, progress=None):
+        """Индексация контейнеров в папке. Файлы с прежними размером и временем изменения пропускаются,
+        записи об удалённых файлах удаляются. progress(путь) вызывается после каждого нового файла."""
+        directory = os.path.abspath(directory)
+        with self.lock:
+            known = {path: (size, mtime) for path, size, mtime in self.connection.execute(
+                "SELECT path, file_size, mtime FROM files WHERE path >= ? AND path < ?",
+                (directory + os.sep, directory + chr(ord(os.sep) + 1)))}
+        result = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'failed': []}
+        seen = set()
+        for folder, _, names in os.walk(directory):
+            for name in names:
+                file_path = os.path.join(folder, name)
+                if is_temporary_file(name):
+                    continue
+                try:
+                    stat = os.stat(file_path)
+                    if known.get(file_path) == (stat.st_size, stat.st_mtime):
+                        seen.add(file_path)
+                        result['unchanged'] += 1
+                        continue
+                    if not is_container(file_path):
+                        continue
+                    self.index_file(file_path, stat)
+                except (OSError, ValueError, InvalidTag) as e:
+                    logging.error(f"Ошибка при индексации {file_path}: {e!r}")
+                    result['failed'].append(file_path)
+                    continue
+                seen.add(file_path)
+                result['indexed'] += 1
+                if progress is not None:
+                    progress(file_path)
+        removed = [(path,) for path in known if path not in seen]
+        with self.lock:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", removed)
+            self.connection.commit()
+        result['removed'] = len(removed)
+        return result
+
+    def search(self, text=None, kind=None, min_width=None, min_height=None, limit=1000, directory=None):
+        """Поиск по имени, типу, размерам и папке; возвращает словари с открытыми полями каталога"""
+        conditions, parameters = [], []
+        if directory:
+            directory = os.path.abspath(directory)
+            conditions.append("path >= ? AND path < ?")
+            parameters += [directory + os.sep, directory + chr(ord(os.sep) + 1)]
+        if text:
+            conditions.append("(name LIKE ? OR path LIKE ?)")
+            parameters += [f'%{text}%', f'%{text}%']
+        if kind:
+            conditions.append("type = ?")
+            parameters.append(kind)
+        if min_width:
+            conditions.append("width >= ?")
+            parameters.append(min_width)
+        if min_height:
+            conditions.append("height >= ?")
+            parameters.append(min_height)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files {where} ORDER BY created DESC, path LIMIT ?",
+                parameters + [limit]).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def details(self, file_path):
+        """Полные метаданные файла из каталога; None, если файл не проиндексирован"""
+        with self.lock:
+            row = self.connection.execute("SELECT metadata FROM files WHERE path = ?",
+                                          (os.path.abspath(file_path),)).fetchone()
+        if row is None:
+            return None
+        return json.loads(self.encryption_manager.decrypt_data(row[0]))
+
+
+AUDIT_INDEX_PATH = 'audit_index.sqlite'
+AUDIT_INGEST_CHUNK = 4 * 1024 * 1024
+# гистограмма скорости: корзины равной ширины в логарифмической шкале, погрешность перцентиля около 2,5%
+THROUGHPUT_BUCKETS_PER_DECADE = 50
+# строка журнала старого формата: "2024-06-06 13:53:26,199:INFO:сообщение"
+LEGACY_LOG_LINE = re.compile(r'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}):([A-Z]+):(.*)')
+
+
+def parse_time_argument(text):
+    """Время из аргумента командной строки: '7d', '12h', '30m' назад от текущего момента
+    или дата 'ГГГГ-ММ-ДД' / 'ГГГГ-ММ-ДДTЧЧ:ММ[:СС]' в местном времени"""
+    units = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+    if text[:-1].replace('.', '', 1).isdigit() and text[-1] in units:
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    for pattern in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(text, pattern))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Неверное время: {text}")
+
+
+def positive_float(text):
+    """Положительное число из аргумента командной строки"""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Неверное число: {text}")
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f"Число должно быть положительным: {text}")
+    return value
+
+
+class AuditLogIndex:
+    """
+    Класс для индекса журнала аудита в SQLite.
+    Журнал читается инкрементально: для каждого файла запоминается смещение последней целой строки,
+    файл опознаётся по первой строке, поэтому после ротации чтение продолжается из сжатой копии.
+    Кроме событий ведутся почасовые сводки по операциям и суточные гистограммы скорости,
+    так что доля ошибок и перцентили считаются по сводкам, а не перебором миллионов строк.
+    """
+    EVENT_FIELDS = ('timestamp', 'level', 'operation', 'path', 'status', 'duration_ms', 'bytes', 'throughput_mb_s',
+                    'error', 'message')
+    # поля, которые не сохраняются в extra: есть в отдельных столбцах или не нужны для анализа
+    SKIPPED_FIELDS = frozenset(EVENT_FIELDS + ('time', 'thread', 'traceback'))
+
+    def __init__(self, path=AUDIT_INDEX_PATH):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS audit_sources (
+                fingerprint TEXT PRIMARY KEY,
+                path TEXT,
+                offset INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS audit_events (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                level TEXT,
+                operation TEXT,
+                path TEXT,
+                status TEXT,
+                duration_ms REAL,
+                bytes INTEGER,
+                throughput_mb_s REAL,
+                error TEXT,
+                message TEXT,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS audit_events_time ON audit_events (timestamp);
+            CREATE INDEX IF NOT EXISTS audit_events_operation ON audit_events (operation, timestamp);
+            CREATE INDEX IF NOT EXISTS audit_events_path ON audit_events (path, timestamp);
+            CREATE INDEX IF NOT EXISTS audit_events_failures ON audit_events (timestamp) WHERE status = 'error';
+            CREATE TABLE IF NOT EXISTS audit_hourly (
+                operation TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                failed INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                duration_ms REAL NOT NULL,
+                PRIMARY KEY (hour, operation)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS audit_throughput (
+                operation TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, operation, bucket)
+            ) WITHOUT ROWID;
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def log_files(log_path=AUDIT_LOG_PATH):
+        """Файлы журнала в порядке записи: сжатые копии от старых к новым, затем текущий файл"""
+        rotated = []
+        for name in os.listdir(os.path.dirname(log_path) or '.'):
+            number = name[len(os.path.basename(log_path)) + 1:-3]
+            if name.startswith(os.path.basename(log_path) + '.') and name.endswith('.gz') and number.isdigit():
+                rotated.append((int(number), os.path.join(os.path.dirname(log_path), name)))
+        paths = [path for _, path in sorted(rotated, reverse=True)]
+        return paths + [log_path] if os.path.exists(log_path) else paths
+
+    @staticmethod
+    def parse_line(line):
+        """Разбор строки журнала: JSON или старый текстовый формат; None для нераспознанных строк"""
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            match = LEGACY_LOG_LINE.match(line.decode('utf-8', 'replace').rstrip('\r\n'))
+            if match is None:
+                return None
+            created, msecs, level, message = match.groups()
+            timestamp = time.mktime(time.strptime(created, '%Y-%m-%d %H:%M:%S')) + int(msecs) / 1000
+            return {'timestamp': timestamp, 'level': level, 'message': message}
+        return entry if isinstance(entry, dict) and 'timestamp' in entry else None
+
+    def ingest(self, log_path):
+        """Добавление в индекс новых строк файла журнала (обычного или сжатого после ротации).
+        Недописанная последняя строка остаётся до следующего вызова. Возвращает число добавленных событий."""
+        opener = gzip.open if log_path.endswith('.gz') else open
+        added = 0
+        with opener(log_path, 'rb') as file:
+            head = file.readline()
+            if not head.endswith(b'\n'):
+                return 0  # файл пуст или первая строка ещё не дописана
+            fingerprint = hashlib.sha1(head).hexdigest()
+            row = self.connection.execute("SELECT offset FROM audit_sources WHERE fingerprint = ?",
+                                          (fingerprint,)).fetchone()
+            offset = row[0] if row else 0
+            file.seek(offset)
+            while True:
+                lines = file.readlines(AUDIT_INGEST_CHUNK)
+                if lines and not lines[-1].endswith(b'\n'):
+                    lines.pop()
+                    complete = False
+                else:
+                    complete = bool(lines)
+                if not lines:
+                    break
+                offset += sum(map(len, lines))
+                entries = [entry for entry in map(self.parse_line, lines) if entry is not None]
+                with self.connection:
+                    self.add_entries(entries)
+                    self.connection.execute("INSERT OR REPLACE INTO audit_sources VALUES (?, ?, ?)",
+                                            (fingerprint, os.path.abspath(log_path), offset))
+                added += len(entries)
+                if not complete:
+                    break
+        return added
+
+    def add_entries(self, entries):
+        """Запись событий и обновление почасовых сводок и гистограмм скорости"""
+        events, hourly, throughput = [], {}, {}
+        for entry in entries:
+            if 'status' not in entry and entry.get('level') in ('ERROR', 'CRITICAL'):
+                entry['status'] = 'error'  # ошибки вне операций тоже попадают в список неудач
+            operation = entry.get('operation')
+            if operation is not None:
+                entry.pop('message', None)  # сообщение операции повторяет её поля
+            extra = entry.keys() - self.SKIPPED_FIELDS
+            extra = json.dumps({key: entry[key] for key in extra}, ensure_ascii=False) if extra else None
+            events.append((*map(entry.get, self.EVENT_FIELDS), extra))
+            if operation is None:
+                continue
+            hour = int(entry['timestamp'] // 3600)
+            summary = hourly.setdefault((operation, hour), [0, 0, 0, 0.0])
+            summary[0] += 1
+            summary[1] += entry.get('status') == 'error'
+            summary[2] += entry.get('bytes') or 0
+            summary[3] += entry.get('duration_ms') or 0.0
+            speed = entry.get('throughput_mb_s')
+            if speed and speed > 0:
+                key = (operation, hour // 24, math.floor(math.log10(speed) * THROUGHPUT_BUCKETS_PER_DECADE))
+                throughput[key] = throughput.get(key, 0) + 1
+        self.connection.executemany(
+            "INSERT INTO audit_events (timestamp, level, operation, path, status, duration_ms, bytes, "
+            "throughput_mb_s, error, message, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+        self.connection.executemany(
+            "INSERT INTO audit_hourly VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (hour, operation) DO UPDATE SET "
+            "total = total + excluded.total, failed = failed + excluded.failed, bytes = bytes + excluded.bytes, "
+            "duration_ms = duration_ms + excluded.duration_ms",
+            [(operation, hour, *summary) for (operation, hour), summary in hourly.items()])
+        self.connection.executemany(
+            "INSERT INTO audit_throughput VALUES (?, ?, ?, ?) ON CONFLICT (day, operation, bucket) DO UPDATE SET "
+            "count = count + excluded.count", [(*key, count) for key, count in throughput.items()])
+
+    @staticmethod
+    def time_conditions(column, since, until, conditions, parameters):
+        """Добавление условий на интервал времени к запросу"""
+        if since is not None:
+            conditions.append(f"{column} >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append(f"{column} < ?")
+            parameters.append(until)
+
+    def rollup_conditions(self, column, period, since, until, operation):
+        """Условия запроса к сводкам: интервал в единицах period секунд (с округлением наружу) и операция"""
+        conditions, parameters = [], []
+        self.time_conditions(column, None if since is None else int(since // period),
+                             None if until is None else math.ceil(until / period), conditions, parameters)
+        if operation:
+            conditions.append("operation LIKE ?")
+            parameters.append(operation)
+        return f"WHERE {' AND '.join(conditions)}" if conditions else "", parameters
+
+    def summary(self, since=None, until=None, operation=None, percentiles=(50, 90, 99)):
+        """Сводка по операциям за интервал: число, доля ошибок, объём, средняя длительность и перцентили скорости.
+        Счётчики берутся из почасовых сводок, перцентили — из суточных гистограмм, поэтому границы интервала
+        округляются до часа и до суток соответственно. operation может содержать шаблон LIKE ('decrypt%')."""
+        where, parameters = self.rollup_conditions('hour', 3600, since, until, operation)
+        result = {}
+        for name, total, failed, size, duration in self.connection.execute(
+                f"SELECT operation, SUM(total), SUM(failed), SUM(bytes), SUM(duration_ms) FROM audit_hourly {where} "
+                f"GROUP BY operation ORDER BY operation", parameters):
+            result[name] = {'total': total, 'failed': failed, 'failure_rate': failed / total if total else 0.0,
+                            'bytes': size, 'mean_duration_ms': duration / total if total else 0.0,
+                            'throughput_mb_s': {}}
+        histograms = {}
+        where, parameters = self.rollup_conditions('day', 86400, since, until, operation)
+        for name, bucket, count in self.connection.execute(
+                f"SELECT operation, bucket, SUM(count) FROM audit_throughput {where} "
+                f"GROUP BY operation, bucket ORDER BY operation, bucket", parameters):
+            histograms.setdefault(name, []).append((bucket, count))
+        for name, histogram in histograms.items():
+            total = sum(count for _, count in histogram)
+            for percentile in percentiles:
+                rank, seen = percentile / 100 * total, 0
+                for bucket, count in histogram:
+                    seen += count
+                    if seen >= rank:
+                        # середина корзины в логарифмической шкале
+                        result[name]['throughput_mb_s'][percentile] = 10 ** ((bucket + 0.5) /
+                                                                             THROUGHPUT_BUCKETS_PER_DECADE)
+                        break
+        return result
 
-    @staticmethod
-    def generate_key():
-        """Генерация ключа шифрования"""
-        return Fernet.generate_key()
+    def query_events(self, conditions, parameters, limit):
+        """События по условиям от новых к старым"""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT {', '.join(self.EVENT_FIELDS)}, extra FROM audit_events {where} "
+            f"ORDER BY timestamp DESC LIMIT ?", parameters + [limit]).fetchall()
+        events = []
+        for row in rows:
+            event = dict(zip(self.EVENT_FIELDS, row))
+            event.update(json.loads(row[-1]) if row[-1] else {})
+            events.append(event)
+        return events
 
-    def encrypt_data(self, data):
-        """Шифрование данных"""
-        return self.fernet.encrypt(data)
+    def failures(self, since=None, until=None, operation=None, limit=100):
+        """Неудачные операции за интервал, например файлы, которые не удалось расшифровать за неделю"""
+        conditions, parameters = ["status = 'error'"], []
+        self.time_conditions('timestamp', since, until, conditions, parameters)
+        if operation:
+            conditions.append("operation LIKE ?")
+            parameters.append(operation)
+        return self.query_events(conditions, parameters, limit)
 
-    def decrypt_data(self, encrypted_data):
-        """Дешифрование данных"""
-        return self.fernet.decrypt(encrypted_data)
+    def history(self, path, since=None, until=None, limit=100):
+        """История операций с файлом; путь может быть шаблоном LIKE"""
+        conditions, parameters = ["path LIKE ?" if '%' in path else "path = ?"], [path]
+        self.time_conditions('timestamp', since, until, conditions, parameters)
+        return self.query_events(conditions, parameters, limit)
 
 
-class ImageManager:
+THUMBNAIL_CACHE_SIZE = 512
+GALLERY_TILE = 180
+
+
+class ThumbnailCache:
     """
-    Класс для управления изображениями и их шифрованием
+    Класс для ленивой расшифровки превью из заголовков контейнеров с LRU-кэшем.
+    Содержимое файлов не читается: расшифровывается только поле превью в заголовке.
     """
-    def __init__(self, encryption_manager):
+    def __init__(self, encryption_manager, capacity=THUMBNAIL_CACHE_SIZE):
         self.encryption_manager = encryption_manager
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-    def encrypt_image(self, image_path, encrypted_image_path):
-        """Шифрование изображения"""
-        try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError("Неверный формат изображения.")
-            _, encoded_image = cv2.imencode('.png', image)
-            encrypted_data = self.encryption_manager.encrypt_data(encoded_image.tobytes())
-            with open(encrypted_image_path, 'wb') as file:
-                file.write(encrypted_data)
-            logging.info(f"Изображение зашифровано: {image_path}")
-        except Exception as e:
-            logging.error(f"Ошибка при шифровании изображения: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось зашифровать изображение: {e}")
+    def get(self, file_path):
+        """Превью файла как изображение PIL; None, если превью нет.
+        Ключ кэша включает время изменения и размер, поэтому перезаписанный файл расшифровывается заново."""
+        stat = os.stat(file_path)
+        key = (file_path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+        data = self.encryption_manager.read_thumbnail(file_path)
+        image = None
+        if data is not None:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        with self.lock:
+            self.items[key] = image
+            if len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+        return image
 
-    def decrypt_image(self, encrypted_image_path, output_image_path):
-        """Дешифрование изображения"""
-        try:
-            with open(encrypted_image_path, 'rb') as file:
-                encrypted_data = file.read()
-            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data)
-            nparr = np.frombuffer(decrypted_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if image is None:
-                raise ValueError("Не удалось декодировать изображение.")
-            cv2.imwrite(output_image_path, image)
-            logging.info(f"Изображение дешифровано: {encrypted_image_path}")
-        except Exception as e:
-            logging.error(f"Ошибка при дешифровании изображения: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось расшифровать изображение: {e}")
 
-    def extract_metadata(self, image_path):
-        """Извлечение метаданных изображения"""
-        try:
-            image = Image.open(image_path)
-            metadata = image.info
-            exif_data = piexif.load(image.info['exif']) if 'exif' in image.info else {}
-            return metadata, exif_data
-        except Exception as e:
-            return str(e)
+class TaskCancelled(Exception):
+    """Фоновая задача отменена пользователем"""
 
 
-class VideoManager:
+class Task:
     """
-    Класс для управления видео и его шифрованием
+    Класс фоновой задачи: флаг отмены и отчёт о прогрессе из рабочего потока
     """
-    def __init__(self, encryption_manager):
-        self.encryption_manager = encryption_manager
+    def __init__(self, executor, on_progress=None):
+        self.executor = executor
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+        self.future = None
 
-    def encrypt_video(self, video_path, encrypted_video_path):
-        """Шифрование видео"""
-        try:
-            with open(video_path, 'rb') as file:
-                video_data = file.read()
-            encrypted_data = self.encryption_manager.encrypt_data(video_data)
-            with open(encrypted_video_path, 'wb') as file:
-                file.write(encrypted_data)
-            logging.info(f"Видео зашифровано: {video_path}")
-        except Exception as e:
-            logging.error(f"Ошибка при шифровании видео: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось зашифровать видео: {e}")
+    def cancel(self):
+        """Запрос отмены; задача прерывается при следующей проверке"""
+        self.cancel_event.set()
 
-    def decrypt_video(self, encrypted_video_path, output_video_path):
-        """Дешифрование видео"""
-        try:
-            with open(encrypted_video_path, 'rb') as file:
-                encrypted_data = file.read()
-            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data)
-            with open(output_video_path, 'wb') as file:
-                file.write(decrypted_data)
-            logging.info(f"Видео дешифровано: {encrypted_video_path}")
-        except Exception as e:
-            logging.error(f"Ошибка при дешифровании видео: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось расшифровать видео: {e}")
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
 
-    def extract_metadata(self, video_path):
-        """Извлечение метаданных видео"""
-        try:
-            cap = cv2.VideoCapture(video_path)
-            metadata = {
-                "Ширина кадра": cap.get(cv2.CAP_PROP_FRAME_WIDTH),
-                "Высота кадра": cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
-                "Количество кадров": cap.get(cv2.CAP_PROP_FRAME_COUNT),
-                "FPS": cap.get(cv2.CAP_PROP_FPS),
-                "Кодек": cap.get(cv2.CAP_PROP_FOURCC),
-                "Длительность (сек)": cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS)
-            }
-            cap.release()
-            return metadata
-        except Exception as e:
-            return str(e)
+    def check_cancelled(self):
+        """Прерывание задачи, если запрошена отмена"""
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
 
+    def report_progress(self, done, total):
+        """Передача прогресса в поток интерфейса"""
+        if self.on_progress is not None:
+            self.executor.post(self.on_progress, done, total)
 
-class WebcamManager:
+
+class TrackedFile:
     """
-    Класс для управления веб-камерой и шифрования снимков с веб-камеры
+    Класс-обёртка над файлом: при каждом чтении проверяет отмену и сообщает о прогрессе
     """
-    def __init__(self, encryption_manager):
-        self.encryption_manager = encryption_manager
+    def __init__(self, file, task, total):
+        self.file = file
+        self.task = task
+        self.total = total
+        self.done = 0
 
-    def capture_and_encrypt_image(self, output_path):
-        """Захват и шифрование изображения с веб-камеры"""
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        if ret:
-            _, encoded_image = cv2.imencode('.png', frame)
-            encrypted_data = self.encryption_manager.encrypt_data(encoded_image.tobytes())
-            with open(output_path, 'wb') as file:
-                file.write(encrypted_data)
-            logging.info(f"Изображение с веб-камеры захвачено и зашифровано: {output_path}")
-        cap.release()
+    def read(self, size=-1):
+        self.task.check_cancelled()
+        data = self.file.read(size)
+        self.done += len(data)
+        self.task.report_progress(self.done, self.total)
+        return data
 
-    def decrypt_and_show_image(self, encrypted_image_path):
-        """Дешифрование и отображение изображения с веб-камеры"""
-        with open(encrypted_image_path, 'rb') as file:
-            encrypted_data = file.read()
-        decrypted_data = self.encryption_manager.decrypt_data(encrypted_data)
-        nparr = np.frombuffer(decrypted_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        cv2.imshow('Дешифрованное изображение с веб-камеры', image)
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
+    def readinto(self, buffer):
+        self.task.check_cancelled()
+        count = self.file.readinto(buffer)
+        self.done += count or 0
+        self.task.report_progress(self.done, self.total)
+        return count
 
 
-class DroneManager:
+class TaskExecutor:
     """
-    Класс для управления видео с дрона и его шифрования
+    Класс для выполнения шифрования и кодирования в фоновых потоках.
+    Результаты, прогресс и ошибки возвращаются в поток Tkinter через root.after,
+    поэтому обработчики кнопок не блокируют цикл событий.
     """
-    def __init__(self, encryption_manager):
-        self.encryption_manager = encryption_manager
-
-    def download_video(self, url, save_path):
-        """Загрузка видео по URL"""
-        try:
-            urllib.request.urlretrieve(url, save_path)
-            logging.info(f"Видео с дрона загружено: {save_path}")
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке видео: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось загрузить видео: {e}")
+    def __init__(self, root, workers=2, poll_interval=16):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.events = queue.Queue()
+        self.poll_interval = poll_interval  # около 60 Гц
+        self.tasks = set()
+        self.polling = False
 
-    def encrypt_video(self, video_path, encrypted_video_path):
-        """Шифрование видео"""
-        with open(video_path, 'rb') as file:
-            video_data = file.read()
-        encrypted_data = self.encryption_manager.encrypt_data(video_data)
-        with open(encrypted_video_path, 'wb') as file:
-            file.write(encrypted_data)
-        logging.info(f"Видео с дрона зашифровано: {video_path}")
+    def submit(self, function, on_done=None, on_error=None, on_progress=None):
+        """Запуск function(task) в фоне; обработчики вызываются в потоке интерфейса"""
+        task = Task(self, on_progress)
 
-    def decrypt_and_play_video(self, encrypted_video_path):
-        """Дешифрование и воспроизведение видео"""
-        with open(encrypted_video_path, 'rb') as file:
-            encrypted_data = file.read()
-        decrypted_data = self.encryption_manager.decrypt_data(encrypted_data)
-        temp_video_path = 'temp_decrypted_video.mp4'
-        with open(temp_video_path, 'wb') as file:
-            file.write(decrypted_data)
-        cap = cv2.VideoCapture(temp_video_path)
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                cv2.imshow('Дешифрованное видео', frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+        def run():
+            try:
+                result = function(task)
+            except Exception as e:
+                self.post(self.finish, task, on_error, e)
             else:
-                break
-        cap.release()
-        cv2.destroyAllWindows()
-        os.remove(temp_video_path)
+                self.post(self.finish, task, on_done, result)
 
+        self.tasks.add(task)
+        task.future = self.executor.submit(run)
+        self.schedule_poll()
+        return task
 
-class ScreenshotManager:
-    """
-    Класс для захвата снимков экрана и их шифрования
-    """
-    def __init__(self, encryption_manager):
-        self.encryption_manager = encryption_manager
+    def post(self, callback, *args):
+        """Передача вызова в поток интерфейса (можно вызывать из любого потока)"""
+        self.events.put((callback, args))
 
-    def capture_and_encrypt_screenshot(self, output_path):
-        """Захват и шифрование снимка экрана"""
-        screenshot = ImageGrab.grab()
-        screenshot_np = np.array(screenshot)
-        _, encoded_image = cv2.imencode('.png', screenshot_np)
-        encrypted_data = self.encryption_manager.encrypt_data(encoded_image.tobytes())
-        with open(output_path, 'wb') as file:
-            file.write(encrypted_data)
-        logging.info(f"Снимок экрана захвачен и зашифрован: {output_path}")
+    def finish(self, task, callback, value):
+        self.tasks.discard(task)
+        if callback is not None:
+            callback(value)
 
-    def decrypt_and_show_screenshot(self, encrypted_image_path):
-        """Дешифрование и отображение снимка экрана"""
-        with open(encrypted_image_path, 'rb') as file:
-            encrypted_data = file.read()
-        decrypted_data = self.encryption_manager.decrypt_data(encrypted_data)
-        nparr = np.frombuffer(decrypted_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        cv2.imshow('Дешифрованный снимок экрана', image)
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
+    def cancel_all(self):
+        """Отмена всех выполняющихся задач"""
+        for task in self.tasks:
+            task.cancel()
+
+    def schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        """Обработка накопившихся событий; опрос продолжается, пока есть задачи или события"""
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.polling = False
+        if self.tasks or not self.events.empty():
+            self.schedule_poll()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
 
 
 class GUIApplication:
@@ -249,7 +3336,7 @@ class GUIApplication:
         self.root = root
         self.root.title("Приложение для шифрования")
 
-        self.encryption_manager = EncryptionManager()
+        self.encryption_manager = self.open_keystore()
 
         self.image_manager = ImageManager(self.encryption_manager)
         self.video_manager = VideoManager(self.encryption_manager)
@@ -257,8 +3344,51 @@ class GUIApplication:
         self.drone_manager = DroneManager(self.encryption_manager)
         self.screenshot_manager = ScreenshotManager(self.encryption_manager)
 
+        self.tasks = TaskExecutor(self.root)
+        # превью галереи расшифровываются в отдельном пуле, чтобы не занимать строку состояния
+        self.thumbnail_tasks = TaskExecutor(self.root)
+        self.thumbnail_cache = ThumbnailCache(self.encryption_manager)
+        self.catalog = None
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         self.setup_ui()
 
+    def open_keystore(self):
+        """Открытие хранилища ключей по паролю; без пароля используется временный ключ текущего сеанса.
+        Новое хранилище создаётся только после подтверждения и повторного ввода пароля."""
+        create = not os.path.exists(KEYSTORE_PATH)
+        if create and not messagebox.askyesno(
+                "Хранилище ключей", f"Хранилище ключей {KEYSTORE_PATH} не найдено.\n"
+                                    "Создать новое? Файлы, зашифрованные ключами другого хранилища, "
+                                    "им не расшифровать.", parent=self.root):
+            return self.temporary_key_manager()
+        while True:
+            prompt = "Пароль нового хранилища ключей:" if create else "Пароль хранилища ключей:"
+            password = simpledialog.askstring("Хранилище ключей", prompt, show='*', parent=self.root)
+            if password is None:
+                return self.temporary_key_manager()
+            if create:
+                if not password:
+                    messagebox.showerror("Ошибка", "Пароль хранилища ключей не может быть пустым.")
+                    continue
+                repeated = simpledialog.askstring("Хранилище ключей", "Повторите пароль:", show='*',
+                                                  parent=self.root)
+                if repeated is None:
+                    return self.temporary_key_manager()
+                if repeated != password:
+                    messagebox.showerror("Ошибка", "Пароли не совпадают.")
+                    continue
+            try:
+                return KeyStore(KEYSTORE_PATH, password, create=create).manager()
+            except ValueError as e:
+                messagebox.showerror("Ошибка", str(e))
+
+    def temporary_key_manager(self):
+        """Менеджер с временным ключом текущего сеанса, если хранилище не открыто"""
+        messagebox.showwarning("Внимание", "Хранилище ключей не открыто: файлы будут зашифрованы "
+                                           "временным ключом, который пропадёт после закрытия программы.")
+        return EncryptionManager()
+
     def setup_ui(self):
         """Настройка пользовательского интерфейса"""
         self.notebook = ttk.Notebook(self.root)
@@ -269,6 +3399,92 @@ class GUIApplication:
         self.setup_webcam_tab()
         self.setup_drone_tab()
         self.setup_screenshot_tab()
+        self.setup_batch_tab()
+        self.setup_gallery_tab()
+        self.setup_status_bar()
+
+    def setup_status_bar(self):
+        """Строка состояния фоновых задач с индикатором прогресса и кнопкой отмены"""
+        self.status_frame = tk.Frame(self.root)
+        self.status_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        self.status_text = tk.StringVar(value="Готово")
+        self.status_label = tk.Label(self.status_frame, textvariable=self.status_text, anchor=tk.W, width=40)
+        self.status_label.pack(side=tk.LEFT)
+
+        self.status_progress = ttk.Progressbar(self.status_frame, length=250, mode='determinate')
+        self.status_progress.pack(side=tk.LEFT, padx=10)
+
+        self.cancel_button = tk.Button(self.status_frame, text="Отмена", command=self.tasks.cancel_all,
+                                       state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT)
+
+    def close(self):
+        """Закрытие окна с отменой фоновых задач"""
+        self.tasks.shutdown()
+        self.thumbnail_tasks.shutdown()
+        if self.catalog is not None:
+            self.catalog.close()
+        self.root.destroy()
+
+    def run_task(self, status, error_message, function, on_done=None, output_path=None, on_finish=None):
+        """Запуск долгой операции в фоновом потоке.
+        Прогресс и результат показываются в строке состояния, ошибки — в окне сообщения.
+        Если задан output_path, function получает вторым аргументом путь временного файла,
+        который после успеха заменяет output_path; при ошибке или отмене удаляется только
+        временный файл, поэтому уже существовавший output_path не пострадает.
+        on_finish вызывается после завершения задачи в любом случае."""
+        self.status_text.set(status)
+        if output_path:
+            part_path = part_file_path(output_path)
+            job = function
+
+            def function(task):
+                result = job(task, part_path)
+                os.replace(part_path, output_path)
+                return result
+        self.status_progress['value'] = 0
+        self.cancel_button['state'] = tk.NORMAL
+
+        def finished():
+            self.status_progress['value'] = 0
+            if not self.tasks.tasks:
+                self.cancel_button['state'] = tk.DISABLED
+            if on_finish is not None:
+                on_finish()
+
+        def done(result):
+            finished()
+            self.status_text.set("Готово")
+            if on_done is not None:
+                on_done(result)
+
+        def error(e):
+            finished()
+            if output_path and os.path.exists(part_path):
+                os.remove(part_path)
+            if isinstance(e, TaskCancelled):
+                self.status_text.set("Отменено")
+                return
+            self.status_text.set("Ошибка")
+            if not getattr(e, 'audited', False):  # ошибки операций уже записаны в журнал аудита
+                logging.error(f"{error_message}: {e!r}")
+            messagebox.showerror("Ошибка", f"{error_message}: {e}")
+
+        def progress(done_size, total_size):
+            self.status_progress['maximum'] = max(total_size, 1)
+            self.status_progress['value'] = done_size
+
+        return self.tasks.submit(function, on_done=done, on_error=error, on_progress=progress)
+
+    def show_image_window(self, image, title):
+        """Показ изображения в отдельном окне Tkinter, не блокируя главное окно"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        picture = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        picture.thumbnail((self.root.winfo_screenwidth() * 0.9, self.root.winfo_screenheight() * 0.9))
+        window.photo = ImageTk.PhotoImage(picture)
+        tk.Label(window, image=window.photo).pack()
 
     def setup_image_tab(self):
         """Настройка вкладки для работы с изображениями"""
@@ -287,13 +3503,18 @@ class GUIApplication:
         self.encrypt_image_button = tk.Button(self.image_tab, text="Зашифровать изображение", command=self.encrypt_image)
         self.encrypt_image_button.grid(row=1, column=1, pady=10)
 
+        self.image_codec = tk.StringVar(value="авто")
+        self.image_codec_box = ttk.Combobox(self.image_tab, textvariable=self.image_codec, state='readonly', width=15,
+                                            values=["авто"] + list(IMAGE_CODECS))
+        self.image_codec_box.grid(row=1, column=2, padx=10, pady=10)
+
         self.decrypt_image_button = tk.Button(self.image_tab, text="Расшифровать изображение", command=self.decrypt_image)
         self.decrypt_image_button.grid(row=2, column=1, pady=10)
 
         self.image_metadata_label = tk.Label(self.image_tab, text="Метаданные изображения:")
         self.image_metadata_label.grid(row=3, column=0, columnspan=3, pady=10)
 
-        self.image_metadata_text = Text(self.image_tab, width=75, height=10)
+        self.image_metadata_text = tk.Text(self.image_tab, width=75, height=10)
         self.image_metadata_text.grid(row=4, column=0, columnspan=3)
 
     def setup_video_tab(self):
@@ -313,13 +3534,17 @@ class GUIApplication:
         self.encrypt_video_button = tk.Button(self.video_tab, text="Зашифровать видео", command=self.encrypt_video)
         self.encrypt_video_button.grid(row=1, column=1, pady=10)
 
+        self.video_per_frame = tk.BooleanVar(value=False)
+        self.video_per_frame_check = tk.Checkbutton(self.video_tab, text="Покадрово", variable=self.video_per_frame)
+        self.video_per_frame_check.grid(row=1, column=2, pady=10)
+
         self.decrypt_video_button = tk.Button(self.video_tab, text="Расшифровать видео", command=self.decrypt_video)
         self.decrypt_video_button.grid(row=2, column=1, pady=10)
 
         self.video_metadata_label = tk.Label(self.video_tab, text="Метаданные видео:")
         self.video_metadata_label.grid(row=3, column=0, columnspan=3, pady=10)
 
-        self.video_metadata_text = Text(self.video_tab, width=75, height=10)
+        self.video_metadata_text = tk.Text(self.video_tab, width=75, height=10)
         self.video_metadata_text.grid(row=4, column=0, columnspan=3)
 
         self.play_video_button = tk.Button(self.video_tab, text="Воспроизвести видео", command=self.play_video)
@@ -336,11 +3561,23 @@ class GUIApplication:
         self.decrypt_webcam_button = tk.Button(self.webcam_tab, text="Расшифровать и показать изображение", command=self.decrypt_and_show_webcam_image)
         self.decrypt_webcam_button.grid(row=1, column=1, pady=10)
 
+        self.record_webcam_button = tk.Button(self.webcam_tab, text="Начать запись видео", command=self.toggle_webcam_recording)
+        self.record_webcam_button.grid(row=2, column=1, pady=10)
+
+        self.play_webcam_record_button = tk.Button(self.webcam_tab, text="Воспроизвести запись", command=self.play_webcam_recording)
+        self.play_webcam_record_button.grid(row=3, column=1, pady=10)
+
+        self.watch_webcam_record_button = tk.Button(self.webcam_tab, text="Смотреть идущую запись",
+                                                    command=lambda: self.play_webcam_recording(live=True))
+        self.watch_webcam_record_button.grid(row=3, column=2, pady=10)
+
         self.webcam_metadata_label = tk.Label(self.webcam_tab, text="Метаданные веб-камеры:")
-        self.webcam_metadata_label.grid(row=2, column=0, columnspan=3, pady=10)
+        self.webcam_metadata_label.grid(row=4, column=0, columnspan=3, pady=10)
+
+        self.webcam_metadata_text = tk.Text(self.webcam_tab, width=75, height=10)
+        self.webcam_metadata_text.grid(row=5, column=0, columnspan=3)
 
-        self.webcam_metadata_text = Text(self.webcam_tab, width=75, height=10)
-        self.webcam_metadata_text.grid(row=3, column=0, columnspan=3)
+        self.webcam_recorder = None
 
     def setup_drone_tab(self):
         """Настройка вкладки для работы с видео с дрона"""
@@ -362,7 +3599,7 @@ class GUIApplication:
         self.drone_metadata_label = tk.Label(self.drone_tab, text="Метаданные видео с дрона:")
         self.drone_metadata_label.grid(row=3, column=0, columnspan=3, pady=10)
 
-        self.drone_metadata_text = Text(self.drone_tab, width=75, height=10)
+        self.drone_metadata_text = tk.Text(self.drone_tab, width=75, height=10)
         self.drone_metadata_text.grid(row=4, column=0, columnspan=3)
 
     def setup_screenshot_tab(self):
@@ -379,9 +3616,251 @@ class GUIApplication:
         self.screenshot_metadata_label = tk.Label(self.screenshot_tab, text="Метаданные скриншота:")
         self.screenshot_metadata_label.grid(row=2, column=0, columnspan=3, pady=10)
 
-        self.screenshot_metadata_text = Text(self.screenshot_tab, width=75, height=10)
+        self.screenshot_metadata_text = tk.Text(self.screenshot_tab, width=75, height=10)
         self.screenshot_metadata_text.grid(row=3, column=0, columnspan=3)
 
+        self.record_screen_button = tk.Button(self.screenshot_tab, text="Начать запись экрана",
+                                              command=self.toggle_screen_recording)
+        self.record_screen_button.grid(row=0, column=2, pady=10)
+
+        self.play_screen_record_button = tk.Button(self.screenshot_tab, text="Воспроизвести запись экрана",
+                                                   command=self.play_screen_recording)
+        self.play_screen_record_button.grid(row=1, column=2, pady=10)
+
+        self.screen_recorder = None
+
+    def setup_batch_tab(self):
+        """Настройка вкладки пакетного шифрования папки"""
+        self.batch_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.batch_tab, text="Пакетное шифрование")
+
+        self.batch_source_label = tk.Label(self.batch_tab, text="Исходная папка:")
+        self.batch_source_label.grid(row=0, column=0, padx=10, pady=10)
+
+        self.batch_source_entry = tk.Entry(self.batch_tab, width=50)
+        self.batch_source_entry.grid(row=0, column=1, padx=10, pady=10)
+
+        self.browse_batch_source_button = tk.Button(self.batch_tab, text="Обзор",
+                                                    command=lambda: self.browse_folder(self.batch_source_entry))
+        self.browse_batch_source_button.grid(row=0, column=2, padx=10, pady=10)
+
+        self.batch_target_label = tk.Label(self.batch_tab, text="Папка для результата:")
+        self.batch_target_label.grid(row=1, column=0, padx=10, pady=10)
+
+        self.batch_target_entry = tk.Entry(self.batch_tab, width=50)
+        self.batch_target_entry.grid(row=1, column=1, padx=10, pady=10)
+
+        self.browse_batch_target_button = tk.Button(self.batch_tab, text="Обзор",
+                                                    command=lambda: self.browse_folder(self.batch_target_entry))
+        self.browse_batch_target_button.grid(row=1, column=2, padx=10, pady=10)
+
+        self.batch_start_button = tk.Button(self.batch_tab, text="Зашифровать папку", command=self.encrypt_folder)
+        self.batch_start_button.grid(row=2, column=1, pady=10)
+
+        self.batch_progress = ttk.Progressbar(self.batch_tab, length=400, mode='determinate')
+        self.batch_progress.grid(row=3, column=0, columnspan=3, pady=10)
+
+        self.batch_status = tk.StringVar(value="")
+        self.batch_status_label = tk.Label(self.batch_tab, textvariable=self.batch_status)
+        self.batch_status_label.grid(row=4, column=0, columnspan=3)
+
+    def setup_gallery_tab(self):
+        """Настройка вкладки галереи зашифрованных файлов"""
+        self.gallery_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.gallery_tab, text="Галерея")
+
+        self.gallery_folder_entry = tk.Entry(self.gallery_tab, width=50)
+        self.gallery_folder_entry.grid(row=0, column=0, padx=10, pady=10)
+
+        self.browse_gallery_button = tk.Button(self.gallery_tab, text="Обзор",
+                                               command=lambda: self.browse_folder(self.gallery_folder_entry))
+        self.browse_gallery_button.grid(row=0, column=1, padx=10, pady=10)
+
+        self.gallery_search_entry = tk.Entry(self.gallery_tab, width=20)
+        self.gallery_search_entry.grid(row=0, column=2, padx=10, pady=10)
+        self.gallery_search_entry.bind('<Return>', lambda event: self.open_gallery())
+
+        self.gallery_open_button = tk.Button(self.gallery_tab, text="Показать", command=self.open_gallery)
+        self.gallery_open_button.grid(row=0, column=3, padx=10, pady=10)
+
+        self.gallery_canvas = tk.Canvas(self.gallery_tab, width=5 * GALLERY_TILE, height=3 * GALLERY_TILE,
+                                        bg='gray20', highlightthickness=0, yscrollincrement=GALLERY_TILE // 4)
+        self.gallery_canvas.grid(row=1, column=0, columnspan=4, padx=(10, 0))
+        self.gallery_scrollbar = tk.Scrollbar(self.gallery_tab, orient=tk.VERTICAL, command=self.scroll_gallery)
+        self.gallery_scrollbar.grid(row=1, column=4, sticky=tk.NS, padx=(0, 10))
+        self.gallery_canvas.configure(yscrollcommand=self.gallery_scrollbar.set)
+        self.gallery_canvas.bind('<Configure>', self.schedule_gallery_render)
+        self.gallery_canvas.bind('<MouseWheel>', self.scroll_gallery_wheel)
+        self.gallery_canvas.bind('<Button-4>', self.scroll_gallery_wheel)
+        self.gallery_canvas.bind('<Button-5>', self.scroll_gallery_wheel)
+        self.gallery_canvas.bind('<Double-Button-1>', self.open_gallery_item)
+
+        self.gallery_status = tk.StringVar(value="")
+        self.gallery_status_label = tk.Label(self.gallery_tab, textvariable=self.gallery_status)
+        self.gallery_status_label.grid(row=2, column=0, columnspan=4)
+
+        self.gallery_items = []
+        self.gallery_photos = {}
+        self.gallery_visible = set()
+        self.gallery_pending = set()
+        self.gallery_render_pending = False
+
+    def open_gallery(self):
+        """Индексация папки в каталоге и показ её файлов; превью расшифровываются по мере прокрутки"""
+        folder = self.gallery_folder_entry.get()
+        if not folder:
+            messagebox.showwarning("Внимание", "Пожалуйста, выберите папку.")
+            return
+        text = self.gallery_search_entry.get() or None
+        if self.catalog is None:
+            self.catalog = MetadataCatalog(self.encryption_manager)
+
+        def job(task):
+            result = self.catalog.scan(folder)
+            return result, self.catalog.search(text, directory=folder, limit=-1)
+
+        def done(value):
+            result, items = value
+            self.gallery_items = items
+            self.gallery_photos.clear()
+            self.gallery_canvas.yview_moveto(0)
+            self.gallery_status.set(f"Файлов: {len(items)}, добавлено в каталог: {result['indexed']}, "
+                                    f"ошибок: {len(result['failed'])}")
+            self.schedule_gallery_render()
+
+        self.run_task("Индексация папки...", "Не удалось открыть папку", job, done)
+
+    def scroll_gallery(self, *args):
+        self.gallery_canvas.yview(*args)
+        self.schedule_gallery_render()
+
+    def scroll_gallery_wheel(self, event):
+        step = -1 if event.num == 4 or event.delta > 0 else 1
+        self.gallery_canvas.yview_scroll(step, 'units')
+        self.schedule_gallery_render()
+
+    def schedule_gallery_render(self, *_):
+        """Перерисовка галереи один раз после серии событий прокрутки и загрузки превью"""
+        if not self.gallery_render_pending:
+            self.gallery_render_pending = True
+            self.root.after_idle(self.render_gallery)
+
+    def gallery_columns(self):
+        return max(1, self.gallery_canvas.winfo_width() // GALLERY_TILE)
+
+    def render_gallery(self):
+        """Отрисовка только видимых плиток: превью остальных файлов не расшифровываются и не хранятся"""
+        self.gallery_render_pending = False
+        canvas = self.gallery_canvas
+        columns = self.gallery_columns()
+        rows = -(-len(self.gallery_items) // columns)
+        canvas.configure(scrollregion=(0, 0, columns * GALLERY_TILE, max(rows * GALLERY_TILE, 1)))
+        top = canvas.canvasy(0)
+        first = int(top // GALLERY_TILE) * columns
+        last = min(len(self.gallery_items), (int((top + canvas.winfo_height()) // GALLERY_TILE) + 1) * columns)
+        visible = self.gallery_items[first:last]
+        self.gallery_visible = {item['path'] for item in visible}
+        self.gallery_photos = {path: photo for path, photo in self.gallery_photos.items()
+                               if path in self.gallery_visible}
+        canvas.delete('tile')
+        for index, item in enumerate(visible, first):
+            row, column = divmod(index, columns)
+            x = column * GALLERY_TILE + GALLERY_TILE // 2
+            y = row * GALLERY_TILE + (GALLERY_TILE - 20) // 2
+            if item['path'] not in self.gallery_photos:
+                self.request_thumbnail(item['path'])
+            photo = self.gallery_photos.get(item['path'])
+            if photo is not None:
+                canvas.create_image(x, y, image=photo, tags='tile')
+            else:
+                half = THUMBNAIL_SIZE // 2
+                canvas.create_rectangle(x - half, y - half, x + half, y + half, outline='gray40', tags='tile')
+            canvas.create_text(x, row * GALLERY_TILE + GALLERY_TILE - 10, text=(item['name'] or '')[:24],
+                               fill='white', tags='tile')
+
+    def request_thumbnail(self, path):
+        """Фоновая расшифровка превью; плитки, ушедшие из окна до начала расшифровки, пропускаются"""
+        if path in self.gallery_pending:
+            return
+        self.gallery_pending.add(path)
+
+        def job(task):
+            if path not in self.gallery_visible:
+                return False, None
+            return True, self.thumbnail_cache.get(path)
+
+        def done(value):
+            self.gallery_pending.discard(path)
+            loaded, image = value
+            if loaded and path in self.gallery_visible:
+                self.gallery_photos[path] = ImageTk.PhotoImage(image) if image is not None else None
+                self.schedule_gallery_render()
+
+        def error(e):
+            self.gallery_pending.discard(path)
+            self.gallery_photos[path] = None
+            logging.error(f"Ошибка при расшифровке превью {path}: {e!r}")
+
+        self.thumbnail_tasks.submit(job, on_done=done, on_error=error)
+
+    def open_gallery_item(self, event):
+        """Открытие файла из галереи двойным щелчком: изображение показывается, видео воспроизводится"""
+        column = int(self.gallery_canvas.canvasx(event.x) // GALLERY_TILE)
+        index = int(self.gallery_canvas.canvasy(event.y) // GALLERY_TILE) * self.gallery_columns() + column
+        if column >= self.gallery_columns() or index >= len(self.gallery_items):
+            return
+        item = self.gallery_items[index]
+        if item['type'] == 'video':
+            show_frames(self.video_manager.iter_frames(item['path']), item['name'] or 'Видео')
+        elif item['type'] == 'recording':
+            records = self.webcam_manager.iter_recorded_frames(item['path'])
+            show_frames((frame for _, frame in records), item['name'] or 'Запись с веб-камеры')
+        elif item['type'] == 'screen':
+            records = self.screenshot_manager.iter_recorded_frames(item['path'])
+            show_frames((frame for _, frame in records), item['name'] or 'Запись экрана')
+        else:
+            self.run_task("Дешифрование изображения...", "Не удалось расшифровать изображение",
+                          lambda task: self.image_manager.load_encrypted_image(item['path']),
+                          lambda image: self.show_image_window(image, item['name'] or 'Изображение'))
+
+    def browse_folder(self, entry):
+        """Обзор и выбор папки"""
+        folder_path = filedialog.askdirectory()
+        if folder_path:
+            entry.delete(0, tk.END)
+            entry.insert(0, folder_path)
+
+    def encrypt_folder(self):
+        """Пакетно зашифровать папку в фоновом потоке с индикатором прогресса"""
+        source_dir = self.batch_source_entry.get()
+        target_dir = self.batch_target_entry.get()
+        if not source_dir or not target_dir:
+            messagebox.showwarning("Внимание", "Пожалуйста, выберите исходную папку и папку для результата.")
+            return
+        batch_manager = BatchManager(self.encryption_manager)
+
+        def show_progress(done, total):
+            self.batch_progress['maximum'] = max(total, 1)
+            self.batch_progress['value'] = done
+            self.batch_status.set(f"{done} / {total}")
+
+        def job(task):
+            def progress(done, total, name):
+                task.report_progress(done, total)
+                self.tasks.post(show_progress, done, total)
+            return batch_manager.encrypt_folder(source_dir, target_dir, progress=progress,
+                                                cancel_event=task.cancel_event)
+
+        def done(result):
+            messagebox.showinfo("Успех", f"Зашифровано файлов: {result['completed']} из {result['total']}, "
+                                         f"ошибок: {len(result['failed'])}")
+
+        def finish():
+            self.batch_start_button['state'] = tk.NORMAL
+
+        self.batch_start_button['state'] = tk.DISABLED
+        self.run_task("Пакетное шифрование...", "Не удалось зашифровать папку", job, done, on_finish=finish)
+
     def browse_image(self):
         """Обзор и выбор изображения"""
         file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg")])
@@ -402,14 +3881,19 @@ class GUIApplication:
         """Скачать и зашифровать видео с дрона"""
         video_url = self.drone_video_url_entry.get()
         if video_url:
-            video_path = "downloaded_drone_video.mp4"
             encrypted_video_path = filedialog.asksaveasfilename(defaultextension=".dat", filetypes=[("Encrypted Files", "*.dat")])
             if encrypted_video_path:
-                self.drone_manager.download_video(video_url, video_path)
-                self.drone_manager.encrypt_video(video_path, encrypted_video_path)
-                os.remove(video_path)  # Удаление временного файла после шифрования
-                messagebox.showinfo("Успех", f"Видео с дрона скачано, зашифровано и сохранено в {encrypted_video_path}")
-                self.display_video_metadata(video_path, self.drone_metadata_text)
+                def job(task):
+                    self.drone_manager.fetch_video(video_url, encrypted_video_path, task)
+                    return self.video_manager.extract_metadata(encrypted_video_path)
+
+                def done(metadata):
+                    messagebox.showinfo("Успех", f"Видео с дрона скачано, зашифровано и сохранено в {encrypted_video_path}")
+                    self.drone_metadata_text.delete(1.0, tk.END)
+                    self.drone_metadata_text.insert(tk.END, self.format_video_metadata(metadata))
+
+                # загрузчик сам пишет во временный файл и сохраняет его для продолжения после ошибки
+                self.run_task("Загрузка и шифрование видео с дрона...", "Не удалось загрузить видео", job, done)
 
     def decrypt_and_play_drone_video(self):
         """Расшифровать и воспроизвести видео с дрона"""
@@ -424,9 +3908,17 @@ class GUIApplication:
             encrypted_image_path = filedialog.asksaveasfilename(defaultextension=".dat",
                                                                 filetypes=[("Encrypted Files", "*.dat")])
             if encrypted_image_path:
-                self.image_manager.encrypt_image(image_path, encrypted_image_path)
-                messagebox.showinfo("Успех", f"Изображение зашифровано и сохранено в {encrypted_image_path}")
-                self.display_encrypted_metadata(encrypted_image_path, self.image_metadata_text)
+                codec = None if self.image_codec.get() == "авто" else self.image_codec.get()
+
+                def job(task, target):
+                    self.image_manager.encrypt_image(image_path, target, codec)
+
+                def done(_):
+                    messagebox.showinfo("Успех", f"Изображение зашифровано и сохранено в {encrypted_image_path}")
+                    self.display_encrypted_metadata(encrypted_image_path, self.image_metadata_text)
+
+                self.run_task("Шифрование изображения...", "Не удалось зашифровать изображение",
+                              job, done, encrypted_image_path)
         else:
             messagebox.showwarning("Внимание", "Пожалуйста, выберите файл изображения.")
 
@@ -437,9 +3929,15 @@ class GUIApplication:
             output_image_path = filedialog.asksaveasfilename(defaultextension=".png",
                                                              filetypes=[("Image Files", "*.png")])
             if output_image_path:
-                self.image_manager.decrypt_image(encrypted_image_path, output_image_path)
-                self.display_image_metadata(output_image_path, self.image_metadata_text)
-                messagebox.showinfo("Успех", f"Изображение дешифровано и сохранено в {output_image_path}")
+                def job(task, target):
+                    self.image_manager.decrypt_image(encrypted_image_path, target)
+
+                def done(_):
+                    self.display_image_metadata(output_image_path, self.image_metadata_text)
+                    messagebox.showinfo("Успех", f"Изображение дешифровано и сохранено в {output_image_path}")
+
+                self.run_task("Дешифрование изображения...", "Не удалось расшифровать изображение",
+                              job, done, output_image_path)
         else:
             messagebox.showwarning("Внимание", "Пожалуйста, выберите зашифрованный файл изображения.")
 
@@ -450,9 +3948,17 @@ class GUIApplication:
             encrypted_video_path = filedialog.asksaveasfilename(defaultextension=".dat",
                                                                 filetypes=[("Encrypted Files", "*.dat")])
             if encrypted_video_path:
-                self.video_manager.encrypt_video(video_path, encrypted_video_path)
-                messagebox.showinfo("Успех", f"Видео зашифровано и сохранено в {encrypted_video_path}")
-                self.display_encrypted_metadata(encrypted_video_path, self.video_metadata_text)
+                per_frame = self.video_per_frame.get()
+
+                def job(task, target):
+                    self.video_manager.encrypt_video(video_path, target, per_frame, task)
+
+                def done(_):
+                    messagebox.showinfo("Успех", f"Видео зашифровано и сохранено в {encrypted_video_path}")
+                    self.display_encrypted_metadata(encrypted_video_path, self.video_metadata_text)
+
+                self.run_task("Шифрование видео...", "Не удалось зашифровать видео",
+                              job, done, encrypted_video_path)
         else:
             messagebox.showwarning("Внимание", "Пожалуйста, выберите видеофайл.")
 
@@ -463,61 +3969,167 @@ class GUIApplication:
             output_video_path = filedialog.asksaveasfilename(defaultextension=".mp4",
                                                              filetypes=[("Video Files", "*.mp4")])
             if output_video_path:
-                self.video_manager.decrypt_video(encrypted_video_path, output_video_path)
-                self.display_video_metadata(output_video_path, self.video_metadata_text)
-                messagebox.showinfo("Успех", f"Видео дешифровано и сохранено в {output_video_path}")
+                def job(task, target):
+                    self.video_manager.decrypt_video(encrypted_video_path, target, task)
+
+                def done(_):
+                    self.display_video_metadata(output_video_path, self.video_metadata_text)
+                    messagebox.showinfo("Успех", f"Видео дешифровано и сохранено в {output_video_path}")
+
+                self.run_task("Дешифрование видео...", "Не удалось расшифровать видео",
+                              job, done, output_video_path)
 
     def play_video(self):
         """Воспроизвести видео"""
         video_path = self.video_path_entry.get()
         if video_path:
-            cap = cv2.VideoCapture(video_path)
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if ret:
-                    cv2.imshow('Видео', frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        break
-                else:
-                    break
-            cap.release()
-            cv2.destroyAllWindows()
+            show_frames(self.video_manager.iter_frames(video_path), 'Видео')
 
     def capture_and_encrypt_webcam_image(self):
         """Захватить и зашифровать изображение с веб-камеры"""
         encrypted_image_path = filedialog.asksaveasfilename(defaultextension=".dat",
                                                             filetypes=[("Encrypted Files", "*.dat")])
         if encrypted_image_path:
-            self.webcam_manager.capture_and_encrypt_image(encrypted_image_path)
-            messagebox.showinfo("Успех", f"Изображение с веб-камеры захвачено и зашифровано в {encrypted_image_path}")
-            self.display_encrypted_metadata(encrypted_image_path, self.webcam_metadata_text)
+            def done(_):
+                messagebox.showinfo("Успех", f"Изображение с веб-камеры захвачено и зашифровано в {encrypted_image_path}")
+                self.display_encrypted_metadata(encrypted_image_path, self.webcam_metadata_text)
+
+            self.run_task("Захват изображения с веб-камеры...", "Не удалось захватить изображение",
+                          lambda task, target: self.webcam_manager.capture_and_encrypt_image(target),
+                          done, encrypted_image_path)
 
     def decrypt_and_show_webcam_image(self):
         """Расшифровать и показать изображение с веб-камеры"""
         encrypted_image_path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.dat")])
         if encrypted_image_path:
-            self.webcam_manager.decrypt_and_show_image(encrypted_image_path)
+            self.run_task("Дешифрование изображения...", "Не удалось расшифровать изображение",
+                          lambda task: self.image_manager.load_encrypted_image(encrypted_image_path),
+                          lambda image: self.show_image_window(image, 'Дешифрованное изображение с веб-камеры'))
+
+    def toggle_webcam_recording(self):
+        """Начать или остановить зашифрованную запись с веб-камеры"""
+        if self.webcam_recorder is None:
+            encrypted_video_path = filedialog.asksaveasfilename(defaultextension=".dat",
+                                                                filetypes=[("Encrypted Files", "*.dat")])
+            if not encrypted_video_path:
+                return
+            try:
+                self.webcam_recorder = self.webcam_manager.start_recording(encrypted_video_path)
+            except Exception as e:
+                logging.error(f"Ошибка при запуске записи с веб-камеры: {e!r}")
+                messagebox.showerror("Ошибка", f"Не удалось начать запись: {e}")
+                return
+            self.record_webcam_button['text'] = "Остановить запись"
+            self.show_recording_statistics()
+            return
+        recorder, self.webcam_recorder = self.webcam_recorder, None
+        self.record_webcam_button['text'] = "Начать запись видео"
+        self.record_webcam_button['state'] = tk.DISABLED
+
+        def done(statistics):
+            self.record_webcam_button['state'] = tk.NORMAL
+            self.display_recording_statistics(statistics)
+            messagebox.showinfo("Успех", f"Запись сохранена в {recorder.output_path}")
+
+        self.run_task("Завершение записи...", "Ошибка записи с веб-камеры", lambda task: recorder.stop(), done,
+                      on_finish=lambda: self.record_webcam_button.config(state=tk.NORMAL))
+
+    def show_recording_statistics(self):
+        """Периодическое обновление статистики записи"""
+        if self.webcam_recorder is not None:
+            self.display_recording_statistics(self.webcam_recorder.statistics())
+            self.root.after(500, self.show_recording_statistics)
+
+    def display_recording_statistics(self, statistics, text_widget=None):
+        """Отображение счётчиков кадров, очереди и задержек стадий записи"""
+        text_widget = text_widget or self.webcam_metadata_text
+        text = (f"Захвачено кадров: {statistics['captured']}\n"
+                f"Записано кадров: {statistics['written']} ({statistics['fps']:.1f} кадр/с)\n"
+                f"Потеряно кадров: {statistics['dropped']}\n"
+                f"Очередь: {statistics['backlog']} (максимум {statistics['max_backlog']})\n")
+        if 'changed_tiles_percent' in statistics:
+            text += (f"Изменившихся плиток: {statistics['changed_tiles_percent']:.1f}%, "
+                     f"записано {statistics['bytes_written'] / 2 ** 20:.1f} МБ, "
+                     f"загрузка процессора {statistics['cpu_percent']:.0f}%\n")
+        for name, stage in statistics['stages'].items():
+            text += f"{name}: среднее {stage['mean_ms']:.1f} мс, максимум {stage['max_ms']:.1f} мс\n"
+        text_widget.delete(1.0, tk.END)
+        text_widget.insert(tk.END, text)
+
+    def play_webcam_recording(self, live=False):
+        """Расшифровать и воспроизвести запись с веб-камеры; live — просмотр записи, которая ещё идёт"""
+        encrypted_video_path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.dat")])
+        if encrypted_video_path:
+            records = self.webcam_manager.iter_recorded_frames(encrypted_video_path, live)
+            show_frames((frame for _, frame in records), 'Запись с веб-камеры')
 
     def capture_and_encrypt_screenshot(self):
         """Захватить и зашифровать скриншот"""
         encrypted_image_path = filedialog.asksaveasfilename(defaultextension=".dat",
                                                             filetypes=[("Encrypted Files", "*.dat")])
         if encrypted_image_path:
-            self.screenshot_manager.capture_and_encrypt_screenshot(encrypted_image_path)
-            messagebox.showinfo("Успех", f"Скриншот захвачен и зашифрован в {encrypted_image_path}")
-            self.display_encrypted_metadata(encrypted_image_path, self.screenshot_metadata_text)
+            def done(_):
+                messagebox.showinfo("Успех", f"Скриншот захвачен и зашифрован в {encrypted_image_path}")
+                self.display_encrypted_metadata(encrypted_image_path, self.screenshot_metadata_text)
+
+            self.run_task("Захват скриншота...", "Не удалось захватить скриншот",
+                          lambda task, target: self.screenshot_manager.capture_and_encrypt_screenshot(target),
+                          done, encrypted_image_path)
+
+    def toggle_screen_recording(self):
+        """Начать или остановить периодическую зашифрованную запись экрана"""
+        if self.screen_recorder is None:
+            encrypted_video_path = filedialog.asksaveasfilename(defaultextension=".dat",
+                                                                filetypes=[("Encrypted Files", "*.dat")])
+            if not encrypted_video_path:
+                return
+            try:
+                self.screen_recorder = self.screenshot_manager.start_recording(encrypted_video_path)
+            except Exception as e:
+                logging.error(f"Ошибка при запуске записи экрана: {e!r}")
+                messagebox.showerror("Ошибка", f"Не удалось начать запись: {e}")
+                return
+            self.record_screen_button['text'] = "Остановить запись экрана"
+            self.show_screen_recording_statistics()
+            return
+        recorder, self.screen_recorder = self.screen_recorder, None
+        self.record_screen_button['text'] = "Начать запись экрана"
+        self.record_screen_button['state'] = tk.DISABLED
+
+        def done(statistics):
+            self.display_recording_statistics(statistics, self.screenshot_metadata_text)
+            messagebox.showinfo("Успех", f"Запись экрана сохранена в {recorder.output_path}")
+
+        self.run_task("Завершение записи экрана...", "Ошибка записи экрана", lambda task: recorder.stop(), done,
+                      on_finish=lambda: self.record_screen_button.config(state=tk.NORMAL))
+
+    def show_screen_recording_statistics(self):
+        """Периодическое обновление статистики записи экрана"""
+        if self.screen_recorder is not None:
+            self.display_recording_statistics(self.screen_recorder.statistics(), self.screenshot_metadata_text)
+            self.root.after(500, self.show_screen_recording_statistics)
+
+    def play_screen_recording(self):
+        """Расшифровать и воспроизвести запись экрана; идущая запись показывается в реальном времени"""
+        encrypted_video_path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.dat")])
+        if encrypted_video_path:
+            live = self.screen_recorder is not None and self.screen_recorder.output_path == encrypted_video_path
+            records = self.screenshot_manager.iter_recorded_frames(encrypted_video_path, live)
+            show_frames((frame for _, frame in records), 'Запись экрана')
 
     def decrypt_and_show_screenshot(self):
         """Расшифровать и показать скриншот"""
         encrypted_image_path = filedialog.askopenfilename(filetypes=[("Encrypted Files", "*.dat")])
         if encrypted_image_path:
-            self.screenshot_manager.decrypt_and_show_screenshot(encrypted_image_path)
+            self.run_task("Дешифрование скриншота...", "Не удалось расшифровать скриншот",
+                          lambda task: self.image_manager.load_encrypted_image(encrypted_image_path),
+                          lambda image: self.show_image_window(image, 'Дешифрованный снимок экрана'))
 
     def display_image_metadata(self, file_path, text_widget):
         """Отображение метаданных изображения"""
         text_widget.delete(1.0, tk.END)
         if file_path.endswith('.dat'):
-            text_widget.insert(tk.END, "Зашифрованный файл: метаданные недоступны.")
+            self.display_encrypted_metadata(file_path, text_widget)
         else:
             metadata, exif_data = self.image_manager.extract_metadata(file_path)
             formatted_metadata = self.format_metadata(metadata, exif_data)
@@ -527,16 +4139,24 @@ class GUIApplication:
         """Отображение метаданных видео"""
         text_widget.delete(1.0, tk.END)
         if file_path.endswith('.dat'):
-            text_widget.insert(tk.END, "Зашифрованный файл: метаданные недоступны.")
+            self.display_encrypted_metadata(file_path, text_widget)
         else:
             metadata = self.video_manager.extract_metadata(file_path)
             formatted_metadata = self.format_video_metadata(metadata)
             text_widget.insert(tk.END, formatted_metadata)
 
     def display_encrypted_metadata(self, file_path, text_widget):
-        """Отображение метаданных зашифрованного файла"""
+        """Отображение метаданных зашифрованного файла: расшифровывается только заголовок"""
         text_widget.delete(1.0, tk.END)
-        text_widget.insert(tk.END, "Зашифрованный файл: метаданные недоступны.")
+        try:
+            metadata = self.encryption_manager.read_metadata(file_path)
+        except (OSError, ValueError, InvalidTag) as e:
+            logging.error(f"Ошибка при чтении метаданных {file_path}: {e!r}")
+            metadata = None
+        if metadata is None:
+            text_widget.insert(tk.END, "Зашифрованный файл: метаданные недоступны.")
+        else:
+            text_widget.insert(tk.END, self.format_encrypted_metadata(metadata))
 
     @staticmethod
     def format_metadata(metadata, exif_data):
@@ -549,6 +4169,19 @@ class GUIApplication:
             formatted += f"{key}: {value}\n"
         return formatted
 
+    @staticmethod
+    def format_encrypted_metadata(metadata, indent=""):
+        """Форматирование метаданных из заголовка зашифрованного файла"""
+        formatted = "" if indent else "Метаданные (из заголовка):\n"
+        for key, value in metadata.items():
+            if key == 'created' and isinstance(value, (int, float)):
+                value = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+            if isinstance(value, dict):
+                formatted += f"{indent}{key}:\n" + GUIApplication.format_encrypted_metadata(value, indent + "  ")
+            else:
+                formatted += f"{indent}{key}: {value}\n"
+        return formatted
+
     @staticmethod
     def format_video_metadata(metadata):
         """Форматирование метаданных видео"""
@@ -557,7 +4190,438 @@ class GUIApplication:
             formatted += f"{key}: {value}\n"
         return formatted
 
-if __name__ == "__main__":
+def load_key(key_path, create=False):
+    """Чтение ключа из файла. Если файла нет, новый ключ генерируется и сохраняется только
+    при create=True (при шифровании), иначе FileNotFoundError."""
+    if os.path.exists(key_path):
+        with open(key_path, 'rb') as file:
+            return file.read().strip()
+    if not create:
+        raise FileNotFoundError(f"Файл ключа {key_path} не найден.")
+    key = EncryptionManager.generate_key()
+    with open(key_path, 'xb') as file:
+        file.write(key)
+    print(f"Файл ключа {key_path} не найден, создан новый ключ.", file=sys.stderr)
+    return key
+
+
+def encrypted_files(paths):
+    """Зашифрованные файлы из списка путей; папки обходятся рекурсивно, недописанные файлы пропускаются"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for folder, _, names in os.walk(path):
+            for name in sorted(names):
+                file_path = os.path.join(folder, name)
+                if not is_temporary_file(name) and (name.endswith('.dat') or is_container(file_path)):
+                    yield file_path
+
+
+def encrypt_media_file(encryption_manager, source_path, target_path, codec=None, per_frame=False, workers=None):
+    """Шифрование одного файла без графического интерфейса: изображения и видео — с метаданными и превью,
+    остальные файлы — как есть, без загрузки OpenCV. Ошибки записываются в журнал аудита и пробрасываются."""
+    extension = os.path.splitext(source_path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        ImageManager(encryption_manager).encrypt_image(source_path, target_path, codec)
+    elif extension in VIDEO_EXTENSIONS:
+        VideoManager(encryption_manager).encrypt_video(source_path, target_path, per_frame)
+    else:
+        with log_operation('encrypt_file', source_path, target=target_path):
+            encryption_manager.encrypt_file(source_path, target_path, workers)
+
+
+def decrypt_media_file(encryption_manager, source_path, target_path, workers=None):
+    """Дешифрование одного файла без графического интерфейса. Содержимое восстанавливается байт в байт,
+    без перекодирования; покадровое видео собирается в видеофайл. Ошибки пробрасываются."""
+    fields = encryption_manager.read_header_fields(source_path)
+    content_type = fields.get(HEADER_CONTENT_TYPE)
+    metadata = encryption_manager.open_metadata(fields) if fields else None
+    if metadata and metadata.get('type') == 'image' and metadata.get('codec') not in (None, 'raw'):
+        # изображение было перекодировано при шифровании, формат результата задаёт расширение target_path
+        ImageManager(encryption_manager).decrypt_image(source_path, target_path)
+        return
+    if content_type == FRAMES_JPEG_CONTENT:
+        VideoManager(encryption_manager).decrypt_video(source_path, target_path)
+        return
+    if content_type == SCREEN_TILES_CONTENT:
+        raise ValueError("Запись экрана не расшифровывается в файл, её можно только воспроизвести.")
+    with log_operation('decrypt_file', source_path, target=target_path) as operation:
+        operation['bytes'] = encryption_manager.decrypt_file(source_path, target_path, workers)
+
+
+def open_encryption_manager(args, create=False):
+    """Менеджер шифрования по аргументам командной строки: хранилище ключей или файл ключа.
+    Пароль хранилища берётся из LEAKS_KEYSTORE_PASSWORD или запрашивается в терминале.
+    create=True передают только шифрующие команды: тогда отсутствующий файл ключа создаётся,
+    а хранилище — лишь вместе с явным флагом --create-keystore."""
+    if args.key_file:
+        return EncryptionManager(load_key(args.key_file, create), getattr(args, 'workers', None))
+    keystore = open_keystore(args.keystore, create and getattr(args, 'create_keystore', False))
+    return keystore.manager(workers=getattr(args, 'workers', None))
+
+
+def open_keystore(path, create=False):
+    """Хранилище ключей для командной строки. Пароль берётся из LEAKS_KEYSTORE_PASSWORD
+    или запрашивается в терминале; для нового хранилища — дважды.
+    Отсутствующее хранилище создаётся только при create=True, иначе FileNotFoundError."""
+    password = os.environ.get('LEAKS_KEYSTORE_PASSWORD') or None
+    if os.path.exists(path):
+        create = False
+    elif not create:
+        raise FileNotFoundError(f"Хранилище ключей {path} не найдено. Новое хранилище создаётся "
+                                f"командами encrypt и batch с флагом --create-keystore.")
+    else:
+        print(f"Хранилище ключей {path} не найдено, будет создано новое.", file=sys.stderr)
+    if password is None:
+        password = getpass.getpass("Пароль хранилища ключей: ")
+        if create and getpass.getpass("Повторите пароль: ") != password:
+            raise ValueError("Пароли не совпадают.")
+    return KeyStore(path, password, create=create)
+
+
+def main(argv=None):
+    """Запуск из командной строки; без аргументов открывается графический интерфейс"""
+    parser = argparse.ArgumentParser(description="Шифрование изображений и видео")
+    commands = parser.add_subparsers(dest='command')
+    encrypt_parser = commands.add_parser('encrypt', help="шифрование файла или папки без графического интерфейса")
+    encrypt_parser.add_argument('source', help="исходный файл или папка")
+    encrypt_parser.add_argument('target', help="зашифрованный файл или папка")
+    encrypt_parser.add_argument('--codec', choices=sorted(IMAGE_CODECS), help="кодек изображений")
+    encrypt_parser.add_argument('--per-frame', action='store_true', help="покадровое шифрование видео")
+    encrypt_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число потоков")
+    encrypt_keys = encrypt_parser.add_mutually_exclusive_group()
+    encrypt_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    encrypt_keys.add_argument('--key-file', help="файл ключа (создаётся, если его нет)")
+    encrypt_parser.add_argument('--create-keystore', action='store_true',
+                                help="создать хранилище ключей, если его нет")
+    decrypt_parser = commands.add_parser('decrypt', help="дешифрование файла или папки без графического интерфейса")
+    decrypt_parser.add_argument('source', help="зашифрованный файл или папка")
+    decrypt_parser.add_argument('target', help="расшифрованный файл или папка")
+    decrypt_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число потоков")
+    decrypt_keys = decrypt_parser.add_mutually_exclusive_group()
+    decrypt_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    decrypt_keys.add_argument('--key-file', help="файл ключа")
+    batch_parser = commands.add_parser('batch', help="пакетное шифрование папки")
+    batch_parser.add_argument('source', help="исходная папка")
+    batch_parser.add_argument('target', help="папка для зашифрованных файлов")
+    batch_keys = batch_parser.add_mutually_exclusive_group()
+    batch_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    batch_keys.add_argument('--key-file', help="файл ключа (создаётся, если его нет)")
+    batch_parser.add_argument('--create-keystore', action='store_true',
+                              help="создать хранилище ключей, если его нет")
+    batch_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число потоков")
+    codecs_parser = commands.add_parser('image-codecs', help="сравнение кодеков изображения по размеру и скорости")
+    codecs_parser.add_argument('image', help="файл изображения")
+    bench_parser = commands.add_parser('bench', help="сравнение скорости и накладных расходов шифров")
+    bench_parser.add_argument('--repeat', type=int, default=3, help="число повторов каждого замера")
+    bench_parser.add_argument('--workers', type=int, default=1, help="потоков для шифрования контейнера")
+    io_bench_parser = commands.add_parser('io-bench', help="сравнение ввода-вывода при шифровании больших файлов")
+    io_bench_parser.add_argument('--sizes', default='0.25,1', help="размеры тестовых файлов в ГБ через запятую")
+    io_bench_parser.add_argument('--dir', default=tempfile.gettempdir(), help="папка для тестовых файлов")
+    io_bench_parser.add_argument('--modes', default='whole,stream', help="способы: whole, stream")
+    verify_parser = commands.add_parser('verify', help="проверка целостности зашифрованных файлов без расшифровки на диск")
+    verify_parser.add_argument('paths', nargs='+', help="файлы или папки")
+    verify_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="потоков проверки сегментов")
+    verify_keys = verify_parser.add_mutually_exclusive_group()
+    verify_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    verify_keys.add_argument('--key-file', help="файл ключа")
+    rekey_parser = commands.add_parser('rekey', help="перешифрование файлов новым ключом (ротация ключей)")
+    rekey_parser.add_argument('paths', nargs='+', help="файлы или папки")
+    rekey_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="потоков шифрования сегментов")
+    rekey_keys = rekey_parser.add_mutually_exclusive_group()
+    rekey_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    rekey_keys.add_argument('--key-file', help="файл текущего ключа")
+    rekey_target = rekey_parser.add_mutually_exclusive_group(required=True)
+    rekey_target.add_argument('--new-key', action='store_true',
+                              help="создать в хранилище новый активный ключ и перешифровать им файлы")
+    rekey_target.add_argument('--active', action='store_true',
+                              help="перешифровать активным ключом хранилища (продолжение прерванной ротации)")
+    rekey_target.add_argument('--new-key-file', help="файл нового ключа (создаётся, если его нет)")
+    download_parser = commands.add_parser('download', help="загрузка видео по URL сразу в зашифрованный контейнер")
+    download_parser.add_argument('url', help="адрес видео")
+    download_parser.add_argument('output', help="файл контейнера")
+    download_keys = download_parser.add_mutually_exclusive_group()
+    download_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    download_keys.add_argument('--key-file', help="файл ключа (создаётся, если его нет)")
+    download_parser.add_argument('--connections', type=int, default=DOWNLOAD_CONNECTIONS,
+                                 help="число параллельных запросов")
+    screen_parser = commands.add_parser('screen-record', help="периодическая запись экрана с шифрованием")
+    screen_parser.add_argument('output', help="файл контейнера")
+    screen_parser.add_argument('--seconds', type=float, default=10.0, help="длительность записи")
+    screen_parser.add_argument('--fps', type=positive_float, default=SCREEN_FPS, help="кадров в секунду")
+    screen_parser.add_argument('--codec', choices=sorted(SCREEN_TILE_CODECS), default='png', help="кодек плиток")
+    screen_parser.add_argument('--synthetic', action='store_true',
+                               help="синтетический экран 1920x1080 вместо захвата (для проверки без дисплея)")
+    screen_keys = screen_parser.add_mutually_exclusive_group()
+    screen_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    screen_keys.add_argument('--key-file', help="файл ключа (создаётся, если его нет)")
+    frames_parser = commands.add_parser('encrypt-frames', help="покадровое шифрование видео")
+    frames_parser.add_argument('source', help="исходное видео")
+    frames_parser.add_argument('output', help="файл контейнера")
+    frames_parser.add_argument('--quality', type=int, default=85, help="качество JPEG кадров")
+    clip_parser = commands.add_parser('export-clip', help="расшифровка отрезка покадрового контейнера в видеофайл")
+    clip_parser.add_argument('source', help="файл контейнера")
+    clip_parser.add_argument('output', help="видеофайл (mp4)")
+    clip_parser.add_argument('--start', type=float, default=0.0, help="начало отрезка, с")
+    clip_parser.add_argument('--end', type=float, help="конец отрезка, с")
+    for frames_command, key_file_help in ((frames_parser, "файл ключа (создаётся, если его нет)"),
+                                          (clip_parser, "файл ключа")):
+        frames_keys = frames_command.add_mutually_exclusive_group()
+        frames_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+        frames_keys.add_argument('--key-file', help=key_file_help)
+    audit_parser = commands.add_parser('audit', help="анализ журнала аудита: сводка, ошибки, история файла")
+    audit_parser.add_argument('logs', nargs='*',
+                              help="файлы журнала (по умолчанию текущий журнал аудита и его сжатые копии)")
+    audit_parser.add_argument('--db', default=AUDIT_INDEX_PATH, help="файл индекса")
+    audit_parser.add_argument('--since', type=parse_time_argument, help="начало интервала: 7d, 12h или ГГГГ-ММ-ДД")
+    audit_parser.add_argument('--until', type=parse_time_argument, help="конец интервала")
+    audit_parser.add_argument('--operation', help="операция или шаблон LIKE, например decrypt%%")
+    audit_query = audit_parser.add_mutually_exclusive_group()
+    audit_query.add_argument('--failures', action='store_true', help="список неудачных операций")
+    audit_query.add_argument('--path', help="история операций с файлом (допускается шаблон LIKE)")
+    audit_parser.add_argument('--limit', type=int, default=100, help="наибольшее число событий в списке")
+    catalog_parser = commands.add_parser('catalog', help="индексация и поиск зашифрованных файлов по метаданным")
+    catalog_parser.add_argument('folder', nargs='?', help="папка для индексации (без неё — только поиск)")
+    catalog_parser.add_argument('--db', default=CATALOG_PATH, help="файл каталога")
+    catalog_parser.add_argument('--search', help="подстрока имени или пути")
+    catalog_parser.add_argument('--type', choices=('image', 'video', 'recording', 'screen'), help="тип файла")
+    catalog_parser.add_argument('--min-width', type=int, help="минимальная ширина")
+    catalog_parser.add_argument('--min-height', type=int, help="минимальная высота")
+    catalog_parser.add_argument('--limit', type=int, default=50, help="число результатов")
+    catalog_keys = catalog_parser.add_mutually_exclusive_group()
+    catalog_keys.add_argument('--keystore', default=KEYSTORE_PATH, help="файл хранилища ключей")
+    catalog_keys.add_argument('--key-file', help="файл ключа")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.command == 'screen-record':
+        source = SyntheticScreenSource() if args.synthetic else None
+        encryption_manager = open_encryption_manager(args, create=True)
+        recorder = ScreenshotManager(encryption_manager).start_recording(args.output, source, args.fps, args.codec)
+        try:
+            time.sleep(args.seconds)
+        finally:
+            statistics = recorder.stop()
+        print(f"Кадров: {statistics['written']} ({statistics['fps']:.1f} кадр/с), пропущено: {statistics['dropped']}, "
+              f"изменившихся плиток: {statistics['changed_tiles_percent']:.1f}%, "
+              f"записано: {statistics['bytes_written'] / 2 ** 20:.2f} МБ, процессор: {statistics['cpu_percent']:.0f}%")
+        for name, stage in statistics['stages'].items():
+            print(f"  {name}: среднее {stage['mean_ms']:.2f} мс, максимум {stage['max_ms']:.2f} мс")
+        return 0
+
+    if args.command == 'encrypt-frames':
+        started = time.perf_counter()
+        encryption_manager = open_encryption_manager(args, create=True)
+        with log_operation('encrypt_video', args.source, target=args.output, per_frame=True) as operation:
+            count = VideoManager(encryption_manager).encrypt_video_frames(args.source, args.output, args.quality)
+            operation['frames'] = count
+        print(f"Кадров: {count} за {time.perf_counter() - started:.2f} с")
+        return 0
+
+    if args.command == 'export-clip':
+        with log_operation('export_clip', args.source, target=args.output) as operation:
+            count = VideoManager(open_encryption_manager(args)).export_frames(args.source, args.output,
+                                                                              args.start, args.end)
+            operation['frames'] = count
+            operation['bytes'] = os.path.getsize(args.output) if count else 0
+        print(f"Кадров: {count}")
+        return 0
+
+    if args.command == 'audit':
+        with AuditLogIndex(args.db) as index:
+            started = time.perf_counter()
+            added = sum(index.ingest(log_path) for log_path in args.logs or AuditLogIndex.log_files())
+            print(f"Добавлено событий: {added} ({time.perf_counter() - started:.2f} с)", file=sys.stderr)
+            started = time.perf_counter()
+            if args.failures or args.path:
+                if args.failures:
+                    events = index.failures(args.since, args.until, args.operation, args.limit)
+                else:
+                    events = index.history(args.path, args.since, args.until, args.limit)
+                for event in events:
+                    moment = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['timestamp']))
+                    if event['operation'] is None:
+                        print(f"{moment} {event['level']:<7} {event['message']}")
+                        continue
+                    detail = event['error'] or (f"{event['duration_ms']:.1f} мс, {event['bytes'] or 0} байт"
+                                                if event['duration_ms'] is not None else "")
+                    print(f"{moment} {event['status']:<9} {event['operation']:<18} {event['path']}  {detail}")
+                print(f"Событий: {len(events)}", end='', file=sys.stderr)
+            else:
+                summary = index.summary(args.since, args.until, args.operation)
+                print(f"{'операция':<18} {'всего':>9} {'ошибок':>8} {'МБ':>10} {'мс':>9}  скорость МБ/с p50/p90/p99")
+                for name, row in summary.items():
+                    speeds = '/'.join(f"{row['throughput_mb_s'][p]:.1f}" if p in row['throughput_mb_s'] else '-'
+                                      for p in (50, 90, 99))
+                    print(f"{name:<18} {row['total']:>9} {row['failure_rate']:>7.1%} {row['bytes'] / 1e6:>10.1f} "
+                          f"{row['mean_duration_ms']:>9.1f}  {speeds}")
+                print(f"Операций: {len(summary)}", end='', file=sys.stderr)
+            print(f" ({(time.perf_counter() - started) * 1000:.1f} мс)", file=sys.stderr)
+        return 0
+
+    if args.command == 'catalog':
+        with MetadataCatalog(open_encryption_manager(args), args.db) as catalog:
+            if args.folder:
+                started = time.perf_counter()
+                result = catalog.scan(args.folder)
+                print(f"Проиндексировано: {result['indexed']}, без изменений: {result['unchanged']}, "
+                      f"удалено: {result['removed']}, ошибок: {len(result['failed'])} "
+                      f"({time.perf_counter() - started:.3f} с)", file=sys.stderr)
+            started = time.perf_counter()
+            rows = catalog.search(args.search, args.type, args.min_width, args.min_height, args.limit)
+            for row in rows:
+                size = f"{row['width']}x{row['height']}" if row['width'] else "-"
+                print(f"{row['type'] or '-':<9} {size:>11} {row['name'] or '-':<32} {row['path']}")
+            print(f"Найдено: {len(rows)} ({(time.perf_counter() - started) * 1000:.1f} мс)", file=sys.stderr)
+        return 0
+
+    if args.command == 'verify':
+        encryption_manager = open_encryption_manager(args)
+        started = time.perf_counter()
+        total = failed = 0
+        for file_path in encrypted_files(args.paths):
+            try:
+                with log_operation('verify', file_path) as operation:
+                    result = encryption_manager.verify_file(file_path, args.workers)
+                    operation['segments'] = result['segments']
+            except Exception as e:
+                failed += 1
+                print(f"ОШИБКА {file_path}: {e!r}")
+                continue
+            total += os.path.getsize(file_path)
+            print(f"OK     {file_path} (сегментов: {result['segments']})")
+        seconds = time.perf_counter() - started
+        print(f"Проверено {total / 2 ** 20:.1f} МБ за {seconds:.2f} с ({total / 2 ** 20 / max(seconds, 1e-9):.1f} МБ/с), "
+              f"повреждено файлов: {failed}", file=sys.stderr)
+        return 1 if failed else 0
+
+    if args.command == 'rekey':
+        if args.new_key_file:
+            encryption_manager = open_encryption_manager(args)
+            target = EncryptionManager(load_key(args.new_key_file, create=True), args.workers)
+        elif args.key_file:
+            parser.error("--new-key и --active требуют хранилища ключей, для файла ключа укажите --new-key-file")
+        else:
+            keystore = open_keystore(args.keystore)
+            if args.new_key:
+                keystore.create_key()
+            # менеджер активного ключа расшифровывает старые файлы ключами из хранилища
+            encryption_manager = target = keystore.manager(workers=args.workers)
+        started = time.perf_counter()
+        total = skipped = failed = 0
+        for file_path in encrypted_files(args.paths):
+            fields = encryption_manager.read_header_fields(file_path) if os.path.isfile(file_path) else {}
+            if fields.get(HEADER_KEY_ID) == target.key_id.encode() and \
+                    fields.get(HEADER_CIPHER) == target.stream_backend.encode():
+                skipped += 1
+                continue
+            try:
+                with log_operation('rekey', file_path, key_id=target.key_id) as operation:
+                    operation['bytes'] = encryption_manager.rekey_file(file_path, target=target, workers=args.workers)
+            except Exception as e:
+                failed += 1
+                print(f"ОШИБКА {file_path}: {e!r}")
+                continue
+            total += operation['bytes']
+            print(f"OK     {file_path}")
+        seconds = time.perf_counter() - started
+        print(f"Перешифровано {total / 2 ** 20:.1f} МБ за {seconds:.2f} с "
+              f"({total / 2 ** 20 / max(seconds, 1e-9):.1f} МБ/с), уже на новом ключе: {skipped}, ошибок: {failed}",
+              file=sys.stderr)
+        return 1 if failed else 0
+
+    if args.command == 'download':
+        started = time.perf_counter()
+        size = DroneManager(open_encryption_manager(args, create=True)).fetch_video(args.url, args.output,
+                                                                                    connections=args.connections)
+        seconds = time.perf_counter() - started
+        print(f"{size} байт за {seconds:.2f} с ({size / 2 ** 20 / max(seconds, 1e-9):.1f} МБ/с)")
+        return 0
+
+    if args.command == 'io-bench':
+        print(f"{'размер':>12} {'способ':<7} {'сек':>8} {'МБ/с':>8} {'read()':>9} {'write()':>9} "
+              f"{'Python, МБ':>11} {'RSS, МБ':>9}")
+        for size_gb in args.sizes.split(','):
+            size = int(float(size_gb) * 1024 ** 3)
+            input_path = os.path.join(args.dir, f'leaks_io_bench_{size}.bin')
+            create_benchmark_file(input_path, size)
+            try:
+                for result in benchmark_io(input_path, args.modes.split(',')):
+                    if 'skipped' in result:
+                        print(f"{size:>12} {result['mode']:<7} пропущен: {result['skipped']}")
+                        continue
+                    if 'error' in result:
+                        print(f"{size:>12} {result['mode']:<7} ошибка: {result['error']}")
+                        continue
+                    print(f"{size:>12} {result['mode']:<7} {result['seconds']:>8.2f} {result['mb_per_second']:>8.1f} "
+                          f"{result['read_syscalls'] or '-':>9} {result['write_syscalls'] or '-':>9} "
+                          f"{result['python_alloc_peak_mb']:>11.1f} {result['peak_rss_mb'] or 0:>9.1f}")
+            finally:
+                os.remove(input_path)
+        return 0
+
+    if args.command == 'bench':
+        print(f"{'данные':<11} {'размер':>10} {'шифр':<18} {'режим':<10} {'шифр., МБ/с':>12} "
+              f"{'дешифр., МБ/с':>14} {'размер+':>8}")
+        for result in benchmark_backends(repeat=args.repeat, workers=args.workers):
+            print(f"{result['payload']:<11} {result['size']:>10} {result['backend']:<18} {result['mode']:<10} "
+                  f"{result['encrypt_mb_per_second']:>12.1f} {result['decrypt_mb_per_second']:>14.1f} "
+                  f"{result['overhead_percent']:>7.2f}%")
+        return 0
+
+    if args.command == 'image-codecs':
+        source_size = os.path.getsize(args.image)
+        print(f"Исходный файл: {source_size} байт")
+        for result in ImageManager(EncryptionManager()).benchmark_codecs(args.image):
+            if 'error' in result:
+                print(f"{result['codec']:<14} ошибка: {result['error']}")
+            else:
+                print(f"{result['codec']:<14} {result['size']:>12} байт  x{result['ratio']:.2f}  "
+                      f"{result['seconds'] * 1000:8.1f} мс  {result['mb_per_second']:8.1f} МБ/с")
+        return 0
+
+    if args.command == 'encrypt' and not os.path.isdir(args.source):
+        encrypt_media_file(open_encryption_manager(args, create=True), args.source, args.target, args.codec,
+                           args.per_frame, args.workers)
+        return 0
+
+    if args.command == 'decrypt':
+        encryption_manager = open_encryption_manager(args)
+        if not os.path.isdir(args.source):
+            decrypt_media_file(encryption_manager, args.source, args.target, args.workers)
+            return 0
+        failed = 0
+        for file_path in encrypted_files([args.source]):
+            relative_path = os.path.relpath(file_path, args.source)
+            if relative_path.endswith('.dat'):
+                relative_path = relative_path[:-len('.dat')]
+            output_path = os.path.join(args.target, relative_path)
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            try:
+                decrypt_media_file(encryption_manager, file_path, output_path, args.workers)
+            except Exception as e:
+                failed += 1
+                print(f"Ошибка: {file_path}: {e!r}", file=sys.stderr)
+        return 1 if failed else 0
+
+    if args.command in ('batch', 'encrypt'):
+        batch_manager = BatchManager(open_encryption_manager(args, create=True), workers=args.workers)
+
+        def progress(done, total, name):
+            print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+        result = batch_manager.encrypt_folder(args.source, args.target, progress=progress)
+        print(file=sys.stderr)
+        for name in result['failed']:
+            print(f"Ошибка: {name}", file=sys.stderr)
+        return 1 if result['failed'] else 0
+
     root = tk.Tk()
-    app = GUIApplication(root)
-    root.mainloop()
\ No newline at end of file
+    GUIApplication(root)
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
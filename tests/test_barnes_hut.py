@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BAZA'))
+
+import solar_model  # noqa: E402
+from solar_benchmark import generate_disk, relative_errors  # noqa: E402
+
+
+class BarnesHutTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = solar_model.gravity_solver, solar_model.tree_leaf_size
+        self.positions, self.masses = generate_disk(3000, seed=2)
+        self.softening = 1e17
+        self.exact = solar_model.direct_accelerations(self.positions, self.masses, self.softening)
+
+    def tearDown(self):
+        solar_model.gravity_solver, solar_model.tree_leaf_size = self.saved
+
+    def errors(self, theta):
+        approximate = solar_model.barnes_hut_accelerations(self.positions, self.masses, self.softening, theta)
+        return relative_errors(approximate, self.exact)
+
+    def test_error_shrinks_with_opening_angle(self):
+        medians = [np.median(self.errors(theta)) for theta in (1.0, 0.7, 0.5, 0.3)]
+        self.assertEqual(medians, sorted(medians, reverse=True))
+        self.assertLess(medians[-1], 1e-3)
+
+    def test_small_opening_angle_is_exact(self):
+        for leaf_size in (1, 8, 64):
+            with self.subTest(leaf_size=leaf_size):
+                solar_model.tree_leaf_size = leaf_size
+                self.assertLess(self.errors(1e-3).max(), 1e-10)
+
+    def test_solver_is_selected_by_name(self):
+        solar_model.gravity_solver = "barnes-hut"
+        np.testing.assert_array_equal(
+            solar_model.calculate_accelerations(self.positions, self.masses, self.softening),
+            solar_model.barnes_hut_accelerations(self.positions, self.masses, self.softening))
+
+    def test_small_and_degenerate_systems(self):
+        self.assertEqual(solar_model.barnes_hut_accelerations(np.empty((0, 2)), np.empty(0)).shape, (0, 2))
+        np.testing.assert_array_equal(solar_model.barnes_hut_accelerations(np.zeros((1, 2)), np.ones(1), 0.0), 0.0)
+        positions = np.array([[0.0, 0.0], [1e11, 0.0], [1e11, 0.0], [-3e11, 2e11]])  # два тела в одной точке
+        masses = np.array([2e30, 6e24, 6e24, 1e27])
+        tree = solar_model.barnes_hut_accelerations(positions, masses, 1e9, 0.5)
+        direct = solar_model.direct_accelerations(positions, masses, 1e9)
+        self.assertTrue(np.isfinite(tree).all())
+        self.assertLess(relative_errors(tree, direct).max(), 1e-2)
+
+    def test_direct_targets_are_rows_of_full_result(self):
+        targets = np.array([0, 5, 17, 2999])
+        np.testing.assert_allclose(
+            solar_model.direct_accelerations(self.positions, self.masses, self.softening, targets),
+            self.exact[targets], rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
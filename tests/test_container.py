@@ -0,0 +1,151 @@
+import io
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 64
+
+
+class RecordingCipher:
+    """AEAD-шифр, запоминающий использованные nonce"""
+    def __init__(self, cipher, nonces):
+        self.cipher = cipher
+        self.nonces = nonces
+
+    def encrypt(self, nonce, data, aad):
+        self.nonces.append(nonce)
+        return self.cipher.encrypt(nonce, data, aad)
+
+
+class ContainerTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = leaks.EncryptionManager()
+
+    def encrypt(self, data):
+        destination = io.BytesIO()
+        self.manager.encrypt_stream(io.BytesIO(data), destination, segment_size=SEGMENT)
+        return destination.getvalue()
+
+    def decrypt(self, container):
+        destination = io.BytesIO()
+        self.manager.decrypt_stream(io.BytesIO(container), destination)
+        return destination.getvalue()
+
+    def frames(self, container):
+        """Заголовок и кадры сегментов контейнера: (смещение, длина кадра, признак последнего)"""
+        header = leaks.read_container_header(io.BytesIO(container))[0]
+        frames = []
+        position = len(header)
+        while position < len(container):
+            length = struct.unpack_from('>I', container, position)[0]
+            final = bool(length & leaks.FINAL_SEGMENT_FLAG)
+            size = 4 + (length & ~leaks.FINAL_SEGMENT_FLAG)
+            frames.append((position, size, final))
+            position += size
+        return header, frames
+
+    def test_round_trip(self):
+        for size in (0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT, 5 * SEGMENT + 7):
+            with self.subTest(size=size):
+                data = os.urandom(size)
+                container = self.encrypt(data)
+                self.assertTrue(container.startswith(leaks.CONTAINER_MAGIC))
+                if size >= 16:
+                    self.assertNotIn(data, container)
+                self.assertEqual(self.decrypt(container), data)
+
+    def test_file_round_trip(self):
+        data = os.urandom(3 * leaks.SEGMENT_SIZE // 2)
+        with tempfile.TemporaryDirectory() as directory:
+            source, encrypted, output = (os.path.join(directory, name) for name in ('video.bin', 'video.dat', 'out'))
+            with open(source, 'wb') as file:
+                file.write(data)
+            self.manager.encrypt_file(source, encrypted)
+            self.assertTrue(leaks.is_container(encrypted))
+            self.manager.decrypt_file(encrypted, output)
+            with open(output, 'rb') as file:
+                self.assertEqual(file.read(), data)
+
+    def test_tampered_segment_is_rejected(self):
+        container = bytearray(self.encrypt(os.urandom(3 * SEGMENT)))
+        _, frames = self.frames(bytes(container))
+        position, size, _ = frames[1]
+        container[position + size // 2] ^= 1
+        with self.assertRaises(InvalidTag):
+            self.decrypt(bytes(container))
+
+    def test_tampered_header_is_rejected(self):
+        container = bytearray(self.encrypt(os.urandom(3 * SEGMENT)))
+        header, _ = self.frames(bytes(container))
+        prefix = leaks.read_container_header(io.BytesIO(bytes(container)))[1][leaks.HEADER_NONCE_PREFIX]
+        container[header.index(prefix)] ^= 1
+        with self.assertRaises(InvalidTag):
+            self.decrypt(bytes(container))
+
+    def test_header_is_authenticated(self):
+        container = self.encrypt(os.urandom(3 * SEGMENT))
+        header, fields = leaks.read_container_header(io.BytesIO(container))
+        fields[200] = b'added'  # лишнее поле не меняет nonce, но меняет дополнительные данные сегментов
+        with self.assertRaises(InvalidTag):
+            self.decrypt(leaks.pack_container_header(fields) + container[len(header):])
+
+    def test_foreign_key_is_rejected(self):
+        container = self.encrypt(os.urandom(SEGMENT))
+        self.manager = leaks.EncryptionManager()
+        with self.assertRaises(Exception):
+            self.decrypt(container)
+
+    def test_truncated_container_is_rejected(self):
+        container = self.encrypt(os.urandom(3 * SEGMENT + 5))
+        _, frames = self.frames(container)
+        for position, _, _ in frames:
+            with self.subTest(cut=position):
+                with self.assertRaises(ValueError):
+                    self.decrypt(container[:position])
+        with self.assertRaises(ValueError):
+            self.decrypt(container[:-1])
+
+    def test_reordered_segments_are_rejected(self):
+        container = self.encrypt(os.urandom(3 * SEGMENT + 5))
+        header, frames = self.frames(container)
+        chunks = [container[position:position + size] for position, size, _ in frames]
+        swapped = header + chunks[1] + chunks[0] + b''.join(chunks[2:])
+        with self.assertRaises(InvalidTag):
+            self.decrypt(swapped)
+
+    def test_final_flag_is_authenticated(self):
+        container = self.encrypt(os.urandom(3 * SEGMENT))
+        header, frames = self.frames(container)
+        # признак последнего сегмента у первого сегмента: иначе обрезка после него выглядела бы целым файлом
+        position, size, _ = frames[0]
+        length = struct.unpack_from('>I', container, position)[0] | leaks.FINAL_SEGMENT_FLAG
+        forged = header + struct.pack('>I', length) + container[position + 4:position + size]
+        with self.assertRaises(InvalidTag):
+            self.decrypt(forged)
+        # и наоборот: последний сегмент без признака
+        position, size, _ = frames[-1]
+        length = struct.unpack_from('>I', container, position)[0] & ~leaks.FINAL_SEGMENT_FLAG
+        forged = container[:position] + struct.pack('>I', length) + container[position + 4:]
+        with self.assertRaises((InvalidTag, ValueError)):
+            self.decrypt(forged)
+
+    def test_nonces_are_unique(self):
+        nonces = []
+        for _ in range(2):
+            writer = leaks.SegmentWriter(io.BytesIO(), RecordingCipher(self.manager.stream_cipher, nonces), SEGMENT)
+            for index in range(5):
+                writer.write_segment(os.urandom(SEGMENT), final=index == 4)
+        self.assertEqual(len(nonces), 10)
+        self.assertEqual(len(set(nonces)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BAZA'))
+
+import solar_model  # noqa: E402
+
+
+def pairwise_accelerations(positions, masses, softening=0.0):
+    """Ускорения по закону тяготения, тело за телом, без векторизации"""
+    accelerations = np.zeros_like(positions)
+    for i in range(len(masses)):
+        for j in range(len(masses)):
+            if i != j:
+                dx, dy = positions[i] - positions[j]
+                r2 = dx*dx + dy*dy + softening**2
+                accelerations[i] -= solar_model.gravitational_constant*masses[j]*np.array((dx, dy)) / r2**1.5
+    return accelerations
+
+
+def relative_errors(approximate, exact):
+    return np.linalg.norm(approximate - exact, axis=1) / np.linalg.norm(exact, axis=1)
+
+
+class DirectGravityTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = solar_model.pair_dtype, solar_model.pair_block_size
+        rng = np.random.default_rng(1)
+        self.positions = rng.normal(size=(150, 2)) * 1e11
+        self.masses = rng.uniform(1e20, 1e30, 150)
+
+    def tearDown(self):
+        solar_model.pair_dtype, solar_model.pair_block_size = self.saved
+
+    def test_matches_pairwise_reference(self):
+        for softening in (0.0, 1e10):
+            exact = pairwise_accelerations(self.positions, self.masses, softening)
+            for block in (1, 100, 2**15):
+                with self.subTest(softening=softening, block=block):
+                    solar_model.pair_block_size = block
+                    accelerations = solar_model.calculate_accelerations(self.positions, self.masses, softening)
+                    self.assertLess(relative_errors(accelerations, exact).max(), 1e-12)
+
+    def test_two_bodies(self):
+        positions = np.array([[0.0, 0.0], [1.496e11, 0.0]])
+        masses = np.array([1.989e30, 5.972e24])
+        accelerations = solar_model.calculate_accelerations(positions, masses, 0.0)
+        expected = solar_model.gravitational_constant * masses[::-1] / 1.496e11**2
+        np.testing.assert_allclose(accelerations[:, 0], [expected[0], -expected[1]], rtol=1e-14)
+        np.testing.assert_array_equal(accelerations[:, 1], 0.0)
+
+    def test_momentum_is_conserved(self):
+        accelerations = solar_model.calculate_accelerations(self.positions, self.masses, 0.0)
+        forces = accelerations * self.masses[:, None]
+        self.assertLess(np.abs(forces.sum(axis=0)).max(), 1e-12 * np.abs(forces).max())
+
+    def test_float32_pairs(self):
+        exact = pairwise_accelerations(self.positions, self.masses)
+        solar_model.pair_dtype = np.float32
+        accelerations = solar_model.calculate_accelerations(self.positions, self.masses, 0.0)
+        self.assertEqual(accelerations.dtype, np.float64)
+        errors = relative_errors(accelerations, exact)
+        self.assertLess(np.median(errors), 1e-5)
+        self.assertLess(errors.max(), 1e-3)
+
+    def test_float32_galaxy_scale_does_not_overflow(self):
+        positions = self.positions * 1e9  # около 1e20 м: r**3 не помещается во float32 без нормировки
+        exact = pairwise_accelerations(positions, self.masses, 1e17)
+        solar_model.pair_dtype = np.float32
+        accelerations = solar_model.calculate_accelerations(positions, self.masses, 1e17)
+        self.assertTrue(np.isfinite(accelerations).all())
+        self.assertLess(np.median(relative_errors(accelerations, exact)), 1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 64
+METADATA = {'type': 'image', 'name': 'фото.png', 'width': 640, 'height': 480}
+THUMBNAIL = b'\xff\xd8 jpeg thumbnail \xff\xd9'
+
+
+class RecordingCipher:
+    """AEAD-шифр, запоминающий использованные nonce"""
+    def __init__(self, cipher, nonces):
+        self.cipher = cipher
+        self.nonces = nonces
+
+    def encrypt(self, nonce, data, aad):
+        self.nonces.append(nonce)
+        return self.cipher.encrypt(nonce, data, aad)
+
+
+class HeaderFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = leaks.EncryptionManager()
+        self.path = os.path.join(self.directory.name, 'image.dat')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_metadata_and_thumbnail_round_trip(self):
+        self.manager.encrypt_to_file(b'image bytes', self.path, METADATA, THUMBNAIL)
+        with open(self.path, 'rb') as file:
+            container = file.read()
+        self.assertNotIn('фото'.encode(), container)
+        self.assertNotIn(THUMBNAIL, container)
+        self.assertEqual(self.manager.read_metadata(self.path), METADATA)
+        self.assertEqual(self.manager.read_thumbnail(self.path), THUMBNAIL)
+        self.assertEqual(self.manager.decrypt_file_data(self.path), b'image bytes')
+
+    def test_missing_fields_read_as_none(self):
+        self.manager.encrypt_to_file(b'image bytes', self.path)
+        self.assertIsNone(self.manager.read_metadata(self.path))
+        self.assertIsNone(self.manager.read_thumbnail(self.path))
+
+    def test_open_header_fields_are_authenticated(self):
+        self.manager.encrypt_to_file(b'image bytes', self.path, METADATA, THUMBNAIL)
+        fields = self.manager.read_header_fields(self.path)
+        fields[200] = b'added'
+        with self.assertRaises(InvalidTag):
+            self.manager.open_metadata(fields)
+        with self.assertRaises(InvalidTag):
+            self.manager.open_sealed_field(fields, leaks.HEADER_THUMBNAIL)
+
+    def test_sealed_fields_use_reserved_nonces(self):
+        nonces = []
+        cipher = RecordingCipher(self.manager.stream_cipher, nonces)
+        writer = leaks.SegmentWriter(io.BytesIO(), cipher, SEGMENT, metadata=METADATA, thumbnail=THUMBNAIL)
+        header_nonces = set(nonces)
+        for index in range(3):
+            writer.write_segment(os.urandom(SEGMENT), final=index == 2)
+        reserved = {leaks.segment_nonce(writer.nonce_prefix, index) for index in (0xFFFFFFFF, 0xFFFFFFFE)}
+        self.assertEqual(header_nonces, reserved)
+        self.assertEqual(len(set(nonces)), len(nonces))
+
+    def test_data_segments_cannot_reach_reserved_indices(self):
+        writer = leaks.SegmentWriter(io.BytesIO(), self.manager.stream_cipher, SEGMENT, metadata=METADATA)
+        for index in (0xFFFFFFFF, 0xFFFFFFFE):
+            with self.subTest(index=hex(index)):
+                with self.assertRaises(ValueError):
+                    writer.seal_segment(index, b'data', False)
+        writer.seal_segment(0xFFFFFFFD, b'data', False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BAZA'))
+
+import solar_model  # noqa: E402
+from solar_benchmark import generate_inner_planets  # noqa: E402
+
+DAY = 86400.0
+YEAR = 365.25 * DAY
+
+
+class IntegratorsTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = solar_model.integrator, solar_model.gravity_solver, solar_model.rk45_step_hint
+        solar_model.gravity_solver = "direct"
+
+    def tearDown(self):
+        solar_model.integrator, solar_model.gravity_solver, solar_model.rk45_step_hint = self.saved
+
+    def run_orbits(self, name, days, duration=YEAR):
+        """Наибольшая относительная ошибка энергии, конечное состояние и число вычислений сил"""
+        solar_model.integrator = name
+        solar_model.rk45_step_hint = None
+        positions, velocities, masses = generate_inner_planets()
+        initial = solar_model.total_energy(positions, velocities, masses)
+        evaluations = solar_model.force_evaluations
+        accelerations = None
+        worst = 0.0
+        for _ in range(int(round(duration / (days * DAY)))):
+            accelerations = solar_model.step_arrays(positions, velocities, masses, days * DAY,
+                                                    accelerations=accelerations)
+            worst = max(worst, abs(solar_model.total_energy(positions, velocities, masses) / initial - 1))
+        return worst, positions, solar_model.force_evaluations - evaluations
+
+    def test_energy_error_per_integrator(self):
+        limits = {('euler', 1): 1e-2, ('leapfrog', 1): 2e-4, ('yoshida', 1): 5e-6, ('rk45', 30): 1e-9}
+        for (name, days), limit in limits.items():
+            with self.subTest(integrator=name, days=days):
+                self.assertLess(self.run_orbits(name, days)[0], limit)
+
+    def test_order_of_accuracy(self):
+        for name, order in (('leapfrog', 2), ('yoshida', 4)):
+            with self.subTest(integrator=name):
+                ratio = self.run_orbits(name, 2)[0] / self.run_orbits(name, 1)[0]
+                self.assertGreater(ratio, 2**order * 0.7)
+                self.assertLess(ratio, 2**order * 1.3)
+
+    def test_symplectic_energy_error_does_not_grow(self):
+        one_year = self.run_orbits('leapfrog', 1)[0]
+        four_years = self.run_orbits('leapfrog', 1, 4 * YEAR)[0]
+        self.assertLess(four_years, 1.5 * one_year)
+
+    def test_leapfrog_is_time_reversible(self):
+        solar_model.integrator = "leapfrog"
+        positions, velocities, masses = generate_inner_planets()
+        start = positions.copy()
+        for dt in (DAY, -DAY):
+            accelerations = None
+            for _ in range(100):
+                accelerations = solar_model.step_arrays(positions, velocities, masses, dt, accelerations=accelerations)
+        self.assertLess(np.abs(positions - start).max(), 1e-6 * np.abs(start).max())
+
+    def test_force_evaluations_per_step(self):
+        self.assertEqual(self.run_orbits('euler', 1, 10 * DAY)[2], 10)
+        self.assertEqual(self.run_orbits('leapfrog', 1, 10 * DAY)[2], 11)
+        self.assertEqual(self.run_orbits('yoshida', 1, 10 * DAY)[2], 31)
+
+
+if __name__ == '__main__':
+    unittest.main()
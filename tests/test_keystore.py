@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet, InvalidToken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+
+class KeyStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'keystore.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_missing_keystore_is_not_created_implicitly(self):
+        with self.assertRaises(ValueError):
+            leaks.KeyStore(self.path, 'secret')
+        self.assertFalse(os.path.exists(self.path))
+        with self.assertRaises(ValueError):
+            leaks.KeyStore(self.path, '', create=True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_reopen_with_password(self):
+        keystore = leaks.KeyStore(self.path, 'secret', create=True)
+        key_id = keystore.active_key_id
+        key = keystore.get_key(key_id)
+        with open(self.path, encoding='utf-8') as file:
+            self.assertNotIn(key.decode(), file.read())  # ключи хранятся только зашифрованными
+        reopened = leaks.KeyStore(self.path, 'secret')
+        self.assertEqual(reopened.active_key_id, key_id)
+        self.assertEqual(reopened.get_key(key_id), key)
+
+    def test_wrong_password_is_rejected(self):
+        leaks.KeyStore(self.path, 'secret', create=True)
+        with self.assertRaises(ValueError):
+            leaks.KeyStore(self.path, 'Secret')
+
+    def test_files_of_rotated_keys_stay_readable(self):
+        keystore = leaks.KeyStore(self.path, 'secret', create=True)
+        old_manager = keystore.manager()
+        container = old_manager.encrypt_bytes(b'old container')
+        legacy_token = old_manager.fernet.encrypt(b'old token')
+        new_key_id = keystore.create_key()
+
+        new_manager = leaks.KeyStore(self.path, 'secret').manager()
+        self.assertEqual(new_manager.key_id, new_key_id)
+        self.assertNotEqual(new_manager.key_id, old_manager.key_id)
+        self.assertEqual(new_manager.decrypt_data(legacy_token), b'old token')
+        path = os.path.join(self.directory.name, 'old.dat')
+        with open(path, 'wb') as file:
+            file.write(container)
+        self.assertEqual(new_manager.decrypt_file_data(path), b'old container')
+
+    def test_foreign_legacy_token_is_rejected(self):
+        manager = leaks.KeyStore(self.path, 'secret', create=True).manager()
+        with self.assertRaises(InvalidToken):
+            manager.decrypt_data(Fernet(Fernet.generate_key()).encrypt(b'foreign'))
+
+    def test_managers_are_cached(self):
+        keystore = leaks.KeyStore(self.path, 'secret', create=True)
+        self.assertIs(keystore.manager(), keystore.manager(keystore.active_key_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
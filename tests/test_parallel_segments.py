@@ -0,0 +1,77 @@
+import io
+import os
+import random
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 256
+
+
+class OrderedMapTest(unittest.TestCase):
+    def test_results_keep_input_order(self):
+        delays = [random.uniform(0, 0.01) for _ in range(50)]
+
+        def slow_square(index, delay):
+            time.sleep(delay)
+            return index * index
+
+        for workers in (1, 2, 8):
+            with self.subTest(workers=workers):
+                results = list(leaks.ordered_map(slow_square, enumerate(delays), workers))
+                self.assertEqual(results, [index * index for index in range(len(delays))])
+
+    def test_items_in_flight_are_bounded(self):
+        workers = 3
+        lock = threading.Lock()
+        state = {'started': 0, 'consumed': 0, 'ahead': 0}
+
+        def work(index):
+            with lock:
+                state['started'] += 1
+                state['ahead'] = max(state['ahead'], state['started'] - state['consumed'])
+            return index
+
+        for _ in leaks.ordered_map(work, ((index,) for index in range(100)), workers):
+            with lock:
+                state['consumed'] += 1
+        self.assertEqual(state['started'], 100)
+        self.assertLessEqual(state['ahead'], 2 * workers)
+
+    def test_error_is_raised_in_order(self):
+        def fail_on_five(index):
+            if index == 5:
+                raise ValueError(index)
+            return index
+
+        results = []
+        with self.assertRaises(ValueError):
+            for result in leaks.ordered_map(fail_on_five, ((index,) for index in range(20)), 4):
+                results.append(result)
+        self.assertEqual(results, list(range(5)))
+
+
+class ParallelContainerTest(unittest.TestCase):
+    def test_parallel_and_serial_containers_are_interchangeable(self):
+        manager = leaks.EncryptionManager()
+        data = os.urandom(40 * SEGMENT + 3)
+        containers = {}
+        for workers in (1, 4):
+            destination = io.BytesIO()
+            manager.encrypt_stream(io.BytesIO(data), destination, segment_size=SEGMENT, workers=workers)
+            containers[workers] = destination.getvalue()
+        for encrypted_with, container in containers.items():
+            for workers in (1, 4):
+                with self.subTest(encrypted_with=encrypted_with, decrypted_with=workers):
+                    destination = io.BytesIO()
+                    manager.decrypt_stream(io.BytesIO(container), destination, workers=workers)
+                    self.assertEqual(destination.getvalue(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 100
+
+
+class EncryptedFileReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = leaks.EncryptionManager()
+        self.data = os.urandom(10 * SEGMENT + 37)
+        self.path = self.encrypted(self.data)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def encrypted(self, data, name='video.dat'):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as destination:
+            self.manager.encrypt_stream(io.BytesIO(data), destination, segment_size=SEGMENT)
+        return path
+
+    def test_random_reads_match_plaintext(self):
+        rng = random.Random(0)
+        with self.manager.open_encrypted(self.path) as reader:
+            self.assertEqual(reader.seek(0, io.SEEK_END), len(self.data))
+            for _ in range(200):
+                offset = rng.randrange(len(self.data) + 20)
+                size = rng.randrange(3 * SEGMENT)
+                reader.seek(offset)
+                self.assertEqual(reader.read(size), self.data[offset:offset + size])
+                self.assertEqual(reader.tell(), min(offset + size, max(offset, len(self.data))))
+
+    def test_sequential_read_and_relative_seek(self):
+        with self.manager.open_encrypted(self.path) as reader:
+            self.assertEqual(reader.read(SEGMENT + 5), self.data[:SEGMENT + 5])
+            reader.seek(-10, io.SEEK_CUR)
+            self.assertEqual(reader.read(20), self.data[SEGMENT - 5:SEGMENT + 15])
+            reader.seek(-7, io.SEEK_END)
+            self.assertEqual(reader.read(), self.data[-7:])
+            self.assertEqual(reader.read(), b'')
+            buffer = bytearray(50)
+            reader.seek(2 * SEGMENT - 25)
+            self.assertEqual(reader.readinto(buffer), 50)
+            self.assertEqual(bytes(buffer), self.data[2 * SEGMENT - 25:2 * SEGMENT + 25])
+
+    def test_decrypt_range(self):
+        boundary = 3 * SEGMENT
+        self.assertEqual(self.manager.decrypt_range(self.path, boundary - 1, 2), self.data[boundary - 1:boundary + 1])
+        self.assertEqual(self.manager.decrypt_range(self.path, len(self.data) - 3, 100), self.data[-3:])
+
+    def test_exact_segment_multiple_and_empty(self):
+        for size in (0, SEGMENT, 3 * SEGMENT):
+            with self.subTest(size=size):
+                data = os.urandom(size)
+                with self.manager.open_encrypted(self.encrypted(data, f'{size}.dat')) as reader:
+                    self.assertEqual(reader.read(), data)
+                    reader.seek(size // 2)
+                    self.assertEqual(reader.read(), data[size // 2:])
+
+    def test_only_touched_segments_are_checked(self):
+        with open(self.path, 'r+b') as file:
+            file.seek(-10, io.SEEK_END)
+            byte = file.read(1)
+            file.seek(-10, io.SEEK_END)
+            file.write(bytes([byte[0] ^ 1]))
+        with self.manager.open_encrypted(self.path) as reader:
+            self.assertEqual(reader.read(2 * SEGMENT), self.data[:2 * SEGMENT])
+            reader.seek(len(self.data) - 5)
+            with self.assertRaises(InvalidTag):
+                reader.read(5)
+
+    def test_truncated_container_is_rejected(self):
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 4 - SEGMENT)
+        with self.assertRaises(ValueError):
+            with self.manager.open_encrypted(self.path) as reader:
+                reader.seek(len(self.data) - SEGMENT - 40)
+                reader.read(10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import http.server
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 1024
+PAYLOAD = os.urandom(10 * SEGMENT + 100)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Отдаёт PAYLOAD целиком или по заголовку Range; ETag задаётся атрибутом сервера"""
+    def do_GET(self):
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2)) + 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(self.server.payload)}')
+        else:
+            start, end = 0, len(self.server.payload)
+            self.send_response(200)
+        if self.server.etag:
+            self.send_header('ETag', self.server.etag)
+        body = self.server.payload[start:end]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class InterruptingTask:
+    """Задача, которая отменяется после заданного числа загруженных сегментов"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.segments = 0
+
+    def check_cancelled(self):
+        if self.segments >= self.limit:
+            raise leaks.TaskCancelled()
+
+    def report_progress(self, done, total):
+        self.segments += 1
+
+
+class RangeDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.payload = PAYLOAD
+        self.server.etag = '"v1"'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/video.bin'
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'video.enc')
+        self.manager = leaks.EncryptionManager()
+        self.downloader = leaks.RangeDownloader(self.manager, connections=1, segment_size=SEGMENT)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def interrupted_download(self, segments=2):
+        with self.assertRaises(leaks.TaskCancelled):
+            self.downloader.download(self.url, self.output, InterruptingTask(segments))
+        self.assertTrue(os.path.exists(leaks.part_file_path(self.output)))
+        self.assertTrue(os.path.exists(self.output + '.state'))
+
+    def decrypted(self):
+        plain = os.path.join(self.directory.name, 'video.bin')
+        self.manager.decrypt_file(self.output, plain)
+        with open(plain, 'rb') as file:
+            return file.read()
+
+    def segment_frame(self, index):
+        with open(leaks.part_file_path(self.output), 'rb') as file:
+            writer = leaks.SegmentWriter.resume(file, self.manager.cipher_for)
+            file.seek(writer.segment_offset(index))
+            return file.read(4 + SEGMENT + leaks.TAG_SIZE)
+
+    def test_resume_after_interruption(self):
+        self.interrupted_download()
+        first_segment = self.segment_frame(0)
+        self.assertEqual(self.downloader.download(self.url, self.output), len(PAYLOAD))
+        self.assertFalse(os.path.exists(leaks.part_file_path(self.output)))
+        self.assertFalse(os.path.exists(self.output + '.state'))
+        self.assertEqual(self.decrypted(), PAYLOAD)
+        with open(self.output, 'rb') as file:
+            self.assertIn(first_segment, file.read())  # готовый сегмент не загружался и не шифровался заново
+
+    def test_segment_missing_from_state_is_not_resealed(self):
+        self.interrupted_download()
+        with open(self.output + '.state', encoding='utf-8') as file:
+            state = json.load(file)
+        state['completed'] = []
+        with open(self.output + '.state', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        second_segment = self.segment_frame(1)
+        self.server.payload = PAYLOAD[:SEGMENT] + bytes(SEGMENT) + PAYLOAD[2 * SEGMENT:]
+        self.downloader.download(self.url, self.output)
+        with open(self.output, 'rb') as file:
+            self.assertIn(second_segment, file.read())
+        self.assertEqual(self.decrypted(), PAYLOAD)
+
+    def test_no_validator_starts_over(self):
+        self.server.etag = None
+        self.interrupted_download()
+        with open(leaks.part_file_path(self.output), 'rb') as file:
+            old_header = leaks.read_container_header(file)[0]
+        changed = bytes(len(PAYLOAD))
+        self.server.payload = changed
+        self.downloader.download(self.url, self.output)
+        with open(self.output, 'rb') as file:
+            self.assertNotEqual(leaks.read_container_header(file)[0], old_header)
+        self.assertEqual(self.decrypted(), changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
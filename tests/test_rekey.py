@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaks  # noqa: E402
+
+SEGMENT = 64
+METADATA = {'type': 'video', 'name': 'полёт.mp4'}
+THUMBNAIL = b'\xff\xd8 preview \xff\xd9'
+
+
+class RekeyVerifyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = leaks.EncryptionManager()
+        self.target = leaks.EncryptionManager()
+        self.data = os.urandom(5 * SEGMENT + 11)
+        self.path = os.path.join(self.directory.name, 'video.dat')
+        with open(self.path, 'wb') as destination:
+            self.manager.encrypt_stream(io.BytesIO(self.data), destination, segment_size=SEGMENT,
+                                        metadata=METADATA, thumbnail=THUMBNAIL)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, path=None):
+        with open(path or self.path, 'rb') as file:
+            return file.read()
+
+    def write(self, data):
+        with open(self.path, 'wb') as file:
+            file.write(data)
+
+    def test_verify_intact_file(self):
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                result = self.manager.verify_file(self.path, workers)
+                self.assertEqual(result, {'segments': 6, 'bytes': len(self.data)})
+
+    def test_verify_detects_damage(self):
+        container = self.read()
+        header_size = len(leaks.read_container_header(io.BytesIO(container))[0])
+        flipped = bytearray(container)
+        flipped[header_size + 10] ^= 1
+        damaged = {
+            'segment': (bytes(flipped), InvalidTag),
+            'truncated': (container[:-5], ValueError),
+            'trailing data': (container + b'x', ValueError),
+        }
+        for name, (data, error) in damaged.items():
+            with self.subTest(name):
+                self.write(data)
+                with self.assertRaises(error):
+                    self.manager.verify_file(self.path)
+
+    def test_verify_detects_damaged_metadata(self):
+        fields = self.manager.read_header_fields(self.path)
+        header_size = len(leaks.read_container_header(io.BytesIO(self.read()))[0])
+        sealed = bytearray(fields[leaks.HEADER_METADATA])
+        sealed[0] ^= 1
+        fields[leaks.HEADER_METADATA] = bytes(sealed)
+        self.write(leaks.pack_container_header(fields) + self.read()[header_size:])
+        with self.assertRaises(InvalidTag):
+            self.manager.verify_file(self.path)
+
+    def test_rekey_in_place(self):
+        old_fields = self.manager.read_header_fields(self.path)
+        self.assertEqual(self.manager.rekey_file(self.path, target=self.target, workers=3), len(self.data))
+        fields = self.target.read_header_fields(self.path)
+        self.assertEqual(fields[leaks.HEADER_KEY_ID], self.target.key_id.encode())
+        self.assertNotEqual(fields[leaks.HEADER_NONCE_PREFIX], old_fields[leaks.HEADER_NONCE_PREFIX])
+        self.assertEqual(self.target.decrypt_file_data(self.path), self.data)
+        self.assertEqual(self.target.read_metadata(self.path), METADATA)
+        self.assertEqual(self.target.read_thumbnail(self.path), THUMBNAIL)
+        self.assertEqual(self.target.verify_file(self.path)['segments'], 6)
+        with self.assertRaises(ValueError):
+            self.manager.decrypt_file_data(self.path)
+        self.assertEqual(os.listdir(self.directory.name), ['video.dat'])
+
+    def test_rekey_to_another_file_keeps_source(self):
+        source = self.read()
+        output_path = os.path.join(self.directory.name, 'rekeyed.dat')
+        self.manager.rekey_file(self.path, output_path, self.target)
+        self.assertEqual(self.read(), source)
+        self.assertEqual(self.target.decrypt_file_data(output_path), self.data)
+
+    def test_failed_rekey_leaves_source_untouched(self):
+        damaged = bytearray(self.read())
+        damaged[-3] ^= 1
+        self.write(bytes(damaged))
+        with self.assertRaises(InvalidTag):
+            self.manager.rekey_file(self.path, target=self.target)
+        self.assertEqual(self.read(), bytes(damaged))
+        self.assertEqual(os.listdir(self.directory.name), ['video.dat'])
+
+    def test_rekey_legacy_token(self):
+        self.write(self.manager.fernet.encrypt(self.data))
+        self.manager.rekey_file(self.path, target=self.target)
+        self.assertTrue(leaks.is_container(self.path))
+        self.assertEqual(self.target.decrypt_file_data(self.path), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()